@@ -1,39 +1,84 @@
 """
 應用程序模組
+
+導出的名稱在首次訪問時才導入（PEP 562），導入 app 的子包（如 app.etl）
+不會連帶載入API路由和全部提取器。
 """
-from app.api import v1_router
-from app.core import config, database_manager, logging, exceptions
-from app.models import proxy
-from app.schemas import proxy as proxy_schemas
-from app.services import proxy_validator
-from app.etl import extractors, transformers, coordinator
-from app.utils import http_client, html_parser
+import importlib
+
+# 名稱 -> (模組, 模組中的屬性；None 表示名稱即該模組本身)
+_LAZY = {
+    # API
+    "v1_router": ("app.api", "v1_router"),
+
+    # 核心
+    "config": ("app.core.config", None),
+    "database_manager": ("app.core.database_manager", None),
+    "logging": ("app.core.logging", None),
+    "exceptions": ("app.core.exceptions", None),
+
+    # 模型
+    "proxy": ("app.models.proxy", None),
+
+    # 模式
+    "proxy_schemas": ("app.schemas.proxy", None),
+
+    # 服務
+    "proxy_validator": ("app.services.proxy_validator", None),
+
+    # ETL
+    "extractors": ("app.etl.extractors", None),
+    "transformers": ("app.etl.transformers", None),
+    "coordinator": ("app.etl.coordinator", None),
+
+    # 工具
+    "http_client": ("app.utils.http_client", None),
+    "html_parser": ("app.utils.html_parser", None),
+}
 
 __all__ = [
     # API
     "v1_router",
-    
+
     # 核心
     "config",
-    "database_manager", 
+    "database_manager",
     "logging",
     "exceptions",
-    
+
     # 模型
     "proxy",
-    
+
     # 模式
     "proxy_schemas",
-    
+
     # 服務
     "proxy_validator",
-    
+
     # ETL
     "extractors",
     "transformers",
     "coordinator",
-    
+
     # 工具
     "http_client",
     "html_parser",
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name: str):
+    """首次訪問時導入名稱對應的模組，並緩存到包的命名空間"""
+    target = _LAZY.get(name)
+    if target is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module_name, attr = target
+    value = importlib.import_module(module_name)
+    if attr is not None:
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,85 @@
+"""
+SQLite適配器冒煙測試
+
+手動運行：python -m app.core.sqlite_adapter
+"""
+
+import logging
+
+from .sqlite_adapter import AsyncSQLiteAdapter, ProxyDatabase, TaskDatabase
+
+logger = logging.getLogger(__name__)
+
+
+async def test_sqlite_adapter():
+    """測試SQLite適配器"""
+    logging.basicConfig(level=logging.INFO)
+    logger.info("🚀 測試SQLite適配器...")
+    
+    try:
+        # 創建適配器 - 使用已經初始化的數據庫
+        adapter = AsyncSQLiteAdapter()  # 使用默認路徑
+        
+        # 測試代理數據庫
+        proxy_db = ProxyDatabase(adapter)
+        
+        # 創建測試代理
+        proxy_data = {
+            'ip': '192.168.1.100',
+            'port': 8080,
+            'protocol': 'http',
+            'country': 'US',
+            'anonymity_level': 'elite',
+            'response_time': 0.5,
+            'is_active': True,
+            'success_rate': 0.95
+        }
+        
+        proxy_id = await proxy_db.create_proxy(proxy_data)
+        logger.info(f"✅ 創建代理成功，ID: {proxy_id}")
+        
+        # 獲取代理
+        proxy = await proxy_db.get_proxy_by_id(proxy_id)
+        logger.info(f"✅ 獲取代理成功: {proxy}")
+        
+        # 獲取活動代理
+        active_proxies = await proxy_db.get_active_proxies(limit=10)
+        logger.info(f"✅ 獲取活動代理成功，數量: {len(active_proxies)}")
+        
+        # 獲取統計信息
+        stats = await proxy_db.get_proxy_stats()
+        logger.info(f"✅ 代理統計: {stats}")
+        
+        # 測試任務數據庫
+        task_db = TaskDatabase(adapter)
+        
+        # 創建任務
+        task_data = {
+            'name': '測試任務',
+            'task_type': 'proxy_validation',
+            'config': {'timeout': 30, 'retry_count': 3},
+            'status': 'pending'
+        }
+        
+        task_id = await task_db.create_task(task_data)
+        logger.info(f"✅ 創建任務成功，ID: {task_id}")
+        
+        # 獲取任務
+        task = await task_db.get_task_by_id(task_id)
+        logger.info(f"✅ 獲取任務成功: {task}")
+        
+        # 更新任務狀態
+        await task_db.update_task_status(task_id, 'completed', {'validated': 10, 'failed': 2})
+        logger.info("✅ 更新任務狀態成功")
+        
+        # 獲取任務統計
+        task_stats = await task_db.get_task_stats()
+        logger.info(f"✅ 任務統計: {task_stats}")
+        
+        # 關閉連接
+        await adapter.close()
+        
+        logger.info("✅ SQLite適配器測試完成！")
+        
+    except Exception as e:
+        logger.exception(f"❌ SQLite適配器測試失敗: {str(e)}")
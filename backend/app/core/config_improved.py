@@ -50,6 +50,11 @@ class Settings(BaseSettings):
     # 任務隊列配置
     TASK_QUEUE_SIZE: int = 1000
     TASK_WORKER_COUNT: int = 4
+    RETRY_TPS: float = 5.0  # 每秒允許重新入隊的失敗任務數
+    RETRY_BURST: int = 10
+    
+    # 線程池配置（事件循環默認線程池大小，未設置時按CPU核數推算）
+    THREAD_POOL_SIZE: Optional[int] = None
     
     # 代理池配置
     MAX_POOL_SIZE: int = 1000
@@ -235,6 +240,9 @@ class Settings(BaseSettings):
             'rate_limit_per_minute': self.RATE_LIMIT_PER_MINUTE,
             'task_queue_size': self.TASK_QUEUE_SIZE,
             'task_worker_count': self.TASK_WORKER_COUNT,
+            'retry_tps': self.RETRY_TPS,
+            'retry_burst': self.RETRY_BURST,
+            'thread_pool_size': self.THREAD_POOL_SIZE,
             'max_pool_size': self.MAX_POOL_SIZE,
             'min_pool_size': self.MIN_POOL_SIZE,
             'data_dir': self.DATA_DIR,
@@ -42,10 +42,10 @@ class DatabaseConfig:
     password: str = ""
     
     # 連接池配置
-    pool_size: int = 10
-    max_overflow: int = 20
+    pool_size: int = 20
+    max_overflow: int = 40
     pool_timeout: int = 30
-    pool_recycle: int = 3600
+    pool_recycle: int = 300
     
     # SSL 配置
     ssl_mode: str = "prefer"
@@ -245,10 +245,10 @@ class DatabaseConfig:
             password=os.getenv(f"{prefix}PASSWORD", ""),
             
             # 連接池配置
-            pool_size=int(os.getenv(f"{prefix}POOL_SIZE", "10")),
-            max_overflow=int(os.getenv(f"{prefix}MAX_OVERFLOW", "20")),
+            pool_size=int(os.getenv(f"{prefix}POOL_SIZE", "20")),
+            max_overflow=int(os.getenv(f"{prefix}MAX_OVERFLOW", "40")),
             pool_timeout=int(os.getenv(f"{prefix}POOL_TIMEOUT", "30")),
-            pool_recycle=int(os.getenv(f"{prefix}POOL_RECYCLE", "3600")),
+            pool_recycle=int(os.getenv(f"{prefix}POOL_RECYCLE", "300")),
             
             # SSL 配置
             ssl_mode=os.getenv(f"{prefix}SSL_MODE", "prefer"),
@@ -325,7 +325,7 @@ class DatabaseManager:
         """創建數據庫引擎"""
         try:
             from sqlalchemy import create_engine
-            from sqlalchemy.pool import QueuePool
+            from sqlalchemy.pool import QueuePool, NullPool
             
             # 創建引擎
             if self.config.database_type == DatabaseType.POSTGRESQL:
@@ -341,10 +341,11 @@ class DatabaseManager:
                     pool_pre_ping=self.config.pool_pre_ping
                 )
             elif self.config.database_type == DatabaseType.SQLITE:
+                # SQLite 的文件鎖已串行化寫入，連接池只會增加等待
                 engine = create_engine(
                     self.config.connection_string,
-                    echo=self.config.echo,
-                    pool_pre_ping=self.config.pool_pre_ping
+                    poolclass=NullPool,
+                    echo=self.config.echo
                 )
             else:
                 raise ValueError(f"不支持的數據庫類型: {self.config.database_type}")
@@ -29,12 +29,19 @@ try:
     from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, AsyncEngine
     from sqlalchemy.orm import sessionmaker
     from sqlalchemy import text
-    from sqlalchemy.pool import QueuePool
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
     POSTGRESQL_AVAILABLE = True
 except ImportError:
     POSTGRESQL_AVAILABLE = False
     logging.warning("PostgreSQL依賴未安裝，PostgreSQL功能將被禁用")
 
+# 嘗試導入orjson（用於JSON/JSONB列的序列化）
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # 嘗試導入Redis依賴
 try:
     import redis.asyncio as redis
@@ -239,6 +246,14 @@ class DatabaseManager:
                 f"{self.config.host}:{self.config.port}/{self.config.database}"
             )
             
+            # JSON列序列化器，可用時使用orjson
+            json_options = {}
+            if ORJSON_AVAILABLE:
+                json_options = {
+                    'json_serializer': lambda obj: orjson.dumps(obj).decode(),
+                    'json_deserializer': orjson.loads
+                }
+            
             # 創建異步引擎
             self.engine = create_async_engine(
                 database_url,
@@ -247,7 +262,15 @@ class DatabaseManager:
                 max_overflow=self.config.max_overflow,
                 pool_timeout=self.config.pool_timeout,
                 pool_recycle=self.config.pool_recycle,
-                poolclass=QueuePool
+                pool_pre_ping=self.config.pool_pre_ping,
+                pool_use_lifo=True,
+                poolclass=AsyncAdaptedQueuePool,
+                connect_args={
+                    # 緩存預編譯語句，避免重複的類型內省查詢；關閉短查詢上得不償失的JIT
+                    'prepared_statement_cache_size': 512,
+                    'server_settings': {'jit': 'off'}
+                },
+                **json_options
             )
             
             # 創建會話工廠
@@ -346,8 +369,8 @@ class DatabaseManager:
                 name TEXT NOT NULL,
                 task_type TEXT NOT NULL,
                 status TEXT DEFAULT 'pending',
-                config TEXT,
-                result TEXT,
+                config BLOB,
+                result BLOB,
                 error_message TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -371,6 +394,17 @@ class DatabaseManager:
             )
             """,
             """
+            CREATE TABLE IF NOT EXISTS proxy_crawl_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                total_found INTEGER DEFAULT 0,
+                success BOOLEAN NOT NULL,
+                error_message TEXT,
+                extra_metadata BLOB,
+                crawled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
             CREATE INDEX IF NOT EXISTS idx_proxies_ip_port ON proxies(ip, port);
             """,
             """
@@ -380,6 +414,10 @@ class DatabaseManager:
             CREATE INDEX IF NOT EXISTS idx_proxies_is_active ON proxies(is_active);
             """,
             """
+            CREATE INDEX IF NOT EXISTS idx_proxies_active_rank
+            ON proxies(is_active, success_rate DESC, response_time ASC, protocol);
+            """,
+            """
             CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
             """,
             """
@@ -387,6 +425,9 @@ class DatabaseManager:
             """,
             """
             CREATE INDEX IF NOT EXISTS idx_proxy_sources_active ON proxy_sources(is_active);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_crawl_logs_source_time ON proxy_crawl_logs(source, crawled_at);
             """
         ]
         
@@ -428,7 +469,10 @@ class DatabaseManager:
                         # 字符串查詢
                         sql = str(query)
                     
-                    if params:
+                    if isinstance(params, list):
+                        # 參數列表使用executemany批量執行
+                        return await self.engine.executemany(sql, params)
+                    elif params:
                         return await self.engine.execute(sql, params)
                     else:
                         return await self.engine.execute(sql)
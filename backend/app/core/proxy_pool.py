@@ -5,21 +5,221 @@
 
 import asyncio
 import logging
-from typing import List, Optional, Dict, Any, Set
+from array import array
+from typing import List, Optional, Dict, Any, Set, Tuple, Sequence, Iterable, Union
+from collections import OrderedDict
+from collections.abc import Sequence as SequenceABC
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-import random
+from functools import lru_cache
 import json
 from pathlib import Path
 import aiohttp
-from sqlalchemy import text
+import numpy as np
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.postgresql import JSONB
+
+# 嘗試導入orjson（更快的JSON編碼）
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 from .database_manager import get_db_manager, DatabaseType
 from .config_manager import get_config
 from .metrics_collector import get_metrics_collector
 
 
-@dataclass
+# 流式查詢每批拉取的行數
+_STREAM_BATCH_SIZE = 1000
+
+# 批量導入：SQLite 每條多值INSERT的行數（14列 × 500行，需 SQLite >= 3.32）
+_BULK_IMPORT_CHUNK_SIZE = 500
+
+# 批量導入寫入的列，順序即COPY記錄/多值INSERT參數的順序
+_BULK_IMPORT_COLUMNS = (
+    "host", "port", "protocol", "country", "region", "city", "anonymity",
+    "speed", "uptime", "last_checked", "is_active", "source", "tags", "tags_bits"
+)
+
+# 查詢緩存鍵: (protocol, country, anonymity)
+_CacheKey = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+# 預編譯的熱路徑SQL，避免每次調用重新構建 text() 對象
+
+# 插入代理，重複的 (host, port) 由 ON CONFLICT 忽略
+_INSERT_PROXY = text("""
+    INSERT INTO proxy_servers 
+    (host, port, protocol, country, region, city, anonymity, 
+     speed, uptime, last_checked, is_active, source, tags, tags_bits)
+    VALUES (:host, :port, :protocol, :country, :region, :city, :anonymity, 
+            :speed, :uptime, :last_checked, :is_active, :source, :tags, :tags_bits)
+    ON CONFLICT (host, port) DO NOTHING
+""")
+
+# PostgreSQL 直接綁定標籤列表，由引擎的 json_serializer 編碼為 JSONB
+_INSERT_PROXY_PG = _INSERT_PROXY.bindparams(bindparam("tags", type_=JSONB))
+
+_SELECT_PROXY_BY_HOST_PORT = text(
+    "SELECT * FROM proxy_servers WHERE host = :host AND port = :port"
+)
+
+# 只更新驗證涉及的列
+_UPDATE_PROXY_STATUS_SQL = """
+    UPDATE proxy_servers
+    SET is_active = :is_active, speed = :speed,
+        last_checked = :last_checked, updated_at = CURRENT_TIMESTAMP
+    WHERE host = :host AND port = :port
+"""
+
+_UPDATE_PROXY_STATUS = text(_UPDATE_PROXY_STATUS_SQL)
+
+# PostgreSQL 單行更新同時返回id，調用方無需再 SELECT
+_UPDATE_PROXY_STATUS_RETURNING_ID = text(_UPDATE_PROXY_STATUS_SQL + "    RETURNING id\n")
+
+# 統計查詢：以 UNION ALL 合併為單次往返，每行以 kind 標識所屬統計項
+_PROXY_STATS = text("""
+    SELECT 'total' AS kind, NULL AS name, COUNT(*) AS n, NULL AS avg_speed
+    FROM proxy_servers
+    UNION ALL
+    SELECT 'active', NULL, COUNT(*), AVG(speed)
+    FROM proxy_servers
+    WHERE is_active = 1
+    UNION ALL
+    SELECT 'protocol', protocol, COUNT(*), NULL
+    FROM proxy_servers
+    WHERE is_active = 1
+    GROUP BY protocol
+    UNION ALL
+    SELECT 'country', country, n, NULL
+    FROM (
+        SELECT country, COUNT(*) AS n
+        FROM proxy_servers
+        WHERE is_active = 1 AND country IS NOT NULL
+        GROUP BY country
+        ORDER BY n DESC
+        LIMIT 10
+    ) AS top_countries
+""")
+
+
+# 已知標籤的位分配（只可追加，不可調整已有順序，最多63個）；
+# 已知標籤存入 tags_bits 整數列，其餘標籤仍以JSON存入 tags 列
+_KNOWN_TAGS = (
+    "http", "https", "socks4", "socks5",
+    "transparent", "anonymous", "elite",
+    "fast", "slow", "stable", "unstable", "verified",
+    "residential", "datacenter", "mobile", "free", "paid",
+)
+
+TAG_BITS: Dict[str, int] = {tag: 1 << i for i, tag in enumerate(_KNOWN_TAGS)}
+
+
+def tags_to_bits(tags: Iterable[str]) -> int:
+    """將標籤中的已知標籤編碼為位掩碼"""
+    bits = 0
+    for tag in tags:
+        bits |= TAG_BITS.get(tag, 0)
+    return bits
+
+
+@lru_cache(maxsize=256)
+def bits_to_tags(bits: int) -> frozenset:
+    """將位掩碼解碼為已知標籤集合"""
+    return frozenset(tag for tag, bit in TAG_BITS.items() if bits & bit)
+
+
+def _extra_tags(tags: Iterable[str]) -> List[str]:
+    """不在已知標籤表中、需以JSON保存的標籤"""
+    return sorted(tag for tag in tags if tag not in TAG_BITS)
+
+
+@lru_cache(maxsize=1024)
+def _encode_tags(tags: frozenset) -> str:
+    """將標籤集合編碼為JSON文本，相同標籤集合只編碼一次"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(sorted(tags)).decode()
+    return json.dumps(sorted(tags))
+
+
+def _tags_json(tags: Iterable[str]) -> str:
+    """未知標籤的JSON文本（無未知標籤時為空數組）"""
+    extra = _extra_tags(tags)
+    return _encode_tags(frozenset(extra)) if extra else "[]"
+
+
+@lru_cache(maxsize=8)
+def _bulk_insert_sql(rows: int) -> str:
+    """構建 rows 行的多值INSERT語句（SQLite，位置參數）"""
+    row_placeholders = "(" + ", ".join("?" for _ in _BULK_IMPORT_COLUMNS) + ")"
+    return (
+        f"INSERT INTO proxy_servers ({', '.join(_BULK_IMPORT_COLUMNS)}) VALUES "
+        + ", ".join(row_placeholders for _ in range(rows))
+        + " ON CONFLICT (host, port) DO NOTHING"
+    )
+
+
+def _build_active_proxy_queries() -> Dict[tuple, Any]:
+    """為 (protocol, country, anonymity) 是否過濾的8種組合預構建查詢"""
+    queries = {}
+    for use_protocol in (False, True):
+        for use_country in (False, True):
+            for use_anonymity in (False, True):
+                query = "SELECT * FROM proxy_servers WHERE is_active = 1"
+                if use_protocol:
+                    query += " AND protocol = :protocol"
+                if use_country:
+                    query += " AND country = :country"
+                if use_anonymity:
+                    query += " AND anonymity = :anonymity"
+                query += " ORDER BY uptime DESC, speed ASC"
+                queries[(use_protocol, use_country, use_anonymity)] = text(query)
+    return queries
+
+
+_SELECT_ACTIVE_PROXIES = _build_active_proxy_queries()
+
+
+def _build_random_proxy_queries(order_by: str) -> Dict[tuple, Any]:
+    """為隨機選取單個代理預構建只取必要列的查詢"""
+    queries = {}
+    for use_protocol in (False, True):
+        for use_country in (False, True):
+            for use_anonymity in (False, True):
+                query = (
+                    "SELECT id, host, port, protocol, country, anonymity, speed, uptime "
+                    "FROM proxy_servers WHERE is_active = 1"
+                )
+                if use_protocol:
+                    query += " AND protocol = :protocol"
+                if use_country:
+                    query += " AND country = :country"
+                if use_anonymity:
+                    query += " AND anonymity = :anonymity"
+                query += f" ORDER BY {order_by} LIMIT 1"
+                queries[(use_protocol, use_country, use_anonymity)] = text(query)
+    return queries
+
+
+# [0, 1) 均勻隨機數表達式；SQLite 的 RANDOM() 返回64位有符號整數
+_UNIFORM_RANDOM_SQL = {
+    "sqlite": "(RANDOM() / 18446744073709551616.0 + 0.5)",
+    "postgresql": "RANDOM()",
+}
+
+_SELECT_RANDOM_PROXY = _build_random_proxy_queries("RANDOM()")
+
+# 按 uptime 加權的隨機選取：取 -ln(1-u)/w 最小者（指數分佈競賽），
+# 每行被選中的概率與權重 w = uptime + 1 成正比
+_SELECT_WEIGHTED_PROXY = {
+    db_type: _build_random_proxy_queries(f"-LN(1.0 - {uniform}) / (uptime + 1.0)")
+    for db_type, uniform in _UNIFORM_RANDOM_SQL.items()
+}
+
+
+@dataclass(slots=True)
 class ProxyInfo:
     """代理服務器信息"""
     id: Optional[int] = None
@@ -50,6 +250,180 @@ class ProxyValidationResult:
     checked_at: datetime = field(default_factory=datetime.now)
 
 
+# 內存快照選取代理使用的隨機數生成器（SFC64 比默認 PCG64 更快，模塊級共享）
+_rng = np.random.Generator(np.random.SFC64())
+
+# 帶過濾條件加權選取時，每次從別名表中批量抽樣的個數
+_ALIAS_DRAWS = 32
+
+
+class ProxyTable(SequenceABC):
+    """代理列表的列式（SoA）快照
+    
+    緩存大量代理時以每列一個數組/元組的形式保存，避免每個代理一個對象；
+    按索引訪問時才構建 ProxyInfo。實現 Sequence 協議，可直接作為只讀代理列表使用。
+    協議、國家和匿名級別另以字典編碼的整數數組保存，過濾時可向量化比較。
+    """
+    
+    __slots__ = (
+        "ids", "hosts", "ports", "protocols", "countries", "regions", "cities",
+        "anonymities", "speeds", "uptimes", "last_checked", "is_active",
+        "created_at", "updated_at", "sources", "tags",
+        "protocol_codes", "country_codes", "anonymity_codes",
+        "protocol_vocab", "country_vocab", "anonymity_vocab",
+        "_alias_prob", "_alias_index"
+    )
+    
+    def __init__(self, proxies: Iterable[ProxyInfo] = ()):
+        proxies = list(proxies)
+        self.ids = np.array([p.id if p.id is not None else -1 for p in proxies], dtype=np.int64)
+        self.hosts = tuple(p.host for p in proxies)
+        self.ports = array("I", (p.port for p in proxies))
+        self.protocols = tuple(p.protocol for p in proxies)
+        self.countries = tuple(p.country for p in proxies)
+        self.regions = tuple(p.region for p in proxies)
+        self.cities = tuple(p.city for p in proxies)
+        self.anonymities = tuple(p.anonymity for p in proxies)
+        # 速度未知記為 NaN
+        self.speeds = np.array([p.speed if p.speed is not None else np.nan for p in proxies], dtype=np.float64)
+        self.uptimes = np.array([p.uptime for p in proxies], dtype=np.float64)
+        self.last_checked = tuple(p.last_checked for p in proxies)
+        self.is_active = np.array([p.is_active for p in proxies], dtype=np.bool_)
+        self.created_at = tuple(p.created_at for p in proxies)
+        self.updated_at = tuple(p.updated_at for p in proxies)
+        self.sources = tuple(p.source for p in proxies)
+        self.tags = tuple(frozenset(p.tags) for p in proxies)
+        self.protocol_vocab, self.protocol_codes = self._encode(self.protocols)
+        self.country_vocab, self.country_codes = self._encode(self.countries)
+        self.anonymity_vocab, self.anonymity_codes = self._encode(self.anonymities)
+        # uptime 加權抽樣的別名表，首次加權選取時構建
+        self._alias_prob: Optional[np.ndarray] = None
+        self._alias_index: Optional[np.ndarray] = None
+    
+    @staticmethod
+    def _encode(values: Tuple[Optional[str], ...]) -> Tuple[Dict[Optional[str], int], np.ndarray]:
+        """字典編碼：返回 值->編碼 映射和編碼數組"""
+        vocab: Dict[Optional[str], int] = {}
+        codes = np.fromiter(
+            (vocab.setdefault(v, len(vocab)) for v in values), dtype=np.int16, count=len(values)
+        )
+        return vocab, codes
+    
+    def __len__(self) -> int:
+        return len(self.hosts)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ProxyTable index out of range")
+        return self.row(index)
+    
+    def row(self, index: int) -> ProxyInfo:
+        """構建第 index 行的 ProxyInfo"""
+        proxy_id = int(self.ids[index])
+        speed = float(self.speeds[index])
+        return ProxyInfo(
+            id=proxy_id if proxy_id >= 0 else None,
+            host=self.hosts[index],
+            port=self.ports[index],
+            protocol=self.protocols[index],
+            country=self.countries[index],
+            region=self.regions[index],
+            city=self.cities[index],
+            anonymity=self.anonymities[index],
+            speed=None if np.isnan(speed) else speed,
+            uptime=float(self.uptimes[index]),
+            last_checked=self.last_checked[index],
+            is_active=bool(self.is_active[index]),
+            created_at=self.created_at[index],
+            updated_at=self.updated_at[index],
+            source=self.sources[index],
+            tags=set(self.tags[index])
+        )
+    
+    def mask(self, protocol: str = None, country: str = None, anonymity: str = None) -> np.ndarray:
+        """按過濾條件計算活動代理的布爾掩碼"""
+        mask = self.is_active.copy()
+        for value, vocab, codes in (
+            (protocol, self.protocol_vocab, self.protocol_codes),
+            (country, self.country_vocab, self.country_codes),
+            (anonymity, self.anonymity_vocab, self.anonymity_codes),
+        ):
+            if value:
+                code = vocab.get(value)
+                if code is None:
+                    return np.zeros(len(self), dtype=np.bool_)
+                mask &= codes == code
+        return mask
+    
+    def take(self, mask: np.ndarray) -> "ProxyTable":
+        """返回 mask 選中行組成的新快照，保持原有排序"""
+        return ProxyTable(self.row(int(i)) for i in np.flatnonzero(mask))
+    
+    def pick_random(self, mask: Optional[np.ndarray] = None) -> Optional[ProxyInfo]:
+        """在 mask 選中的行中均勻隨機選取一個代理"""
+        if mask is None:
+            if len(self) == 0:
+                return None
+            return self.row(int(_rng.integers(0, len(self))))
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return None
+        return self.row(int(candidates[_rng.integers(0, candidates.size)]))
+    
+    def pick_weighted(self, mask: Optional[np.ndarray] = None) -> Optional[ProxyInfo]:
+        """在 mask 選中的行中按 uptime 加權隨機選取一個代理（權重 uptime + 1）
+        
+        使用別名表 O(1) 抽樣；有過濾條件時批量抽樣並取第一個落在 mask 內的行，
+        全部未命中（過濾條件很窄）時退回按候選行累積權重二分查找。
+        """
+        if len(self) == 0:
+            return None
+        prob, alias = self._alias_table()
+        
+        if mask is None:
+            return self.row(self._alias_draw(prob, alias, 1)[0])
+        
+        draws = self._alias_draw(prob, alias, _ALIAS_DRAWS)
+        hits = draws[mask[draws]]
+        if hits.size:
+            return self.row(int(hits[0]))
+        
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return None
+        cumulative = np.cumsum(self.uptimes[candidates] + 1.0)
+        index = int(np.searchsorted(cumulative, _rng.random() * cumulative[-1], side="right"))
+        return self.row(int(candidates[min(index, candidates.size - 1)]))
+    
+    @staticmethod
+    def _alias_draw(prob: np.ndarray, alias: np.ndarray, size: int) -> np.ndarray:
+        """從別名表中抽取 size 個行索引"""
+        columns = _rng.integers(0, prob.size, size=size)
+        return np.where(_rng.random(size) < prob[columns], columns, alias[columns])
+    
+    def _alias_table(self) -> Tuple[np.ndarray, np.ndarray]:
+        """按 uptime + 1 構建（並緩存）Vose 別名表"""
+        if self._alias_prob is None:
+            n = len(self)
+            scaled = (self.uptimes + 1.0) * (n / (self.uptimes + 1.0).sum())
+            prob = np.ones(n, dtype=np.float64)
+            alias = np.arange(n, dtype=np.int64)
+            small = [i for i in range(n) if scaled[i] < 1.0]
+            large = [i for i in range(n) if scaled[i] >= 1.0]
+            while small and large:
+                lo, hi = small.pop(), large.pop()
+                prob[lo] = scaled[lo]
+                alias[lo] = hi
+                scaled[hi] -= 1.0 - scaled[lo]
+                (small if scaled[hi] < 1.0 else large).append(hi)
+            self._alias_prob, self._alias_index = prob, alias
+        return self._alias_prob, self._alias_index
+
+
 class ProxyPoolManager:
     """代理池管理器"""
     
@@ -61,12 +435,29 @@ class ProxyPoolManager:
         
         # 內存中的代理緩存
         self._proxy_cache: Dict[str, ProxyInfo] = {}
-        self._active_proxies: List[ProxyInfo] = []
-        self._cache_timestamp: Optional[datetime] = None
+        # 按 (protocol, country, anonymity) 過濾條件緩存查詢結果，LRU淘汰；
+        # 結果以不可變的列式快照保存，讀取時無需防禦性複製
+        self._query_cache: "OrderedDict[_CacheKey, Tuple[datetime, ProxyTable]]" = OrderedDict()
+        self._max_cache_entries = 32
         self._cache_ttl = timedelta(minutes=5)
         
-        # 延遲初始化數據庫管理器
-        self._initialized = False
+        # 驗證用的共享HTTP會話（延遲創建）
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        # 驗證請求的目標：只返回狀態碼、無響應體的靜態端點
+        self._validation_url = "http://httpbin.org/status/200"
+        
+        # 延遲初始化數據庫表：並發調用者等待同一次初始化完成
+        self._init_event = asyncio.Event()
+        self._init_lock = asyncio.Lock()
+    
+    async def _ensure_init(self):
+        """確保數據庫表只初始化一次"""
+        if self._init_event.is_set():
+            return
+        async with self._init_lock:
+            if not self._init_event.is_set():
+                await self._init_database()
+                self._init_event.set()
     
     async def _init_database(self):
         """初始化代理池數據庫表"""
@@ -81,7 +472,7 @@ class ProxyPoolManager:
             
             self.logger.info("代理池數據庫表初始化完成")
         except Exception as e:
-            self.logger.error(f"初始化代理池數據庫表失敗: {e}")
+            self.logger.error("初始化代理池數據庫表失敗: %s", e)
             raise
     
     async def _init_sqlite_tables(self):
@@ -105,12 +496,34 @@ class ProxyPoolManager:
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     source TEXT DEFAULT 'unknown',
                     tags TEXT DEFAULT '[]',
+                    tags_bits INTEGER DEFAULT 0,
                     UNIQUE(host, port)
                 )
             """))
             
+            # 舊表補充 tags_bits 列（SQLite 不支持 ADD COLUMN IF NOT EXISTS，先檢查列是否存在）
+            result = await session.execute(text("""
+                SELECT 1 FROM pragma_table_info('proxy_servers') WHERE name = 'tags_bits'
+            """))
+            if result.fetchone() is None:
+                await session.execute(text("""
+                    ALTER TABLE proxy_servers ADD COLUMN tags_bits INTEGER DEFAULT 0
+                """))
+            
+            # 位掩碼過濾（tags_bits & :mask）無法使用B樹索引，刪除舊版本創建的索引
+            await session.execute(text("""
+                DROP INDEX IF EXISTS idx_proxy_tags_bits;
+            """))
+            
+            # 覆蓋熱路徑過濾+排序查詢的複合索引，其前綴已包含 is_active 單列索引
+            await session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_proxy_filter_sort ON proxy_servers(
+                    is_active, protocol, country, anonymity, uptime DESC, speed ASC
+                );
+            """))
+            
             await session.execute(text("""
-                CREATE INDEX IF NOT EXISTS idx_proxy_active ON proxy_servers(is_active);
+                DROP INDEX IF EXISTS idx_proxy_active;
             """))
             
             await session.execute(text("""
@@ -144,12 +557,29 @@ class ProxyPoolManager:
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     source VARCHAR(50) DEFAULT 'unknown',
                     tags JSONB DEFAULT '[]'::jsonb,
+                    tags_bits BIGINT DEFAULT 0,
                     UNIQUE(host, port)
                 )
             """))
             
             await session.execute(text("""
-                CREATE INDEX IF NOT EXISTS idx_proxy_active ON proxy_servers(is_active);
+                ALTER TABLE proxy_servers ADD COLUMN IF NOT EXISTS tags_bits BIGINT DEFAULT 0
+            """))
+            
+            # 位掩碼過濾無法使用B樹索引，刪除舊版本創建的索引
+            await session.execute(text("""
+                DROP INDEX IF EXISTS idx_proxy_tags_bits;
+            """))
+            
+            # 只索引活動代理的部分複合索引，覆蓋熱路徑過濾+排序查詢
+            await session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_proxy_filter_sort ON proxy_servers(
+                    protocol, country, anonymity, uptime DESC, speed ASC
+                ) WHERE is_active;
+            """))
+            
+            await session.execute(text("""
+                DROP INDEX IF EXISTS idx_proxy_active;
             """))
             
             await session.execute(text("""
@@ -166,104 +596,187 @@ class ProxyPoolManager:
         """添加代理到池中"""
         try:
             # 延遲初始化數據庫
-            if not self._initialized:
-                await self._init_database()
-                self._initialized = True
+            await self._ensure_init()
             
-            # 檢查是否已存在
-            if await self._proxy_exists(proxy.host, proxy.port):
-                self.logger.warning(f"代理已存在: {proxy.host}:{proxy.port}")
+            # 插入數據庫（重複代理由 ON CONFLICT 忽略）
+            inserted = await self._insert_proxy(proxy)
+            if not inserted:
+                self.logger.warning("代理已存在: %s:%s", proxy.host, proxy.port)
                 return False
             
-            # 插入數據庫
-            success = await self._insert_proxy(proxy)
-            if success:
-                self.logger.info(f"添加代理成功: {proxy.host}:{proxy.port}")
-                self.metrics.increment("proxy_added_total", {"source": proxy.source})
-                # 清除緩存
-                self._clear_cache()
-                return True
-            
-            return False
+            self.logger.info("添加代理成功: %s:%s", proxy.host, proxy.port)
+            self.metrics.increment("proxy_added_total", {"source": proxy.source})
+            # 清除緩存
+            self._clear_cache()
+            return True
         except Exception as e:
-            self.logger.error(f"添加代理失敗: {e}")
+            self.logger.error("添加代理失敗: %s", e)
             return False
     
-    async def _proxy_exists(self, host: str, port: int) -> bool:
-        """檢查代理是否已存在"""
+    async def add_proxies(self, proxies: List[ProxyInfo]) -> int:
+        """批量添加代理到池中
+        
+        在單個會話內以executemany執行插入並只提交一次，
+        同一批次內重複的 host:port 只保留第一個。
+        
+        Args:
+            proxies: 待添加的代理列表
+            
+        Returns:
+            int: 驅動報告的新增行數（驅動無法統計時為 -1）
+        """
+        if not proxies:
+            return 0
+        
         try:
+            # 延遲初始化數據庫
+            await self._ensure_init()
+            
+            unique: Dict[tuple, ProxyInfo] = {}
+            for proxy in proxies:
+                unique.setdefault((proxy.host, proxy.port), proxy)
+            params = [self._proxy_to_params(p) for p in unique.values()]
+            
             async with self.db_manager.get_session() as session:
-                result = await session.execute(
-                    text("SELECT COUNT(*) FROM proxy_servers WHERE host = :host AND port = :port"),
-                    {"host": host, "port": port}
-                )
-                count = result.scalar()
-                return count > 0
+                result = await session.execute(self._insert_statement(), params)
+                await session.commit()
+            
+            inserted = result.rowcount
+            self.logger.info("批量添加代理完成: 提交 %s 個, 新增 %s 個", len(params), inserted)
+            self._clear_cache()
+            return inserted
         except Exception as e:
-            self.logger.error(f"檢查代理存在性失敗: {e}")
-            return False
+            self.logger.error("批量添加代理失敗: %s", e)
+            return 0
     
-    async def _insert_proxy(self, proxy: ProxyInfo) -> bool:
-        """插入代理到數據庫"""
+    async def bulk_import(self, proxies: List[ProxyInfo]) -> int:
+        """以數據庫原生批量路徑導入大量代理（用於初始灌庫）
+        
+        PostgreSQL 先以 COPY 寫入臨時表，再以單條 INSERT ... SELECT ... ON CONFLICT
+        併入 proxy_servers；SQLite 以每條 _BULK_IMPORT_CHUNK_SIZE 行的多值 INSERT 寫入。
+        
+        Args:
+            proxies: 待導入的代理列表
+            
+        Returns:
+            int: 新增的代理數
+        """
+        if not proxies:
+            return 0
+        
         try:
-            async with self.db_manager.get_session() as session:
-                tags_json = json.dumps(list(proxy.tags)) if proxy.tags else "[]"
-                
-                if self.config.database.type == "sqlite":
-                    await session.execute(
-                        text("""
-                            INSERT INTO proxy_servers 
-                            (host, port, protocol, country, region, city, anonymity, 
-                             speed, uptime, last_checked, is_active, source, tags)
-                            VALUES (:host, :port, :protocol, :country, :region, :city, :anonymity, 
-                                    :speed, :uptime, :last_checked, :is_active, :source, :tags)
-                        """),
-                        {
-                            "host": proxy.host, "port": proxy.port, "protocol": proxy.protocol,
-                            "country": proxy.country, "region": proxy.region, "city": proxy.city,
-                            "anonymity": proxy.anonymity, "speed": proxy.speed,
-                            "uptime": proxy.uptime, "last_checked": proxy.last_checked,
-                            "is_active": proxy.is_active, "source": proxy.source, "tags": tags_json
-                        }
-                    )
-                else:  # postgresql
-                    await session.execute(
-                        text("""
-                            INSERT INTO proxy_servers 
-                            (host, port, protocol, country, region, city, anonymity, 
-                             speed, uptime, last_checked, is_active, source, tags)
-                            VALUES (:host, :port, :protocol, :country, :region, :city, :anonymity, 
-                                    :speed, :uptime, :last_checked, :is_active, :source, :tags)
-                        """),
-                        {
-                            "host": proxy.host, "port": proxy.port, "protocol": proxy.protocol,
-                            "country": proxy.country, "region": proxy.region, "city": proxy.city,
-                            "anonymity": proxy.anonymity, "speed": proxy.speed,
-                            "uptime": proxy.uptime, "last_checked": proxy.last_checked,
-                            "is_active": proxy.is_active, "source": proxy.source, "tags": tags_json
-                        }
-                    )
-                
-                await session.commit()
-                return True
+            await self._ensure_init()
+            
+            # COPY 不經過 SQLAlchemy 的綁定類型，asyncpg 的 jsonb 編解碼器只接受文本，
+            # 因此兩種數據庫都以JSON文本傳遞標籤
+            records = [
+                (
+                    p.host, p.port, p.protocol, p.country, p.region, p.city, p.anonymity,
+                    p.speed, p.uptime, p.last_checked, p.is_active, p.source,
+                    _tags_json(p.tags), tags_to_bits(p.tags)
+                )
+                for p in proxies
+            ]
+            
+            if self.config.database.type == "postgresql":
+                inserted = await self._bulk_import_postgresql(records)
+            else:
+                inserted = await self._bulk_import_sqlite(records)
+            
+            self.logger.info("批量導入代理完成: 提交 %s 個, 新增 %s 個", len(records), inserted)
+            self._clear_cache()
+            return inserted
         except Exception as e:
-            self.logger.error(f"插入代理失敗: {e}")
-            return False
+            self.logger.error("批量導入代理失敗: %s", e)
+            return 0
+    
+    async def _bulk_import_postgresql(self, records: List[tuple]) -> int:
+        """PostgreSQL：COPY 到臨時表後合併"""
+        columns = ", ".join(_BULK_IMPORT_COLUMNS)
+        async with self.db_manager.get_session() as session:
+            await session.execute(text("""
+                CREATE TEMP TABLE proxy_servers_import
+                (LIKE proxy_servers INCLUDING DEFAULTS) ON COMMIT DROP
+            """))
+            
+            connection = await session.connection()
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                "proxy_servers_import", records=records, columns=list(_BULK_IMPORT_COLUMNS)
+            )
+            
+            result = await session.execute(text(f"""
+                INSERT INTO proxy_servers ({columns})
+                SELECT DISTINCT ON (host, port) {columns} FROM proxy_servers_import
+                ON CONFLICT (host, port) DO NOTHING
+            """))
+            await session.commit()
+            return result.rowcount
+    
+    async def _bulk_import_sqlite(self, records: List[tuple]) -> int:
+        """SQLite：分塊多值 INSERT"""
+        inserted = 0
+        async with self.db_manager.get_session() as session:
+            for start in range(0, len(records), _BULK_IMPORT_CHUNK_SIZE):
+                chunk = records[start:start + _BULK_IMPORT_CHUNK_SIZE]
+                params = tuple(value for record in chunk for value in record)
+                result = await session.execute(_bulk_insert_sql(len(chunk)), params)
+                inserted += result.rowcount
+            await session.commit()
+        return inserted
+    
+    def _proxy_to_params(self, proxy: ProxyInfo) -> Dict[str, Any]:
+        """將ProxyInfo轉換為INSERT綁定參數"""
+        return {
+            "host": proxy.host, "port": proxy.port, "protocol": proxy.protocol,
+            "country": proxy.country, "region": proxy.region, "city": proxy.city,
+            "anonymity": proxy.anonymity, "speed": proxy.speed,
+            "uptime": proxy.uptime, "last_checked": proxy.last_checked,
+            "is_active": proxy.is_active, "source": proxy.source,
+            "tags": self._tags_param(proxy.tags), "tags_bits": tags_to_bits(proxy.tags)
+        }
+    
+    def _tags_param(self, tags: Set[str]):
+        """未知標籤的綁定參數：PostgreSQL 直接傳列表，SQLite 傳緩存的JSON文本"""
+        if self.config.database.type == "postgresql":
+            return _extra_tags(tags)
+        return _tags_json(tags)
+    
+    def _insert_statement(self):
+        """按數據庫類型選擇插入語句"""
+        if self.config.database.type == "postgresql":
+            return _INSERT_PROXY_PG
+        return _INSERT_PROXY
+    
+    async def _insert_proxy(self, proxy: ProxyInfo) -> bool:
+        """插入代理到數據庫
+        
+        Returns:
+            bool: 是否插入了新行，代理已存在時返回 False
+        """
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(
+                self._insert_statement(),
+                self._proxy_to_params(proxy)
+            )
+            await session.commit()
+            return result.rowcount > 0
     
     async def get_proxy(self, protocol: str = "http", country: str = None, 
                        anonymity: str = None) -> Optional[ProxyInfo]:
         """獲取一個代理"""
         try:
-            # 獲取活動代理列表
-            proxies = await self.get_active_proxies(protocol, country, anonymity)
+            # 有未過期的全量快照時在內存中向量化選取，否則由數據庫按 uptime 加權隨機選取
+            snapshot = self._get_cached((None, None, None))
+            if snapshot is not None:
+                proxy = snapshot.pick_weighted(snapshot.mask(protocol, country, anonymity))
+            else:
+                proxy = await self.get_random_proxy(protocol, country, anonymity, weighted=True)
             
-            if not proxies:
-                self.logger.warning(f"沒有可用的代理: protocol={protocol}, country={country}")
+            if proxy is None:
+                self.logger.warning("沒有可用的代理: protocol=%s, country=%s", protocol, country)
                 return None
             
-            # 隨機選擇一個代理
-            proxy = random.choice(proxies)
-            
             # 更新使用統計
             self.metrics.increment("proxy_used_total", {
                 "protocol": protocol,
@@ -273,8 +786,73 @@ class ProxyPoolManager:
             
             return proxy
         except Exception as e:
-            self.logger.error(f"獲取代理失敗: {e}")
+            self.logger.error("獲取代理失敗: %s", e)
+            return None
+    
+    async def get_random_proxy(self, protocol: str = None, country: str = None,
+                               anonymity: str = None, weighted: bool = False) -> Optional[ProxyInfo]:
+        """隨機獲取一個活動代理的精簡信息
+        
+        隨機選取在數據庫中完成，只查詢使用代理所需的列，不解析標籤和時間戳；
+        需要完整信息時請使用 get_proxy_by_host_port。
+        
+        Args:
+            protocol: 協議過濾
+            country: 國家過濾
+            anonymity: 匿名級別過濾
+            weighted: 是否按 uptime 加權選取
+            
+        Returns:
+            Optional[ProxyInfo]: 精簡的代理信息，沒有匹配代理則返回 None
+        """
+        # 確保數據庫已初始化
+        await self._ensure_init()
+        
+        key = (bool(protocol), bool(country), bool(anonymity))
+        params = {}
+        
+        if protocol:
+            params["protocol"] = protocol
+        
+        if country:
+            params["country"] = country
+        
+        if anonymity:
+            params["anonymity"] = anonymity
+        
+        row = None
+        if weighted:
+            try:
+                row = await self._pick_random_proxy(
+                    _SELECT_WEIGHTED_PROXY[self.config.database.type][key], params
+                )
+            except Exception as e:
+                # 例如SQLite編譯時未啟用數學函數（LN），退回均勻隨機
+                self.logger.debug("加權隨機選取失敗，改用均勻隨機: %s", e)
+                weighted = False
+        
+        if not weighted:
+            row = await self._pick_random_proxy(_SELECT_RANDOM_PROXY[key], params)
+        
+        if row is None:
             return None
+        
+        return ProxyInfo(
+            id=row[0],
+            host=row[1],
+            port=row[2],
+            protocol=row[3],
+            country=row[4],
+            anonymity=row[5],
+            speed=row[6],
+            uptime=row[7] or 0.0
+        )
+    
+    async def _pick_random_proxy(self, query, params: Dict[str, Any]):
+        """執行隨機選取查詢並返回單行"""
+        async with self.db_manager.get_session() as session:
+            result = await session.execute(query, params)
+            return result.fetchone()
     
     async def get_proxy_by_host_port(self, host: str, port: int) -> Optional[ProxyInfo]:
         """根據 host 和 port 獲取指定代理
@@ -288,12 +866,11 @@ class ProxyPoolManager:
         """
         try:
             # 確保數據庫已初始化
-            if not self._initialized:
-                await self._init_database()
+            await self._ensure_init()
             
             async with self.db_manager.get_session() as session:
                 result = await session.execute(
-                    text("SELECT * FROM proxy_servers WHERE host = :host AND port = :port"),
+                    _SELECT_PROXY_BY_HOST_PORT,
                     {"host": host, "port": port}
                 )
                 row = result.fetchone()
@@ -303,11 +880,11 @@ class ProxyPoolManager:
                 return None
             
         except Exception as e:
-            self.logger.error(f"根據 host/port 獲取代理失敗: {e}")
+            self.logger.error("根據 host/port 獲取代理失敗: %s", e)
             return None
     
     async def get_active_proxies(self, protocol: str = None, country: str = None, 
-                                anonymity: str = None) -> List[ProxyInfo]:
+                                anonymity: str = None) -> Sequence[ProxyInfo]:
         """獲取活動代理列表
         
         Args:
@@ -316,80 +893,126 @@ class ProxyPoolManager:
             anonymity: 匿名級別過濾
             
         Returns:
-            List[ProxyInfo]: 活動代理列表
+            Sequence[ProxyInfo]: 活動代理的只讀快照
         """
         try:
             # 確保數據庫已初始化
-            if not self._initialized:
-                await self._init_database()
-                self._initialized = True
+            await self._ensure_init()
             
             # 檢查緩存是否有效
-            if self._is_cache_valid() and not any([protocol, country, anonymity]):
-                return self._active_proxies.copy()
+            key = (protocol, country, anonymity)
+            cached = self._get_cached(key)
+            if cached is not None:
+                return cached
+            
+            # 帶過濾條件時，可由未過期的全量快照或同協議分區快照向量化過濾得到
+            parents = [(None, None, None)]
+            partition = (protocol, None, None)
+            if protocol and key != partition:
+                parents.append(partition)
+            if any(key):
+                for parent in parents:
+                    snapshot = self._get_cached(parent)
+                    if snapshot is not None:
+                        return self._derive_cached(key, parent, snapshot)
+            
+            # 按協議過濾時整個協議分區入緩存，同協議的其他過濾條件隨後在內存中完成
+            if protocol:
+                snapshot = ProxyTable(await self._query_proxies(protocol))
+                self._set_cached(partition, snapshot)
+                if key == partition:
+                    return snapshot
+                return self._derive_cached(key, partition, snapshot)
             
             # 從數據庫查詢
-            proxies = await self._query_proxies(protocol, country, anonymity)
+            proxies = ProxyTable(await self._query_proxies(protocol, country, anonymity))
             
             # 更新緩存
-            if not any([protocol, country, anonymity]):
-                self._active_proxies = proxies.copy()
-                self._cache_timestamp = datetime.now()
+            self._set_cached(key, proxies)
             
             return proxies
         except Exception as e:
-            self.logger.error(f"獲取活動代理列表失敗: {e}")
-            return []
+            self.logger.error("獲取活動代理列表失敗: %s", e)
+            return ProxyTable()
     
-    def _is_cache_valid(self) -> bool:
-        """檢查緩存是否有效"""
-        if self._cache_timestamp is None:
-            return False
-        return datetime.now() - self._cache_timestamp < self._cache_ttl
+    def _get_cached(self, key: _CacheKey) -> Optional[ProxyTable]:
+        """讀取未過期的緩存結果，命中時標記為最近使用"""
+        entry = self._query_cache.get(key)
+        if entry is None:
+            return None
+        
+        cached_at, proxies = entry
+        if datetime.now() - cached_at >= self._cache_ttl:
+            del self._query_cache[key]
+            return None
+        
+        self._query_cache.move_to_end(key)
+        return proxies
+    
+    def _derive_cached(self, key: _CacheKey, parent: _CacheKey, snapshot: ProxyTable) -> ProxyTable:
+        """由父快照過濾出 key 對應的結果並緩存，過期時間跟隨父快照"""
+        proxies = snapshot.take(snapshot.mask(*key))
+        self._set_cached(key, proxies, self._query_cache[parent][0])
+        return proxies
+    
+    def _set_cached(self, key: _CacheKey, proxies: ProxyTable, cached_at: datetime = None):
+        """寫入緩存結果，超出容量時淘汰最久未使用的條目"""
+        self._query_cache[key] = (cached_at or datetime.now(), proxies)
+        self._query_cache.move_to_end(key)
+        while len(self._query_cache) > self._max_cache_entries:
+            self._query_cache.popitem(last=False)
     
     def _clear_cache(self):
-        """清除緩存"""
-        self._active_proxies.clear()
-        self._cache_timestamp = None
+        """清除緩存（整體替換為新字典，正在讀取的快照不受影響）"""
+        self._query_cache = OrderedDict()
     
     async def _query_proxies(self, protocol: str = None, country: str = None, 
                            anonymity: str = None) -> List[ProxyInfo]:
         """從數據庫查詢代理"""
         try:
             async with self.db_manager.get_session() as session:
-                # 構建查詢
-                query = "SELECT * FROM proxy_servers WHERE is_active = 1"
+                # 選擇預構建的查詢
+                query = _SELECT_ACTIVE_PROXIES[(bool(protocol), bool(country), bool(anonymity))]
                 params = {}
                 
                 if protocol:
-                    query += " AND protocol = :protocol"
                     params["protocol"] = protocol
                 
                 if country:
-                    query += " AND country = :country"
                     params["country"] = country
                 
                 if anonymity:
-                    query += " AND anonymity = :anonymity"
                     params["anonymity"] = anonymity
                 
-                query += " ORDER BY uptime DESC, speed ASC"
-                
-                result = await session.execute(text(query), params)
-                rows = result.fetchall()
-                
-                # 轉換為ProxyInfo對象
+                # 逐批讀取並即時轉換為ProxyInfo對象，不先物化全部行
                 proxies = []
-                for row in rows:
+                async for row in self._stream_rows(session, query, params):
                     proxy = self._row_to_proxy(row)
                     if proxy:
                         proxies.append(proxy)
                 
                 return proxies
         except Exception as e:
-            self.logger.error(f"查詢代理失敗: {e}")
+            self.logger.error("查詢代理失敗: %s", e)
             return []
     
+    async def _stream_rows(self, session, query, params: Dict[str, Any]):
+        """流式迭代查詢結果
+        
+        PostgreSQL 使用服務端游標按 _STREAM_BATCH_SIZE 分批拉取；
+        SQLite 適配器在工作線程中取回結果後逐行迭代。
+        """
+        if self.config.database.type == "postgresql":
+            result = await session.stream(
+                query, params, execution_options={"yield_per": _STREAM_BATCH_SIZE}
+            )
+            async for row in result:
+                yield row
+        else:
+            result = await session.execute(query, params)
+            for row in result:
+                yield row
+    
     def _row_to_proxy(self, row) -> Optional[ProxyInfo]:
         """將數據庫行轉換為ProxyInfo對象"""
         try:
@@ -411,7 +1034,10 @@ class ProxyPoolManager:
                     created_at=row[12],
                     updated_at=row[13],
                     source=row[14],
-                    tags=set(json.loads(row[15]) if row[15] else [])
+                    tags=self._decode_tags(
+                        row[16],
+                        json.loads(row[15]) if row[15] and row[15] != "[]" else ()
+                    )
                 )
             else:  # postgresql
                 return ProxyInfo(
@@ -430,68 +1056,134 @@ class ProxyPoolManager:
                     created_at=row[12],
                     updated_at=row[13],
                     source=row[14],
-                    tags=set(row[15]) if row[15] else set()
+                    tags=self._decode_tags(row[16], row[15] or ())
                 )
         except Exception as e:
-            self.logger.error(f"轉換代理數據失敗: {e}")
+            self.logger.error("轉換代理數據失敗: %s", e)
             return None
     
-    async def validate_proxy(self, proxy: ProxyInfo, test_url: str = "http://httpbin.org/ip") -> ProxyValidationResult:
+    @staticmethod
+    def _decode_tags(bits: Optional[int], extra: Iterable[str]) -> Set[str]:
+        """由 tags_bits 與JSON中的其餘標籤還原標籤集合"""
+        tags = set(bits_to_tags(bits)) if bits else set()
+        tags.update(extra)
+        return tags
+    
+    async def _get_http_session(self) -> aiohttp.ClientSession:
+        """獲取共享的HTTP會話
+        
+        會話在首次使用時創建，並在所有驗證請求間復用，
+        使連接保活、DNS緩存和TLS上下文得以攤銷。
+        
+        Returns:
+            aiohttp.ClientSession: 共享HTTP會話
+        """
+        if self._http_session is None or self._http_session.closed:
+            connector = aiohttp.TCPConnector(
+                ssl=False,
+                limit=0,
+                limit_per_host=0,
+                ttl_dns_cache=300
+            )
+            self._http_session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=10),
+                connector=connector,
+                trust_env=True
+            )
+        return self._http_session
+    
+    async def close(self):
+        """關閉代理池管理器持有的資源"""
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+        self._http_session = None
+    
+    async def validate_proxy(self, proxy: ProxyInfo, test_url: str = None) -> ProxyValidationResult:
         """驗證代理的有效性"""
-        import aiohttp
-        import asyncio
+        result = await self._probe_proxy(proxy, test_url)
+        await self._update_proxy_status(proxy)
+        return result
+    
+    async def validate_proxies(self, proxies: List[ProxyInfo], concurrency: int = 200) -> List[ProxyValidationResult]:
+        """批量驗證代理
+        
+        通過信號量限制並發數，所有驗證共享同一HTTP會話，
+        驗證完成後以單次批量UPDATE寫回數據庫。
+        
+        Args:
+            proxies: 待驗證的代理列表
+            concurrency: 最大並發驗證數
+            
+        Returns:
+            List[ProxyValidationResult]: 與輸入順序一致的驗證結果
+        """
+        if not proxies:
+            return []
         
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def _one(proxy: ProxyInfo) -> ProxyValidationResult:
+            async with semaphore:
+                return await self._probe_proxy(proxy)
+        
+        outcomes = await asyncio.gather(*(_one(p) for p in proxies), return_exceptions=True)
+        
+        results = []
+        for proxy, outcome in zip(proxies, outcomes):
+            if isinstance(outcome, BaseException):
+                proxy.is_active = False
+                outcome = ProxyValidationResult(proxy, False, None, f"代理驗證錯誤: {proxy.host}:{proxy.port} - {outcome}")
+            results.append(outcome)
+        
+        await self._update_proxies_status(proxies)
+        return results
+    
+    async def _probe_proxy(self, proxy: ProxyInfo, test_url: str = None) -> ProxyValidationResult:
+        """發送測試請求並更新代理對象的狀態字段（不寫數據庫）
+        
+        只發送一次HEAD請求，不下載響應體；代理需要按請求指定，
+        因此沿用支持單請求代理的共享 aiohttp 會話。
+        """
         start_time = datetime.now()
         
         try:
             # 設置代理
             proxy_url = f"{proxy.protocol}://{proxy.host}:{proxy.port}"
             
-            # 創建連接器
-            timeout = aiohttp.ClientTimeout(total=30)
-            connector = aiohttp.TCPConnector(ssl=False)
+            session = await self._get_http_session()
             
-            async with aiohttp.ClientSession(timeout=timeout, connector=connector, trust_env=True) as session:
-                # 測試請求
-                test_urls = ["http://httpbin.org/ip", "https://httpbin.org/ip"]
-                
-                for test_url in test_urls:
-                    try:
-                        async with session.get(
-                            test_url,
-                            proxy=proxy_url,
-                            timeout=aiohttp.ClientTimeout(total=10)
-                        ) as response:
-                            if response.status == 200:
-                                response_time = (datetime.now() - start_time).total_seconds()
-                                
-                                # 更新代理信息
-                                proxy.speed = response_time
-                                proxy.last_checked = datetime.now()
-                                proxy.is_active = True
-                                
-                                # 更新數據庫
-                                await self._update_proxy_status(proxy)
-                                
-                                self.logger.info(f"代理驗證成功: {proxy.host}:{proxy.port} ({response_time:.2f}s)")
-                                self.metrics.increment("proxy_validation_success_total")
-                                
-                                return ProxyValidationResult(proxy, True, response_time)
-                    except Exception:
-                        continue
+            status = None
+            try:
+                async with session.head(test_url or self._validation_url, proxy=proxy_url) as response:
+                    status = response.status
+            except Exception:
+                pass
+            
+            if status == 200:
+                response_time = (datetime.now() - start_time).total_seconds()
                 
-                # 所有測試都失敗
-                proxy.is_active = False
-                await self._update_proxy_status(proxy)
+                # 更新代理信息
+                proxy.speed = response_time
+                proxy.last_checked = datetime.now()
+                proxy.is_active = True
                 
-                self.logger.warning(f"代理驗證失敗: {proxy.host}:{proxy.port} (所有測試請求都失敗)")
-                self.metrics.increment("proxy_validation_failure_total")
+                self.logger.info("代理驗證成功: %s:%s (%.2fs)", proxy.host, proxy.port, response_time)
+                self.metrics.increment("proxy_validation_success_total")
                 
-                return ProxyValidationResult(proxy, False, None, "所有測試請求都失敗")
+                return ProxyValidationResult(proxy, True, response_time)
+            
+            # 測試請求失敗
+            proxy.is_active = False
+            proxy.last_checked = datetime.now()
+            
+            self.logger.warning("代理驗證失敗: %s:%s (狀態碼: %s)", proxy.host, proxy.port, status)
+            self.metrics.increment("proxy_validation_failure_total")
+            
+            return ProxyValidationResult(proxy, False, None, "測試請求失敗")
         
         except Exception as e:
             proxy.is_active = False
-            await self._update_proxy_status(proxy)
+            proxy.last_checked = datetime.now()
             
             error_message = f"代理驗證錯誤: {proxy.host}:{proxy.port} - {e}"
             self.logger.error(error_message)
@@ -499,98 +1191,128 @@ class ProxyPoolManager:
             
             return ProxyValidationResult(proxy, False, None, error_message)
     
-    async def update_proxy_status(self, proxy_info: ProxyInfo) -> bool:
+    async def _update_proxy_status(self, proxy: ProxyInfo) -> bool:
+        """將單個代理的驗證狀態寫回數據庫"""
+        return await self.update_proxy_status(proxy)
+    
+    @staticmethod
+    def _status_params(proxy: ProxyInfo) -> Dict[str, Any]:
+        """驗證狀態UPDATE的綁定參數"""
+        return {
+            "is_active": proxy.is_active, "speed": proxy.speed,
+            "last_checked": proxy.last_checked,
+            "host": proxy.host, "port": proxy.port
+        }
+    
+    async def _update_proxies_status(self, proxies: List[ProxyInfo]) -> bool:
+        """以單次executemany將驗證狀態寫回數據庫"""
+        try:
+            await self._ensure_init()
+            
+            params = [self._status_params(p) for p in proxies]
+            
+            async with self.db_manager.get_session() as session:
+                await session.execute(_UPDATE_PROXY_STATUS, params)
+                await session.commit()
+            
+            self._clear_cache()
+            return True
+        except Exception as e:
+            self.logger.error("更新代理驗證狀態失敗: %s", e)
+            return False
+    
+    async def update_proxy_status(self, proxy_info: Union[ProxyInfo, List[ProxyInfo]]) -> bool:
         """更新代理狀態
         
+        只寫入驗證涉及的列（is_active、speed、last_checked、updated_at）；
+        傳入列表時以單次executemany批量更新。
+        
         Args:
-            proxy_info: 代理信息
+            proxy_info: 代理信息或代理信息列表
             
         Returns:
-            bool: 是否更新成功
+            bool: 是否更新成功（單個代理不存在時返回 False）
         """
+        if isinstance(proxy_info, list):
+            return await self._update_proxies_status(proxy_info)
+        
         try:
             # 確保數據庫已初始化
-            if not self._initialized:
-                await self._init_database()
+            await self._ensure_init()
+            
+            params = self._status_params(proxy_info)
             
             async with self.db_manager.get_session() as session:
-                await session.execute(
-                    text("""UPDATE proxy_pool 
-                           SET is_active = :is_active, success_rate = :success_rate, 
-                               response_time = :response_time, last_checked = :last_checked, 
-                               updated_at = :updated_at
-                           WHERE ip = :ip AND port = :port"""),
-                    {
-                        'is_active': proxy_info.is_active, 'success_rate': proxy_info.success_rate,
-                        'response_time': proxy_info.response_time, 'last_checked': proxy_info.last_checked,
-                        'updated_at': datetime.now(), 'ip': proxy_info.ip, 'port': proxy_info.port
-                    }
-                )
+                if self.config.database.type == "postgresql":
+                    result = await session.execute(_UPDATE_PROXY_STATUS_RETURNING_ID, params)
+                    proxy_id = result.scalar()
+                    updated = proxy_id is not None
+                    if updated:
+                        proxy_info.id = proxy_id
+                else:
+                    result = await session.execute(_UPDATE_PROXY_STATUS, params)
+                    updated = result.rowcount > 0
                 await session.commit()
             
-            logger.info(f"更新代理狀態成功: {proxy_info.ip}:{proxy_info.port}")
-            return True
+            self._clear_cache()
+            
+            if not updated:
+                self.logger.warning("更新代理狀態失敗，代理不存在: %s:%s", proxy_info.host, proxy_info.port)
+            return updated
             
         except Exception as e:
-            logger.error(f"更新代理狀態失敗: {str(e)}")
+            self.logger.error("更新代理狀態失敗: %s", e)
             return False
     
     async def get_stats(self) -> Dict[str, Any]:
         """獲取代理池統計信息"""
         try:
             # 確保數據庫已初始化
-            if not self._initialized:
-                await self._init_database()
+            await self._ensure_init()
             
             async with self.db_manager.get_session() as session:
-                # 總代理數
-                result = await session.execute(text("SELECT COUNT(*) FROM proxy_servers"))
-                total_proxies = result.scalar()
-                
-                # 活動代理數
-                result = await session.execute(text("SELECT COUNT(*) FROM proxy_servers WHERE is_active = 1"))
-                active_proxies = result.scalar()
-                
-                # 按協議統計
-                result = await session.execute(text("""
-                    SELECT protocol, COUNT(*) as count 
-                    FROM proxy_servers 
-                    WHERE is_active = 1 
-                    GROUP BY protocol
-                """))
-                protocol_stats = dict(result.fetchall())
-                
-                # 按國家統計
-                result = await session.execute(text("""
-                    SELECT country, COUNT(*) as count 
-                    FROM proxy_servers 
-                    WHERE is_active = 1 AND country IS NOT NULL
-                    GROUP BY country
-                    ORDER BY count DESC
-                    LIMIT 10
-                """))
-                country_stats = dict(result.fetchall())
-                
-                # 平均速度
-                result = await session.execute(text("SELECT AVG(speed) FROM proxy_servers WHERE is_active = 1 AND speed IS NOT NULL"))
-                avg_speed = result.scalar() or 0
-                
-                return {
-                    "total_proxies": total_proxies,
-                    "active_proxies": active_proxies,
-                    "inactive_proxies": total_proxies - active_proxies,
-                    "availability_rate": (active_proxies / total_proxies * 100) if total_proxies > 0 else 0,
-                    "protocol_distribution": protocol_stats,
-                    "top_countries": country_stats,
-                    "average_speed": round(avg_speed, 3) if avg_speed else None
-                }
+                result = await session.execute(_PROXY_STATS)
+                rows = result.fetchall()
+            
+            total_proxies = 0
+            active_proxies = 0
+            avg_speed = 0
+            protocol_stats = {}
+            country_stats = {}
+            
+            for kind, name, count, speed in rows:
+                if kind == "total":
+                    total_proxies = count
+                elif kind == "active":
+                    active_proxies = count
+                    avg_speed = speed or 0
+                elif kind == "protocol":
+                    protocol_stats[name] = count
+                else:
+                    country_stats[name] = count
+            
+            # UNION ALL 不保證子查詢排序，按數量重新排序
+            country_stats = dict(sorted(country_stats.items(), key=lambda item: item[1], reverse=True))
+            
+            return {
+                "total_proxies": total_proxies,
+                "active_proxies": active_proxies,
+                "inactive_proxies": total_proxies - active_proxies,
+                "availability_rate": (active_proxies / total_proxies * 100) if total_proxies > 0 else 0,
+                "protocol_distribution": protocol_stats,
+                "top_countries": country_stats,
+                "average_speed": round(avg_speed, 3) if avg_speed else None
+            }
         except Exception as e:
-            self.logger.error(f"獲取代理統計失敗: {e}")
+            self.logger.error("獲取代理統計失敗: %s", e)
             return {}
     
     async def cleanup_inactive_proxies(self, days: int = 7) -> int:
         """清理不活動的代理"""
         try:
+            # 確保數據庫已初始化
+            await self._ensure_init()
+            
             cutoff_date = datetime.now() - timedelta(days=days)
             
             async with self.db_manager.get_session() as session:
@@ -614,12 +1336,12 @@ class ProxyPoolManager:
                 deleted_count = result.rowcount
                 await session.commit()
             
-            self.logger.info(f"清理了 {deleted_count} 個不活動代理")
+            self.logger.info("清理了 %s 個不活動代理", deleted_count)
             self._clear_cache()
             
             return deleted_count
         except Exception as e:
-            self.logger.error(f"清理不活動代理失敗: {e}")
+            self.logger.error("清理不活動代理失敗: %s", e)
             return 0
 
 
@@ -640,5 +1362,13 @@ async def get_proxy_pool_manager() -> ProxyPoolManager:
         db_manager = get_db_manager()
         if not db_manager._initialized:
             await db_manager.initialize()
-        await _proxy_pool_manager._init_database()
-    return _proxy_pool_manager
\ No newline at end of file
+        await _proxy_pool_manager._ensure_init()
+    return _proxy_pool_manager
+
+
+async def close_proxy_pool_manager():
+    """關閉全局代理池管理器"""
+    global _proxy_pool_manager
+    if _proxy_pool_manager:
+        await _proxy_pool_manager.close()
+        _proxy_pool_manager = None
@@ -7,13 +7,138 @@ SQLite數據庫適配器
 import sqlite3
 import asyncio
 import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
 from datetime import datetime, date
 import logging
 
+# 嘗試導入orjson（更快的JSON解析）
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# 顯式註冊日期時間適配器（與舊默認格式相同；Python 3.12 起默認適配器已棄用）
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+# 布爾值按整數綁定
+sqlite3.register_adapter(bool, int)
+
+# 寫入時由SQLite生成的時間戳（UTC，與列默認值 CURRENT_TIMESTAMP 一致）
+_SQL_NOW = "datetime('now')"
+
+# 驗證結果批量寫回：參數為 (is_active, success_rate, response_time, id)
+_UPDATE_PROXY_STATUS_BULK = (
+    "UPDATE proxies SET is_active = ?, success_rate = ?, response_time = ?, "
+    "updated_at = datetime('now') WHERE id = ?"
+)
+
+# 抓取結果按 (ip, port) 批量寫入：參數為 (ip, port, protocol, country, anonymity_level)。
+# 表上不一定有 (ip, port) 唯一約束，先更新已存在的行（空值不覆蓋原值），再插入不存在的行
+_UPSERT_PROXY_UPDATE = (
+    "UPDATE proxies SET protocol = COALESCE(?3, protocol), country = COALESCE(?4, country), "
+    "anonymity_level = COALESCE(?5, anonymity_level), updated_at = datetime('now') "
+    "WHERE ip = ?1 AND port = ?2"
+)
+_UPSERT_PROXY_INSERT = (
+    "INSERT INTO proxies (ip, port, protocol, country, anonymity_level) "
+    "SELECT ?1, ?2, ?3, ?4, ?5 WHERE NOT EXISTS (SELECT 1 FROM proxies WHERE ip = ?1 AND port = ?2)"
+)
+
+# 空結果/錯誤信息不覆蓋原值；開始/完成時間直接寫入任務對象上的值，
+# 合併後的最終狀態不依賴中間狀態（如未單獨寫出的 running）也能保留開始時間，重試時可清空
+_UPDATE_TASK_STATUS_BULK = (
+    "UPDATE tasks SET status = ?1, result = COALESCE(?2, result), "
+    "error_message = COALESCE(?3, error_message), updated_at = datetime('now'), "
+    "started_at = ?4, completed_at = ?5 "
+    "WHERE id = ?6"
+)
+
+
+def _with_int_is_active(proxy_data: Dict[str, Any]) -> Dict[str, Any]:
+    """將 is_active 轉為 0/1 整數（返回新字典，不修改調用方數據）"""
+    if 'is_active' not in proxy_data:
+        return proxy_data
+    return {**proxy_data, 'is_active': 1 if proxy_data['is_active'] else 0}
+
+# 每個連接緩存的預編譯語句數（sqlite3 按SQL文本查找，默認128）
+_CACHED_STATEMENTS = 256
+
+
+# 新建數據庫的頁大小（與 auto_vacuum 一樣只能在寫入第一頁之前設置）
+_PAGE_SIZE = 8192
+
+# 連接級性能PRAGMA：256MB mmap、64MB頁緩存、臨時表放內存、每1000頁自動checkpoint。
+# 忙等待時間由 connect 的 timeout 參數設置，這裡不再覆蓋
+_PERFORMANCE_PRAGMAS = """
+PRAGMA mmap_size = 268435456;
+PRAGMA cache_size = -65536;
+PRAGMA temp_store = MEMORY;
+PRAGMA wal_autocheckpoint = 1000;
+"""
+
+
+def apply_performance_pragmas(conn: sqlite3.Connection):
+    """為新打開的連接設置性能相關的PRAGMA（須在切換WAL模式之前調用）"""
+    if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+        conn.execute(f"PRAGMA page_size = {_PAGE_SIZE}")
+        # 刪除產生的空閒頁可由 incremental_vacuum 分批回收，無需整庫 VACUUM
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.executescript(_PERFORMANCE_PRAGMAS)
+
+
+def _json_loads(value: Union[str, bytes]) -> Any:
+    """解析JSON文本，可用時使用orjson"""
+    return orjson.loads(value) if ORJSON_AVAILABLE else json.loads(value)
+
+
+def _json_dumps(value: Any) -> bytes:
+    """序列化為UTF-8 JSON字節（以BLOB存儲，讀取時無需文本校驗），可用時使用orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def _decode_json_fields(record: Dict[str, Any], fields: tuple = ('config', 'result')) -> Dict[str, Any]:
+    """原地反序列化記錄中的JSON字段（只處理仍為文本或字節的值）"""
+    for field_name in fields:
+        value = record.get(field_name)
+        if value and isinstance(value, (str, bytes)):
+            try:
+                record[field_name] = _json_loads(value)
+            except (ValueError, TypeError):
+                pass
+    return record
+
+
+@lru_cache(maxsize=256)
+def _build_insert_sql(table: str, columns: tuple) -> str:
+    """構建（並緩存）INSERT語句；相同的列集合得到同一SQL文本，從而命中語句緩存"""
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+@lru_cache(maxsize=256)
+def _build_update_sql(table: str, columns: tuple, where_clause: str, raw_set: tuple = ()) -> str:
+    """構建（並緩存）UPDATE語句；raw_set 為 (列名, SQL表達式) 元組"""
+    assignments = [f"{column} = ?" for column in columns]
+    assignments += [f"{column} = {expression}" for column, expression in raw_set]
+    return f"UPDATE {table} SET {', '.join(assignments)} WHERE {where_clause}"
+
+
+@lru_cache(maxsize=256)
+def _build_delete_sql(table: str, where_clause: str) -> str:
+    """構建（並緩存）DELETE語句"""
+    return f"DELETE FROM {table} WHERE {where_clause}"
+
 
 class SQLiteAdapter:
     """SQLite數據庫適配器"""
@@ -31,6 +156,8 @@ class SQLiteAdapter:
         # 確保數據目錄存在
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self._connection = None
+        self._cursor: Optional[sqlite3.Cursor] = None  # insert 復用的游標
+        self._transaction_depth = 0  # transaction() 嵌套深度，大於0時單條語句不自動提交
         self.echo = echo  # 日誌回顯設置
         
     def get_connection(self) -> sqlite3.Connection:
@@ -39,84 +166,183 @@ class SQLiteAdapter:
             self._connection = sqlite3.connect(
                 self.db_path,
                 check_same_thread=False,  # 允許多線程使用
-                timeout=30.0  # 超時時間
+                timeout=30.0,  # 超時時間
+                cached_statements=_CACHED_STATEMENTS
             )
-            # 設置行工廠，返回字典格式的結果
-            self._connection.row_factory = self._dict_factory
+            # sqlite3.Row 在C層同時支持按索引和按列名訪問，無需逐行構建字典
+            self._connection.row_factory = sqlite3.Row
+            # 頁大小、緩存和mmap
+            apply_performance_pragmas(self._connection)
             # 啟用外鍵支持
             self._connection.execute("PRAGMA foreign_keys = ON")
-            # 設置同步模式
+            # 設置同步模式（WAL 模式下 NORMAL 仍保證崩潰後數據庫一致）
             self._connection.execute("PRAGMA synchronous = NORMAL")
             # 設置日誌模式
             self._connection.execute("PRAGMA journal_mode = WAL")
             
         return self._connection
     
-    def _dict_factory(self, cursor, row):
-        """將行轉換為字典"""
-        fields = [column[0] for column in cursor.description]
-        return {key: value for key, value in zip(fields, row)}
+    @staticmethod
+    def _column_names(cursor: sqlite3.Cursor) -> tuple:
+        """結果集的列名（每次查詢只讀取一次 description）"""
+        return tuple(column[0] for column in cursor.description)
     
     def execute(self, query: str, params: tuple = None) -> sqlite3.Cursor:
-        """執行SQL查詢"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        """執行SQL查詢（寫語句在 transaction() 之外時立即提交）"""
+        return self._execute_on(self.get_connection().cursor(), query, params)
+    
+    def _execute_raw(self, cursor: sqlite3.Cursor, query: str, params: tuple = None) -> sqlite3.Cursor:
+        """在指定游標上執行SQL，不提交"""
         # 日誌回顯
         if self.echo:
             logger.info(f"執行SQL: {query}")
             if params:
                 logger.info(f"參數: {params}")
         
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        return cursor
+    
+    def _execute_on(self, cursor: sqlite3.Cursor, query: str, params: tuple = None) -> sqlite3.Cursor:
+        """在指定游標上執行SQL；語句開啟了事務時提交（只讀查詢不開啟事務，不提交）"""
+        conn = self.get_connection()
         try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            conn.commit()
-            return cursor
+            self._execute_raw(cursor, query, params)
         except Exception as e:
-            conn.rollback()
+            self._end_statement(conn, success=False)
             logger.error(f"SQL執行錯誤: {query}, 參數: {params}, 錯誤: {str(e)}")
             raise
+        self._end_statement(conn, success=True)
+        return cursor
+    
+    def _end_statement(self, conn: sqlite3.Connection, success: bool):
+        """單條語句結束：不在顯式事務中且有未提交的寫入時提交或回滾"""
+        if self._transaction_depth or not conn.in_transaction:
+            return
+        if success:
+            conn.commit()
+        else:
+            conn.rollback()
+    
+    @contextmanager
+    def transaction(self):
+        """顯式事務：塊內的所有寫入在退出時一次提交，異常時整體回滾
+        
+        可嵌套，只有最外層負責提交。
+        
+        Yields:
+            sqlite3.Cursor: 事務內使用的游標
+        """
+        conn = self.get_connection()
+        outermost = self._transaction_depth == 0
+        self._transaction_depth += 1
+        try:
+            yield conn.cursor()
+        except BaseException:
+            self._transaction_depth -= 1
+            if outermost and conn.in_transaction:
+                conn.rollback()
+            raise
+        self._transaction_depth -= 1
+        if outermost and conn.in_transaction:
+            conn.commit()
+    
+    def executemany(self, query: str, params_seq: List[Union[tuple, Dict[str, Any]]]) -> sqlite3.Cursor:
+        """以單個事務批量執行SQL"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        # 日誌回顯
+        if self.echo:
+            logger.info(f"批量執行SQL: {query}, 行數: {len(params_seq)}")
+        
+        try:
+            cursor.executemany(query, params_seq)
+        except Exception as e:
+            self._end_statement(conn, success=False)
+            logger.error(f"SQL批量執行錯誤: {query}, 行數: {len(params_seq)}, 錯誤: {str(e)}")
+            raise
+        self._end_statement(conn, success=True)
+        return cursor
     
     def fetch_one(self, query: str, params: tuple = None) -> Optional[Dict[str, Any]]:
         """獲取單條記錄"""
         cursor = self.execute(query, params)
-        result = cursor.fetchone()
+        row = cursor.fetchone()
+        result = dict(zip(self._column_names(cursor), row)) if row is not None else None
         cursor.close()
         return result
     
     def fetch_all(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
-        """獲取所有記錄"""
+        """獲取所有記錄（可修改的字典列表）"""
+        cursor = self.execute(query, params)
+        rows = cursor.fetchall()
+        keys = self._column_names(cursor) if rows else ()
+        cursor.close()
+        return [dict(zip(keys, row)) for row in rows]
+    
+    def fetch_rows(self, query: str, params: tuple = None) -> List[sqlite3.Row]:
+        """獲取所有記錄（只讀的 sqlite3.Row，供只需按列名讀取的調用方使用）"""
         cursor = self.execute(query, params)
-        results = cursor.fetchall()
+        rows = cursor.fetchall()
         cursor.close()
-        return results
+        return rows
     
     def insert(self, table: str, data: Dict[str, Any]) -> int:
         """插入數據"""
-        columns = list(data.keys())
-        placeholders = ', '.join(['?' for _ in columns])
-        column_names = ', '.join(columns)
+        query = _build_insert_sql(table, tuple(data))
         
-        query = f"INSERT INTO {table} ({column_names}) VALUES ({placeholders})"
-        params = tuple(data.values())
+        if self._cursor is None:
+            self._cursor = self.get_connection().cursor()
         
-        cursor = self.execute(query, params)
-        last_id = cursor.lastrowid
-        cursor.close()
+        cursor = self._execute_on(self._cursor, query, tuple(data.values()))
+        return cursor.lastrowid
+    
+    def insert_many(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        """以單個事務批量插入數據
+        
+        按列集合分組，每組使用緩存的INSERT語句調用一次 executemany。
+        
+        Returns:
+            int: 插入的行數
+        """
+        if not rows:
+            return 0
+        
+        groups: Dict[tuple, List[tuple]] = {}
+        for row in rows:
+            groups.setdefault(tuple(row), []).append(tuple(row.values()))
         
-        return last_id
+        # 日誌回顯
+        if self.echo:
+            logger.info(f"批量插入: {table}, 行數: {len(rows)}")
+        
+        inserted = 0
+        try:
+            with self.transaction() as cursor:
+                for columns, params in groups.items():
+                    cursor.executemany(_build_insert_sql(table, columns), params)
+                    inserted += cursor.rowcount
+        except Exception as e:
+            logger.error(f"批量插入錯誤: {table}, 行數: {len(rows)}, 錯誤: {str(e)}")
+            raise
+        
+        return inserted
     
-    def update(self, table: str, data: Dict[str, Any], where_clause: str, where_params: tuple = None) -> int:
-        """更新數據"""
-        set_clause = ', '.join([f"{key} = ?" for key in data.keys()])
-        query = f"UPDATE {table} SET {set_clause} WHERE {where_clause}"
+    def update(self, table: str, data: Dict[str, Any], where_clause: str, where_params: tuple = None,
+               raw_set: Dict[str, str] = None) -> int:
+        """更新數據
+        
+        Args:
+            raw_set: 列名 -> SQL表達式，原樣寫入SET子句（如 {'updated_at': "datetime('now')"}）
+        """
+        query = _build_update_sql(table, tuple(data), where_clause, tuple(raw_set.items()) if raw_set else ())
         
         params = tuple(data.values())
         if where_params:
-            params += where_params
+            params += tuple(where_params)
         
         cursor = self.execute(query, params)
         affected_rows = cursor.rowcount
@@ -126,8 +352,7 @@ class SQLiteAdapter:
     
     def delete(self, table: str, where_clause: str, where_params: tuple = None) -> int:
         """刪除數據"""
-        query = f"DELETE FROM {table} WHERE {where_clause}"
-        cursor = self.execute(query, where_params)
+        cursor = self.execute(_build_delete_sql(table, where_clause), where_params)
         affected_rows = cursor.rowcount
         cursor.close()
         
@@ -136,6 +361,12 @@ class SQLiteAdapter:
     def close(self):
         """關閉數據庫連接"""
         if self._connection:
+            self._cursor = None
+            # 關閉前讓SQLite為查詢規劃器需要的表更新統計信息
+            try:
+                self._connection.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                logger.warning(f"PRAGMA optimize 執行失敗: {e}")
             self._connection.close()
             self._connection = None
             logger.info("SQLite連接已關閉")
@@ -149,75 +380,335 @@ class SQLiteAdapter:
         self.close()
 
 
+class SQLiteResult:
+    """在工作線程中取回的查詢結果
+    
+    提供與 sqlite3.Cursor 相同的讀取接口（fetchone/fetchall/迭代/rowcount 等），
+    使調用方無需在事件循環線程中觸碰連接。
+    """
+    
+    __slots__ = ("_rows", "_pos", "rowcount", "lastrowid", "description")
+    
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._rows = cursor.fetchall() if cursor.description else []
+        self._pos = 0
+        self.rowcount = cursor.rowcount
+        self.lastrowid = cursor.lastrowid
+        self.description = cursor.description
+        cursor.close()
+    
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        row = self._rows[self._pos]
+        self._pos += 1
+        return row
+    
+    def fetchmany(self, size: int = 1) -> list:
+        rows = self._rows[self._pos:self._pos + size]
+        self._pos += len(rows)
+        return rows
+    
+    def fetchall(self) -> list:
+        rows = self._rows[self._pos:]
+        self._pos = len(self._rows)
+        return rows
+    
+    def __iter__(self):
+        while self._pos < len(self._rows):
+            yield self.fetchone()
+    
+    def close(self):
+        self._rows = []
+
+
+# 通知工作線程退出的哨兵
+_STOP = object()
+
+
+def _resolve(future: asyncio.Future, result: Any = None, error: BaseException = None):
+    """在事件循環線程中完成 future（調用方已取消時忽略）"""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class _SQLiteWorker(threading.Thread):
+    """獨佔SQLite連接的工作線程
+    
+    從隊列中依次取出 (loop, future, fn) 執行，通過 call_soon_threadsafe
+    把結果交回事件循環；連接只在此線程中創建和使用。
+    """
+    
+    def __init__(self, adapter: SQLiteAdapter):
+        super().__init__(name=f"sqlite-worker-{adapter.db_path.name}", daemon=True)
+        self.adapter = adapter
+        self.tasks: "queue.SimpleQueue" = queue.SimpleQueue()
+    
+    def run(self):
+        while True:
+            item = self.tasks.get()
+            if item is _STOP:
+                break
+            loop, future, fn = item
+            try:
+                result = fn()
+            except BaseException as e:
+                error, result = e, None
+            else:
+                error = None
+            try:
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+            except RuntimeError:
+                # 事件循環已關閉，結果無人等待
+                pass
+
+
 class AsyncSQLiteAdapter:
-    """異步SQLite適配器"""
+    """異步SQLite適配器
+    
+    所有操作提交給一個長期運行的工作線程串行執行，
+    避免每次調用經過線程池調度，並保證連接只在同一線程中使用。
+    """
     
     def __init__(self, db_path: str = None, echo: bool = False):
         # 使用與同步適配器相同的邏輯
         self.sync_adapter = SQLiteAdapter(db_path, echo=echo)
-    
-    async def execute(self, query: str, params: tuple = None) -> sqlite3.Cursor:
+        self._worker: Optional[_SQLiteWorker] = None
+        self._worker_lock = threading.Lock()
+    
+    def _ensure_worker(self) -> _SQLiteWorker:
+        """獲取工作線程，未啟動或已退出時重新創建"""
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = _SQLiteWorker(self.sync_adapter)
+                self._worker.start()
+            return self._worker
+    
+    async def _submit(self, fn: Callable[[], Any]) -> Any:
+        """把同步操作提交給工作線程並等待結果"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._ensure_worker().tasks.put_nowait((loop, future, fn))
+        return await future
+    
+    def _execute_buffered(self, query: str, params: tuple = None) -> SQLiteResult:
+        return SQLiteResult(self.sync_adapter.execute(query, params))
+    
+    def _executemany_buffered(self, query: str, params_seq) -> SQLiteResult:
+        return SQLiteResult(self.sync_adapter.executemany(query, params_seq))
+    
+    async def execute(self, query: str, params: tuple = None) -> SQLiteResult:
         """異步執行SQL查詢"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.sync_adapter.execute, query, params)
+        return await self._submit(partial(self._execute_buffered, query, params))
+    
+    async def executemany(self, query: str, params_seq: List[Union[tuple, Dict[str, Any]]]) -> SQLiteResult:
+        """異步批量執行SQL"""
+        return await self._submit(partial(self._executemany_buffered, query, params_seq))
+    
+    async def run_in_transaction(self, fn: Callable[[sqlite3.Cursor], Any]) -> Any:
+        """在工作線程中以單個事務執行 fn(cursor)，返回其結果
+        
+        fn 為同步函數，可在游標上執行多條寫語句；異常時整體回滾。
+        """
+        def _run():
+            with self.sync_adapter.transaction() as cursor:
+                return fn(cursor)
+        return await self._submit(_run)
     
     async def fetch_one(self, query: str, params: tuple = None) -> Optional[Dict[str, Any]]:
         """異步獲取單條記錄"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.sync_adapter.fetch_one, query, params)
+        return await self._submit(partial(self.sync_adapter.fetch_one, query, params))
     
     async def fetch_all(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
         """異步獲取所有記錄"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.sync_adapter.fetch_all, query, params)
+        return await self._submit(partial(self.sync_adapter.fetch_all, query, params))
+    
+    async def fetch_rows(self, query: str, params: tuple = None) -> List[sqlite3.Row]:
+        """異步獲取所有記錄（sqlite3.Row）"""
+        return await self._submit(partial(self.sync_adapter.fetch_rows, query, params))
     
     async def insert(self, table: str, data: Dict[str, Any]) -> int:
         """異步插入數據"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.sync_adapter.insert, table, data)
+        return await self._submit(partial(self.sync_adapter.insert, table, data))
     
-    async def update(self, table: str, data: Dict[str, Any], where_clause: str, where_params: tuple = None) -> int:
+    async def insert_many(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        """異步批量插入數據"""
+        return await self._submit(partial(self.sync_adapter.insert_many, table, rows))
+    
+    async def update(self, table: str, data: Dict[str, Any], where_clause: str, where_params: tuple = None,
+                     raw_set: Dict[str, str] = None) -> int:
         """異步更新數據"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.sync_adapter.update, table, data, where_clause, where_params)
+        return await self._submit(
+            partial(self.sync_adapter.update, table, data, where_clause, where_params, raw_set)
+        )
     
     async def delete(self, table: str, where_clause: str, where_params: tuple = None) -> int:
         """異步刪除數據"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.sync_adapter.delete, table, where_clause, where_params)
+        return await self._submit(partial(self.sync_adapter.delete, table, where_clause, where_params))
     
     async def close(self):
-        """異步關閉連接"""
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self.sync_adapter.close)
+        """異步關閉連接並停止工作線程"""
+        worker = self._worker
+        if worker is None or not worker.is_alive():
+            self.sync_adapter.close()
+            return
+        try:
+            await self._submit(self.sync_adapter.close)
+        finally:
+            worker.tasks.put_nowait(_STOP)
+            self._worker = None
     
     async def dispose(self):
         """異步釋放資源"""
         await self.close()
 
 
+class _LRUCache:
+    """按鍵緩存記錄的LRU（只在所有寫入都經過同一進程時有效）"""
+    
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+    
+    def get(self, key: Hashable) -> Any:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+    
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+    
+    def invalidate(self, key: Hashable):
+        self._items.pop(key, None)
+    
+    def invalidate_all(self):
+        self._items.clear()
+
+
 # 代理數據庫操作類
 class ProxyDatabase:
-    """代理數據庫操作類"""
+    """代理數據庫操作類
+    
+    按ID查詢的代理記錄保存在LRU緩存中，活動代理列表按 (protocol, limit) 緩存 _ACTIVE_TTL 秒；
+    通過本類的寫操作會使相應緩存失效。
+    """
     
-    def __init__(self, adapter: Union[SQLiteAdapter, AsyncSQLiteAdapter]):
+    # 活動代理列表緩存時間（秒）
+    _ACTIVE_TTL = 5.0
+    
+    # 累計寫入超過此行數後重新 ANALYZE
+    _ANALYZE_THRESHOLD = 500
+    
+    def __init__(self, adapter: Union[SQLiteAdapter, AsyncSQLiteAdapter], cache_size: int = 256):
         self.adapter = adapter
+        self._proxy_cache = _LRUCache(cache_size)
+        self._active_cache: Dict[Tuple[Optional[str], Optional[int]], Tuple[float, List[Dict[str, Any]]]] = {}
+        self._rows_since_analyze = 0
+    
+    def _invalidate(self, proxy_id: int = None):
+        """寫入完成後使緩存失效（工作線程按提交順序完成，失效後不會再寫回舊數據）"""
+        if proxy_id is not None:
+            self._proxy_cache.invalidate(proxy_id)
+        self._active_cache.clear()
     
     async def create_proxy(self, proxy_data: Dict[str, Any]) -> int:
-        """創建代理記錄"""
-        proxy_data['created_at'] = datetime.now()
-        proxy_data['updated_at'] = datetime.now()
-        return await self.adapter.insert('proxies', proxy_data)
+        """創建代理記錄（created_at/updated_at 由列默認值生成）"""
+        proxy_id = await self.adapter.insert('proxies', _with_int_is_active(proxy_data))
+        self._invalidate()
+        return proxy_id
+    
+    async def create_proxies_bulk(self, proxies: List[Dict[str, Any]]) -> int:
+        """以單個事務批量創建代理記錄（created_at/updated_at 由列默認值生成）
+        
+        Returns:
+            int: 插入的行數
+        """
+        inserted = await self.adapter.insert_many('proxies', [_with_int_is_active(p) for p in proxies])
+        self._invalidate()
+        self._rows_since_analyze += inserted
+        await self.maybe_analyze()
+        return inserted
+    
+    async def upsert_proxies_bulk(self, proxies: List[Tuple[str, int, Optional[str], Optional[str], Optional[str]]]) -> int:
+        """在單個事務中按 (ip, port) 批量寫入抓取到的代理：已存在的更新，不存在的插入
+        
+        Args:
+            proxies: (ip, port, protocol, country, anonymity_level) 元組列表，(ip, port) 不應重複
+            
+        Returns:
+            int: 寫入的行數
+        """
+        if not proxies:
+            return 0
+        
+        def _upsert(cursor: sqlite3.Cursor) -> int:
+            cursor.executemany(_UPSERT_PROXY_UPDATE, proxies)
+            cursor.executemany(_UPSERT_PROXY_INSERT, proxies)
+            return cursor.rowcount
+        
+        inserted = await self.adapter.run_in_transaction(_upsert)
+        self._proxy_cache.invalidate_all()
+        self._active_cache.clear()
+        self._rows_since_analyze += inserted
+        await self.maybe_analyze()
+        return len(proxies)
+    
+    async def create_crawl_logs_bulk(self, logs: List[Dict[str, Any]]) -> int:
+        """以單個事務批量寫入爬取日誌（id/crawled_at 由列默認值生成）
+        
+        Args:
+            logs: 包含 source、total_found、success、error_message、extra_metadata 的字典列表
+            
+        Returns:
+            int: 插入的行數
+        """
+        return await self.adapter.insert_many('proxy_crawl_logs', [
+            {**log, 'extra_metadata': _json_dumps(log['extra_metadata']) if log.get('extra_metadata') else None}
+            for log in logs
+        ])
+    
+    async def maybe_analyze(self, force: bool = False) -> bool:
+        """大批量寫入後更新 proxies 表的統計信息，使規劃器選擇排序索引
+        
+        Returns:
+            bool: 是否執行了 ANALYZE
+        """
+        if not force and self._rows_since_analyze < self._ANALYZE_THRESHOLD:
+            return False
+        await self.adapter.execute("ANALYZE proxies")
+        self._rows_since_analyze = 0
+        return True
     
     async def get_proxy_by_id(self, proxy_id: int) -> Optional[Dict[str, Any]]:
         """根據ID獲取代理"""
-        return await self.adapter.fetch_one(
-            "SELECT * FROM proxies WHERE id = ?",
-            (proxy_id,)
-        )
+        proxy = self._proxy_cache.get(proxy_id)
+        if proxy is None:
+            proxy = await self.adapter.fetch_one(
+                "SELECT * FROM proxies WHERE id = ?",
+                (proxy_id,)
+            )
+            if proxy is None:
+                return None
+            self._proxy_cache.put(proxy_id, proxy)
+        return dict(proxy)
     
     async def get_active_proxies(self, protocol: str = None, limit: int = None) -> List[Dict[str, Any]]:
         """獲取活動代理列表"""
+        key = (protocol, limit)
+        cached = self._active_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return [dict(proxy) for proxy in cached[1]]
+        
         query = "SELECT * FROM proxies WHERE is_active = 1"
         params = []
         
@@ -231,13 +722,14 @@ class ProxyDatabase:
             query += " LIMIT ?"
             params.append(limit)
         
-        return await self.adapter.fetch_all(query, tuple(params) if params else None)
+        proxies = await self.adapter.fetch_all(query, tuple(params) if params else None)
+        self._active_cache[key] = (time.monotonic() + self._ACTIVE_TTL, proxies)
+        return [dict(proxy) for proxy in proxies]
     
     async def update_proxy_status(self, proxy_id: int, is_active: bool, success_rate: float = None, response_time: float = None) -> int:
         """更新代理狀態"""
         update_data = {
-            'is_active': is_active,
-            'updated_at': datetime.now()
+            'is_active': 1 if is_active else 0
         }
         
         if success_rate is not None:
@@ -246,75 +738,108 @@ class ProxyDatabase:
         if response_time is not None:
             update_data['response_time'] = response_time
         
-        return await self.adapter.update(
+        affected_rows = await self.adapter.update(
             'proxies',
             update_data,
             'id = ?',
-            (proxy_id,)
+            (proxy_id,),
+            raw_set={'updated_at': _SQL_NOW}
         )
+        self._invalidate(proxy_id)
+        return affected_rows
+    
+    async def update_proxy_status_bulk(self, updates: List[Tuple[Any, float, float, int]]) -> int:
+        """以單條 executemany 批量寫回驗證結果
+        
+        Args:
+            updates: (is_active, success_rate, response_time, proxy_id) 元組列表
+            
+        Returns:
+            int: 更新的行數
+        """
+        if not updates:
+            return 0
+        
+        params = [(1 if is_active else 0, success_rate, response_time, proxy_id)
+                  for is_active, success_rate, response_time, proxy_id in updates]
+        result = await self.adapter.executemany(_UPDATE_PROXY_STATUS_BULK, params)
+        
+        for *_, proxy_id in params:
+            self._proxy_cache.invalidate(proxy_id)
+        self._active_cache.clear()
+        return result.rowcount
     
     async def delete_proxy(self, proxy_id: int) -> int:
         """刪除代理"""
-        return await self.adapter.delete('proxies', 'id = ?', (proxy_id,))
+        affected_rows = await self.adapter.delete('proxies', 'id = ?', (proxy_id,))
+        self._invalidate(proxy_id)
+        return affected_rows
     
     async def get_proxy_stats(self) -> Dict[str, Any]:
-        """獲取代理統計信息"""
-        total = await self.adapter.fetch_one("SELECT COUNT(*) as count FROM proxies")
-        active = await self.adapter.fetch_one("SELECT COUNT(*) as count FROM proxies WHERE is_active = 1")
-        by_protocol = await self.adapter.fetch_all(
-            "SELECT protocol, COUNT(*) as count FROM proxies GROUP BY protocol"
+        """獲取代理統計信息（單次按協議分組掃描，總數在Python中匯總）"""
+        by_protocol = await self.adapter.fetch_rows(
+            "SELECT protocol, COUNT(*) AS total, SUM(is_active = 1) AS active "
+            "FROM proxies GROUP BY protocol"
         )
         
         return {
-            'total': total['count'] if total else 0,
-            'active': active['count'] if active else 0,
-            'by_protocol': {row['protocol']: row['count'] for row in by_protocol}
+            'total': sum(row['total'] for row in by_protocol),
+            'active': sum(row['active'] for row in by_protocol),
+            'by_protocol': {row['protocol']: row['total'] for row in by_protocol}
         }
 
 
 # 任務數據庫操作類
 class TaskDatabase:
-    """任務數據庫操作類"""
+    """任務數據庫操作類
     
-    def __init__(self, adapter: Union[SQLiteAdapter, AsyncSQLiteAdapter]):
+    按ID查詢的任務（未反序列化的原始記錄）保存在LRU緩存中，更新或刪除時失效。
+    """
+    
+    def __init__(self, adapter: Union[SQLiteAdapter, AsyncSQLiteAdapter], cache_size: int = 256):
         self.adapter = adapter
+        self._task_cache = _LRUCache(cache_size)
     
-    async def create_task(self, task_data: Dict[str, Any]) -> int:
-        """創建任務"""
-        task_data['created_at'] = datetime.now()
-        task_data['updated_at'] = datetime.now()
+    @staticmethod
+    def _prepare_task_data(task_data: Dict[str, Any]) -> Dict[str, Any]:
+        """填充默認狀態並序列化配置和結果（原地修改）"""
         task_data['status'] = task_data.get('status', 'pending')
         
         # 序列化配置和結果
         if 'config' in task_data and isinstance(task_data['config'], dict):
-            task_data['config'] = json.dumps(task_data['config'])
+            task_data['config'] = _json_dumps(task_data['config'])
         
         if 'result' in task_data and isinstance(task_data['result'], dict):
-            task_data['result'] = json.dumps(task_data['result'])
+            task_data['result'] = _json_dumps(task_data['result'])
         
-        return await self.adapter.insert('tasks', task_data)
+        return task_data
+    
+    async def create_task(self, task_data: Dict[str, Any]) -> int:
+        """創建任務（created_at/updated_at 由列默認值生成）"""
+        return await self.adapter.insert('tasks', self._prepare_task_data(task_data))
+    
+    async def create_tasks_bulk(self, tasks: List[Dict[str, Any]]) -> int:
+        """以單個事務批量創建任務（created_at/updated_at 由列默認值生成）
+        
+        Returns:
+            int: 插入的行數
+        """
+        return await self.adapter.insert_many('tasks', [self._prepare_task_data(t) for t in tasks])
     
     async def get_task_by_id(self, task_id: int) -> Optional[Dict[str, Any]]:
         """根據ID獲取任務"""
-        task = await self.adapter.fetch_one(
-            "SELECT * FROM tasks WHERE id = ?",
-            (task_id,)
-        )
-        
-        # 反序列化配置和結果
-        if task and task.get('config'):
-            try:
-                task['config'] = json.loads(task['config'])
-            except (json.JSONDecodeError, TypeError):
-                pass
-        
-        if task and task.get('result'):
-            try:
-                task['result'] = json.loads(task['result'])
-            except (json.JSONDecodeError, TypeError):
-                pass
+        task = self._task_cache.get(task_id)
+        if task is None:
+            task = await self.adapter.fetch_one(
+                "SELECT * FROM tasks WHERE id = ?",
+                (task_id,)
+            )
+            if task is None:
+                return None
+            self._task_cache.put(task_id, task)
         
-        return task
+        # 反序列化配置和結果（在副本上進行，緩存保留原始文本）
+        return _decode_json_fields(dict(task))
     
     async def get_tasks_by_status(self, status: str, limit: int = None) -> List[Dict[str, Any]]:
         """根據狀態獲取任務"""
@@ -329,58 +854,103 @@ class TaskDatabase:
         
         # 反序列化配置和結果
         for task in tasks:
-            if task.get('config'):
-                try:
-                    task['config'] = json.loads(task['config'])
-                except (json.JSONDecodeError, TypeError):
-                    pass
-            
-            if task.get('result'):
-                try:
-                    task['result'] = json.loads(task['result'])
-                except (json.JSONDecodeError, TypeError):
-                    pass
+            _decode_json_fields(task)
         
         return tasks
     
+    async def get_tasks_by_status_projected(self, status: str, json_fields: Dict[str, str],
+                                            limit: int = None) -> List[Dict[str, Any]]:
+        """根據狀態獲取任務，只取出 config 中指定的JSON字段
+        
+        JSON在SQLite中以 json_extract 解析，不在Python中反序列化整個配置；
+        以BLOB存儲的配置先轉為TEXT（SQLite 3.45 之前的 json1 不接受BLOB）。
+        
+        Args:
+            status: 任務狀態
+            json_fields: 結果列名 -> config 中的JSON路徑（如 {'timeout': '$.timeout'}）
+            limit: 最大返回數量
+            
+        Returns:
+            List[Dict[str, Any]]: 包含 id、name、task_type、status 及投影字段的記錄
+        """
+        for alias in json_fields:
+            if not alias.isidentifier():
+                raise ValueError(f"無效的字段別名: {alias}")
+        
+        projections = ''.join(f", json_extract(CAST(config AS TEXT), ?) AS {alias}" for alias in json_fields)
+        query = f"SELECT id, name, task_type, status{projections} FROM tasks WHERE status = ? ORDER BY created_at DESC"
+        params = [*json_fields.values(), status]
+        
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        
+        return await self.adapter.fetch_all(query, tuple(params))
+    
     async def update_task_status(self, task_id: int, status: str, result: Dict[str, Any] = None, error_message: str = None) -> int:
         """更新任務狀態"""
         update_data = {
-            'status': status,
-            'updated_at': datetime.now()
+            'status': status
         }
+        raw_set = {'updated_at': _SQL_NOW}
         
         if result:
-            update_data['result'] = json.dumps(result)
+            update_data['result'] = _json_dumps(result)
         
         if error_message:
             update_data['error_message'] = error_message
         
         if status == 'running':
-            update_data['started_at'] = datetime.now()
+            raw_set['started_at'] = _SQL_NOW
         elif status in ['completed', 'failed']:
-            update_data['completed_at'] = datetime.now()
+            raw_set['completed_at'] = _SQL_NOW
         
-        return await self.adapter.update(
+        affected_rows = await self.adapter.update(
             'tasks',
             update_data,
             'id = ?',
-            (task_id,)
+            (task_id,),
+            raw_set=raw_set
         )
+        self._task_cache.invalidate(task_id)
+        return affected_rows
+    
+    async def update_task_status_bulk(self, updates: List[Tuple[str, Optional[Dict[str, Any]], Optional[str],
+                                                                Optional[datetime], Optional[datetime], Any]]) -> int:
+        """以單條 executemany 批量更新任務狀態
+        
+        Args:
+            updates: (status, result, error_message, started_at, completed_at, task_id) 元組列表
+            
+        Returns:
+            int: 更新的行數
+        """
+        if not updates:
+            return 0
+        
+        params = [(status, _json_dumps(result) if result else None, error_message or None,
+                   started_at, completed_at, task_id)
+                  for status, result, error_message, started_at, completed_at, task_id in updates]
+        result = await self.adapter.executemany(_UPDATE_TASK_STATUS_BULK, params)
+        
+        for *_, task_id in params:
+            self._task_cache.invalidate(task_id)
+        return result.rowcount
     
     async def delete_task(self, task_id: int) -> int:
         """刪除任務"""
-        return await self.adapter.delete('tasks', 'id = ?', (task_id,))
+        affected_rows = await self.adapter.delete('tasks', 'id = ?', (task_id,))
+        self._task_cache.invalidate(task_id)
+        return affected_rows
     
     async def get_task_stats(self) -> Dict[str, Any]:
-        """獲取任務統計信息"""
-        total = await self.adapter.fetch_one("SELECT COUNT(*) as count FROM tasks")
-        by_status = await self.adapter.fetch_all(
+        """獲取任務統計信息（總數由按狀態分組的結果匯總）"""
+        by_status = await self.adapter.fetch_rows(
             "SELECT status, COUNT(*) as count FROM tasks GROUP BY status"
         )
         
         return {
-            'total': total['count'] if total else 0,
+            'total': sum(row['count'] for row in by_status),
             'by_status': {row['status']: row['count'] for row in by_status}
         }
 
@@ -389,97 +959,25 @@ class TaskDatabase:
 class DatabaseFactory:
     """數據庫連接工廠"""
     
-    @staticmethod
-    def create_adapter(database_url: str) -> Union[SQLiteAdapter, AsyncSQLiteAdapter]:
-        """根據數據庫URL創建適配器"""
-        
-        if database_url.startswith('sqlite'):
-            # 解析SQLite URL
-            db_path = database_url.replace('sqlite:///', '')
-            if database_url.startswith('sqlite:///./'):
-                db_path = database_url.replace('sqlite:///./', '')
-            
-            return AsyncSQLiteAdapter(db_path)
-        else:
+    # 按數據庫路徑共享適配器：每個數據庫文件只有一個連接和一個寫入線程
+    _adapters: Dict[str, AsyncSQLiteAdapter] = {}
+    
+    @classmethod
+    def create_adapter(cls, database_url: str) -> Optional[AsyncSQLiteAdapter]:
+        """根據數據庫URL獲取適配器（同一路徑返回同一實例）"""
+        
+        if not database_url.startswith('sqlite'):
             # 對於PostgreSQL，返回None，由應用程序處理
             return None
-
-
-# 測試函數
-async def test_sqlite_adapter():
-    """測試SQLite適配器"""
-    print("🚀 測試SQLite適配器...")
-    
-    try:
-        # 創建適配器 - 使用已經初始化的數據庫
-        adapter = AsyncSQLiteAdapter()  # 使用默認路徑
-        
-        # 測試代理數據庫
-        proxy_db = ProxyDatabase(adapter)
-        
-        # 創建測試代理
-        proxy_data = {
-            'ip': '192.168.1.100',
-            'port': 8080,
-            'protocol': 'http',
-            'country': 'US',
-            'anonymity_level': 'elite',
-            'response_time': 0.5,
-            'is_active': True,
-            'success_rate': 0.95
-        }
-        
-        proxy_id = await proxy_db.create_proxy(proxy_data)
-        print(f"✅ 創建代理成功，ID: {proxy_id}")
-        
-        # 獲取代理
-        proxy = await proxy_db.get_proxy_by_id(proxy_id)
-        print(f"✅ 獲取代理成功: {proxy}")
-        
-        # 獲取活動代理
-        active_proxies = await proxy_db.get_active_proxies(limit=10)
-        print(f"✅ 獲取活動代理成功，數量: {len(active_proxies)}")
-        
-        # 獲取統計信息
-        stats = await proxy_db.get_proxy_stats()
-        print(f"✅ 代理統計: {stats}")
-        
-        # 測試任務數據庫
-        task_db = TaskDatabase(adapter)
-        
-        # 創建任務
-        task_data = {
-            'name': '測試任務',
-            'task_type': 'proxy_validation',
-            'config': {'timeout': 30, 'retry_count': 3},
-            'status': 'pending'
-        }
-        
-        task_id = await task_db.create_task(task_data)
-        print(f"✅ 創建任務成功，ID: {task_id}")
-        
-        # 獲取任務
-        task = await task_db.get_task_by_id(task_id)
-        print(f"✅ 獲取任務成功: {task}")
-        
-        # 更新任務狀態
-        await task_db.update_task_status(task_id, 'completed', {'validated': 10, 'failed': 2})
-        print(f"✅ 更新任務狀態成功")
-        
-        # 獲取任務統計
-        task_stats = await task_db.get_task_stats()
-        print(f"✅ 任務統計: {task_stats}")
-        
-        # 關閉連接
-        await adapter.close()
-        
-        print("✅ SQLite適配器測試完成！")
         
-    except Exception as e:
-        print(f"❌ SQLite適配器測試失敗: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        # 解析SQLite URL
+        db_path = database_url.removeprefix('sqlite:///').removeprefix('./')
+        adapter = cls._adapters.get(db_path)
+        if adapter is None:
+            adapter = cls._adapters[db_path] = AsyncSQLiteAdapter(db_path)
+        return adapter
 
 
 if __name__ == "__main__":
-    asyncio.run(test_sqlite_adapter())
\ No newline at end of file
+    from ._smoketest_sqlite import test_sqlite_adapter
+    asyncio.run(test_sqlite_adapter())
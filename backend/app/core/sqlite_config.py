@@ -4,16 +4,46 @@ SQLite配置和連接管理模塊
 """
 
 import os
+import atexit
 import sqlite3
+import threading
+import weakref
 from contextlib import contextmanager
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 import logging
 from pathlib import Path
 import json
+from functools import lru_cache
+
+from .sqlite_adapter import apply_performance_pragmas
 
 logger = logging.getLogger(__name__)
 
+# 架構版本：修改 database_schema.sql 時遞增，已是此版本的數據庫啟動時跳過架構腳本
+SCHEMA_VERSION = 1
+
+SCHEMA_PATH = Path(__file__).parent.parent / 'database_schema.sql'
+
+
+@lru_cache(maxsize=None)
+def _load_schema_sql(path: Path) -> Optional[str]:
+    """讀取架構腳本（每個進程只讀一次），文件不存在時返回None"""
+    if not path.exists():
+        return None
+    return path.read_text(encoding='utf-8')
+
+
+def _quote_identifier(name: str) -> str:
+    """引用SQL標識符"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_literal(value: str) -> str:
+    """引用SQL字符串字面量"""
+    return "'" + value.replace("'", "''") + "'"
+
+
 class SQLiteConfig:
     """SQLite配置管理類"""
     
@@ -48,11 +78,25 @@ class SQLiteConfig:
             'isolation_level': self.isolation_level
         }
 
+class _PooledConnection(sqlite3.Connection):
+    """可被弱引用的連接類型，用於跟蹤各線程持有的連接"""
+
+
 class SQLiteManager:
-    """SQLite數據庫管理器"""
+    """SQLite數據庫管理器
+    
+    每個線程持有一個長期打開的連接（threading.local），
+    避免每次查詢都重新打開數據庫文件並重設PRAGMA。
+    """
     
     def __init__(self, config: Optional[SQLiteConfig] = None):
         self.config = config or SQLiteConfig()
+        self._tls = threading.local()
+        # 所有線程的連接；線程結束後其連接被回收，集合自動移除
+        self._connections: "weakref.WeakSet[_PooledConnection]" = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        # 表結構緩存（表名 -> 列信息），架構初始化時失效
+        self._table_info_cache: Dict[str, tuple] = {}
         self._ensure_database_exists()
         self._initialize_schema()
     
@@ -67,43 +111,73 @@ class SQLiteManager:
             logger.info(f"創建SQLite數據庫文件: {db_path}")
     
     def _initialize_schema(self):
-        """初始化數據庫架構"""
+        """初始化數據庫架構
+        
+        以 PRAGMA user_version 記錄已應用的架構版本，版本一致時只需一次讀取即可返回。
+        """
+        self._table_info_cache.clear()
         try:
-            schema_path = Path(__file__).parent.parent / 'database_schema.sql'
-            if schema_path.exists():
-                with open(schema_path, 'r', encoding='utf-8') as f:
-                    schema_sql = f.read()
+            # 架構初始化使用獨立的短期連接，線程本地連接在此之後才創建
+            conn = self._connect()
+            try:
+                if conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION:
+                    return
+                
+                # WAL 模式下維護時的 checkpoint 不阻塞讀寫（設置會持久保存在數據庫文件中）
+                conn.execute('PRAGMA journal_mode = WAL')
                 
-                with self.get_connection() as conn:
-                    # 啟用外鍵支持
-                    conn.execute('PRAGMA foreign_keys = ON')
-                    # 執行架構腳本
+                schema_sql = _load_schema_sql(SCHEMA_PATH)
+                if schema_sql is not None:
+                    # 執行架構腳本並記錄版本
                     conn.executescript(schema_sql)
-                    logger.info("SQLite數據庫架構初始化完成")
-            else:
-                logger.warning(f"數據庫架構文件不存在: {schema_path}")
+                    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                    conn.commit()
+                    logger.info(f"SQLite數據庫架構初始化完成，版本: {SCHEMA_VERSION}")
+                else:
+                    logger.warning(f"數據庫架構文件不存在: {SCHEMA_PATH}")
+            finally:
+                conn.close()
         except Exception as e:
             logger.error(f"SQLite數據庫初始化失敗: {e}")
             raise
     
+    def _connect(self) -> sqlite3.Connection:
+        """打開並配置一個新連接"""
+        conn = sqlite3.connect(**self.config.get_connection_params(), factory=_PooledConnection)
+        conn.row_factory = sqlite3.Row  # 啟用字典式行訪問
+        apply_performance_pragmas(conn)  # 頁大小、緩存和mmap
+        conn.execute('PRAGMA foreign_keys = ON')  # 啟用外鍵約束
+        return conn
+    
     @contextmanager
     def get_connection(self) -> sqlite3.Connection:
-        """獲取數據庫連接（上下文管理器）"""
-        conn = None
+        """獲取當前線程的數據庫連接（上下文管理器，退出時提交但不關閉）"""
+        conn = getattr(self._tls, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._tls.conn = conn
+            with self._connections_lock:
+                self._connections.add(conn)
+        
         try:
-            conn = sqlite3.connect(**self.config.get_connection_params())
-            conn.row_factory = sqlite3.Row  # 啟用字典式行訪問
-            conn.execute('PRAGMA foreign_keys = ON')  # 啟用外鍵約束
             yield conn
             conn.commit()
         except Exception as e:
-            if conn:
-                conn.rollback()
+            conn.rollback()
             logger.error(f"SQLite數據庫操作失敗: {e}")
             raise
-        finally:
-            if conn:
+    
+    def close_all(self):
+        """關閉所有線程持有的連接"""
+        with self._connections_lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for conn in connections:
+            try:
                 conn.close()
+            except Exception as e:
+                logger.warning(f"關閉SQLite連接失敗: {e}")
+        self._tls = threading.local()
     
     def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
         """執行查詢語句"""
@@ -136,17 +210,21 @@ class SQLiteManager:
             return cursor.rowcount
     
     def get_table_info(self, table_name: str) -> Dict[str, Any]:
-        """獲取表信息"""
-        query = "PRAGMA table_info(?)"
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, (table_name,))
-            columns = cursor.fetchall()
-            
-            return {
-                'columns': [dict(col) for col in columns],
-                'column_count': len(columns)
-            }
+        """獲取表信息（結果按表名緩存）"""
+        columns = self._table_info_cache.get(table_name)
+        if columns is None:
+            # PRAGMA 語句不支持綁定參數，使用表值函數 pragma_table_info
+            columns = tuple(
+                dict(col) for col in self.execute_query("SELECT * FROM pragma_table_info(?)", (table_name,))
+            )
+            # 表不存在時不緩存，以便之後創建的表可被查到
+            if columns:
+                self._table_info_cache[table_name] = columns
+        
+        return {
+            'columns': [dict(col) for col in columns],
+            'column_count': len(columns)
+        }
     
     def get_database_stats(self) -> Dict[str, Any]:
         """獲取數據庫統計信息"""
@@ -156,11 +234,15 @@ class SQLiteManager:
         tables_query = "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
         tables = self.execute_query(tables_query)
         
-        for table in tables:
-            table_name = table['name']
-            count_query = f"SELECT COUNT(*) as count FROM {table_name}"
-            count_result = self.execute_query(count_query)
-            stats[table_name] = count_result[0]['count'] if count_result else 0
+        # 所有表的行數合併為一條 UNION ALL 查詢
+        if tables:
+            count_query = " UNION ALL ".join(
+                f"SELECT {_quote_literal(table['name'])} AS name, COUNT(*) AS count "
+                f"FROM {_quote_identifier(table['name'])}"
+                for table in tables
+            )
+            for row in self.execute_query(count_query):
+                stats[row['name']] = row['count']
         
         # 獲取數據庫文件信息
         db_path = self.config.db_path
@@ -196,10 +278,44 @@ class SQLiteManager:
             logger.error(f"SQLite數據庫備份失敗: {e}")
             raise
     
-    def vacuum_database(self):
-        """清理數據庫"""
+    def maintain_database(self, pages: int = 1000) -> Dict[str, Any]:
+        """增量維護數據庫：回收空閒頁並執行被動 checkpoint
+        
+        不像 VACUUM 那樣重寫整個文件，維護期間讀寫均可繼續。
+        增量回收只對以 auto_vacuum=INCREMENTAL 創建的數據庫生效；
+        舊數據庫需要在維護窗口內執行一次 full_vacuum() 完成遷移。
+        
+        Args:
+            pages: 本次最多回收的空閒頁數
+            
+        Returns:
+            Dict[str, Any]: 剩餘空閒頁數和 checkpoint 結果
+        """
+        try:
+            with self.get_connection() as conn:
+                # PRAGMA 參數不支持綁定，使用整數格式化；incremental_vacuum 每步只回收一頁，
+                # execute 只單步執行無結果行的語句，executescript 會執行到完成
+                conn.executescript(f'PRAGMA incremental_vacuum({int(pages)});')
+                freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                busy, log_frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+            
+            logger.info(f"SQLite數據庫增量維護完成，剩餘空閒頁: {freelist}")
+            return {
+                'freelist_pages': freelist,
+                'wal_busy': bool(busy),
+                'wal_frames': log_frames,
+                'wal_checkpointed': checkpointed
+            }
+        except Exception as e:
+            logger.error(f"SQLite數據庫增量維護失敗: {e}")
+            raise
+    
+    def full_vacuum(self):
+        """完整清理數據庫（重寫整個文件並持有排他鎖，僅在維護窗口內調用）"""
         try:
             with self.get_connection() as conn:
+                # 已有數據庫在 VACUUM 時切換到增量自動清理模式
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
                 conn.execute('VACUUM')
             logger.info("SQLite數據庫清理完成")
         except Exception as e:
@@ -250,6 +366,12 @@ class SQLiteManager:
 # 全局SQLite管理器實例
 sqlite_manager = SQLiteManager()
 
+def _close_sqlite_manager():
+    """進程退出時關閉當前全局管理器的連接（只註冊一次，被替換的管理器可被回收）"""
+    sqlite_manager.close_all()
+
+atexit.register(_close_sqlite_manager)
+
 def get_sqlite_manager() -> SQLiteManager:
     """獲取全局SQLite管理器實例"""
     return sqlite_manager
@@ -257,6 +379,7 @@ def get_sqlite_manager() -> SQLiteManager:
 def init_sqlite_database():
     """初始化SQLite數據庫（用於應用啟動時調用）"""
     global sqlite_manager
+    sqlite_manager.close_all()
     sqlite_manager = SQLiteManager()
     logger.info("SQLite數據庫管理器初始化完成")
 
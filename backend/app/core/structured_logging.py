@@ -3,43 +3,181 @@
 提供JSON格式的結構化日誌記錄功能
 """
 
+import atexit
 import json
 import logging
 import logging.handlers
+import queue
 import sys
-from datetime import datetime, timezone
-from typing import Dict, Any, Optional
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
 from pathlib import Path
 
 from .monitoring_config import MonitoringConfig
 
+# 嘗試導入orjson（更快的JSON編碼）
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# JSON字符串編碼（C實現，與 json.dumps(ensure_ascii=False) 的字符串輸出一致）
+_encode_str = json.encoder.encode_basestring
+
+# 帶額外字段的記錄使用的編碼器（緊湊輸出，無法序列化的值轉為字符串）
+if ORJSON_AVAILABLE:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    
+    def _encode_entry(log_entry: Dict[str, Any]) -> str:
+        return orjson.dumps(log_entry, default=str, option=_ORJSON_OPTIONS).decode()
+else:
+    _encode_entry = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str).encode
+
+
+def _json_str(value: Optional[str]) -> str:
+    """編碼字符串字段，None輸出為null"""
+    return 'null' if value is None else _encode_str(value)
+
+
+def _json_int(value: Optional[int]) -> str:
+    """編碼整數字段，None輸出為null"""
+    return 'null' if value is None else str(value)
+
+
+# 固定字段名（額外字段與其重名時需要整體編碼以覆蓋固定字段）
+_FIXED_KEYS = frozenset((
+    "timestamp", "level", "logger", "message", "module",
+    "function", "line", "thread", "process"
+))
+
 
 class JSONFormatter(logging.Formatter):
-    """JSON格式化器"""
+    """JSON格式化器
+    
+    固定字段按預先拼好的鍵模板輸出，只編碼變化的值；額外字段和異常信息
+    單獨編碼後接在模板之後（可用時使用orjson），與固定字段重名時整體編碼。
+    """
+    
+    # 最近一次格式化的 (整秒, "YYYY-MM-DDTHH:MM:SS") ，同一秒內的記錄不再調用 strftime
+    _last_second: Tuple[int, str] = (-1, "")
+    
+    def _format_timestamp(self, record: logging.LogRecord) -> str:
+        """由記錄創建時間格式化UTC時間戳（ISO 8601，微秒精度）"""
+        created = record.created
+        second = int(created)
+        cached_second, prefix = self._last_second
+        if second != cached_second:
+            prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+            self._last_second = (second, prefix)
+        return f"{prefix}.{int((created - second) * 1e6):06d}Z"
     
     def format(self, record: logging.LogRecord) -> str:
         """格式化日誌記錄為JSON"""
-        log_entry = {
-            "timestamp": datetime.now(timezone.utc).isoformat() + "Z",
-            "level": record.levelname,
-            "logger": record.name,
-            "message": record.getMessage(),
-            "module": record.module,
-            "function": record.funcName,
-            "line": record.lineno,
-            "thread": record.thread,
-            "process": record.process
-        }
-        
-        # 添加額外字段
-        if hasattr(record, "extra_fields"):
-            log_entry.update(record.extra_fields)
-        
-        # 添加異常信息
+        extra_fields = getattr(record, "extra_fields", None)
         if record.exc_info:
-            log_entry["exception"] = self.formatException(record.exc_info)
+            extra_fields = dict(extra_fields or (), exception=self.formatException(record.exc_info))
+        
+        if extra_fields and not _FIXED_KEYS.isdisjoint(extra_fields):
+            log_entry = {
+                "timestamp": self._format_timestamp(record),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+                "module": record.module,
+                "function": record.funcName,
+                "line": record.lineno,
+                "thread": record.thread,
+                "process": record.process
+            }
+            log_entry.update(extra_fields)
+            return _encode_entry(log_entry)
         
-        return json.dumps(log_entry, ensure_ascii=False)
+        return ''.join((
+            '{"timestamp":"', self._format_timestamp(record),
+            '","level":', _json_str(record.levelname),
+            ',"logger":', _json_str(record.name),
+            ',"message":', _encode_str(record.getMessage()),
+            ',"module":', _json_str(record.module),
+            ',"function":', _json_str(record.funcName),
+            ',"line":', _json_int(record.lineno),
+            ',"thread":', _json_int(record.thread),
+            ',"process":', _json_int(record.process),
+            # 額外字段編碼為 {...}，去掉左括號後接在固定字段之後
+            ',' + _encode_entry(extra_fields)[1:] if extra_fields else '}'
+        ))
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """只入隊日誌記錄的隊列處理器
+    
+    消息在入隊前定稿，格式化（包括異常堆棧）留給監聽線程中的處理器。
+    SimpleQueue 本身是線程安全的，入隊不再經過處理器鎖，多個線程同時記錄時互不阻塞。
+    """
+    
+    def handle(self, record: logging.LogRecord):
+        rv = self.filter(record)
+        if rv:
+            if isinstance(rv, logging.LogRecord):
+                record = rv
+            self.emit(record)
+        return rv
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _TimedMemoryHandler(logging.handlers.MemoryHandler):
+    """緩衝寫入的處理器
+    
+    記錄滿 capacity 條、遇到 flushLevel 及以上級別或每隔 interval 秒時批量寫給目標處理器，
+    關閉時寫出剩餘記錄並關閉目標處理器。
+    """
+    
+    def __init__(self, target: logging.Handler, capacity: int = 512,
+                 interval: float = 0.25, flushLevel: int = logging.ERROR):
+        super().__init__(capacity, flushLevel=flushLevel, target=target, flushOnClose=True)
+        self.interval = interval
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_periodically, name="log-flush", daemon=True
+        )
+        self._flusher.start()
+    
+    def _flush_periodically(self):
+        while not self._closed.wait(self.interval):
+            self.flush()
+    
+    def close(self):
+        self._closed.set()
+        target = self.target
+        super().close()
+        if target is not None:
+            target.close()
+
+
+# 按記錄器名稱保存的隊列監聽器（重新配置同名記錄器時停止舊的監聽器）
+_listeners: Dict[str, logging.handlers.QueueListener] = {}
+
+
+def _stop_listener(name: str):
+    """停止並移除監聽器，等待隊列中的記錄寫完"""
+    listener = _listeners.pop(name, None)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+@atexit.register
+def _stop_all_listeners():
+    """進程退出時寫出所有排隊的日誌"""
+    for name in list(_listeners):
+        _stop_listener(name)
 
 
 class StructuredLogger:
@@ -56,7 +194,9 @@ class StructuredLogger:
         self.logger.setLevel(getattr(logging, self.config.log_level.upper()))
         
         # 清除現有的處理器
+        _stop_listener(self.logger.name)
         self.logger.handlers.clear()
+        self._handle = self.logger.handle
         
         # 創建控制台處理器
         console_handler = logging.StreamHandler(sys.stdout)
@@ -71,7 +211,7 @@ class StructuredLogger:
             )
         
         console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
+        handlers = [console_handler]
         
         # 創建文件處理器（如果配置了日誌文件）
         if self.config.log_file:
@@ -86,56 +226,78 @@ class StructuredLogger:
             )
             file_handler.setLevel(logging.INFO)
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
+            
+            # 文件寫入按批次進行，避免每條記錄一次 write()
+            buffered_handler = _TimedMemoryHandler(file_handler)
+            buffered_handler.setLevel(logging.INFO)
+            handlers.append(buffered_handler)
+        
+        # 調用方只把記錄放入隊列，格式化和I/O在監聽線程中完成
+        self._queue = queue.SimpleQueue()
+        self.logger.addHandler(_RecordQueueHandler(self._queue))
+        listener = logging.handlers.QueueListener(
+            self._queue, *handlers, respect_handler_level=True
+        )
+        listener.start()
+        _listeners[self.logger.name] = listener
+    
+    def close(self):
+        """停止後台監聽線程並寫出排隊中的日誌"""
+        self.logger.handlers.clear()
+        _stop_listener(self.logger.name)
+    
+    def _emit(self, level: int, message: str, fields: Dict[str, Any]):
+        """構建日誌記錄並直接交給處理器（調用方已檢查級別）"""
+        exc_info = fields.pop("exc_info", None)
+        fields.pop("stack_info", None)
+        if exc_info:
+            if isinstance(exc_info, BaseException):
+                exc_info = (type(exc_info), exc_info, exc_info.__traceback__)
+            elif not isinstance(exc_info, tuple):
+                exc_info = sys.exc_info()
+        
+        record = self.logger.makeRecord(
+            self.logger.name, level, "", 0, message, (), exc_info,
+            extra={"extra_fields": fields}
+        )
+        self._handle(record)
     
     def log(self, level: str, message: str, **kwargs):
         """記錄日誌"""
-        if hasattr(self.logger, level.lower()):
-            log_method = getattr(self.logger, level.lower())
-            
-            # 創建額外字段
-            extra_fields = {}
-            for key, value in kwargs.items():
-                if key not in ["exc_info", "stack_info"]:
-                    extra_fields[key] = value
-            
-            # 創建自定義記錄
-            record = self.logger.makeRecord(
-                name=self.logger.name,
-                level=getattr(logging, level.upper()),
-                fn="",
-                lno=0,
-                msg=message,
-                args=(),
-                exc_info=kwargs.get("exc_info"),
-                extra={"extra_fields": extra_fields}
-            )
-            
-            self.logger.handle(record)
+        levelno = logging.getLevelName(level.upper())
+        if isinstance(levelno, int) and self.logger.isEnabledFor(levelno):
+            self._emit(levelno, message, kwargs)
     
     def debug(self, message: str, **kwargs):
         """記錄調試日誌"""
-        self.log("DEBUG", message, **kwargs)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._emit(logging.DEBUG, message, kwargs)
     
     def info(self, message: str, **kwargs):
         """記錄信息日誌"""
-        self.log("INFO", message, **kwargs)
+        if self.logger.isEnabledFor(logging.INFO):
+            self._emit(logging.INFO, message, kwargs)
     
     def warning(self, message: str, **kwargs):
         """記錄警告日誌"""
-        self.log("WARNING", message, **kwargs)
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._emit(logging.WARNING, message, kwargs)
     
     def error(self, message: str, **kwargs):
         """記錄錯誤日誌"""
-        self.log("ERROR", message, **kwargs)
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._emit(logging.ERROR, message, kwargs)
     
     def critical(self, message: str, **kwargs):
         """記錄嚴重錯誤日誌"""
-        self.log("CRITICAL", message, **kwargs)
+        if self.logger.isEnabledFor(logging.CRITICAL):
+            self._emit(logging.CRITICAL, message, kwargs)
     
     def exception(self, message: str, **kwargs):
         """記錄異常日誌"""
-        self.log("ERROR", message, exc_info=True, **kwargs)
+        if self.logger.isEnabledFor(logging.ERROR):
+            kwargs["exc_info"] = True
+            self._emit(logging.ERROR, message, kwargs)
 
 
 # 全局日誌記錄器實例
@@ -157,6 +319,8 @@ def get_logger(name: str = "app", config: Optional[MonitoringConfig] = None) ->
 def log_proxy_operation(operation: str, proxy_data: Dict[str, Any], **kwargs):
     """記錄代理操作日誌"""
     logger = get_logger()
+    if not logger.logger.isEnabledFor(logging.INFO):
+        return
     logger.info(
         f"代理操作: {operation}",
         operation=operation,
@@ -168,6 +332,8 @@ def log_proxy_operation(operation: str, proxy_data: Dict[str, Any], **kwargs):
 def log_validation_result(proxy_id: str, is_valid: bool, validation_time: float, **kwargs):
     """記錄代理驗證結果"""
     logger = get_logger()
+    if not logger.logger.isEnabledFor(logging.INFO):
+        return
     logger.info(
         f"代理驗證結果: {'有效' if is_valid else '無效'}",
         proxy_id=proxy_id,
@@ -180,6 +346,8 @@ def log_validation_result(proxy_id: str, is_valid: bool, validation_time: float,
 def log_performance_metric(metric_name: str, value: float, unit: str = "ms", **kwargs):
     """記錄性能指標"""
     logger = get_logger()
+    if not logger.logger.isEnabledFor(logging.INFO):
+        return
     logger.info(
         f"性能指標: {metric_name} = {value} {unit}",
         metric_name=metric_name,
@@ -192,6 +360,8 @@ def log_performance_metric(metric_name: str, value: float, unit: str = "ms", **k
 def log_error(error_type: str, error_message: str, context: Optional[Dict[str, Any]] = None, **kwargs):
     """記錄錯誤"""
     logger = get_logger()
+    if not logger.logger.isEnabledFor(logging.ERROR):
+        return
     logger.error(
         f"錯誤: {error_type} - {error_message}",
         error_type=error_type,
@@ -204,6 +374,8 @@ def log_error(error_type: str, error_message: str, context: Optional[Dict[str, A
 def log_request(method: str, url: str, status_code: int, response_time: float, **kwargs):
     """記錄HTTP請求"""
     logger = get_logger()
+    if not logger.logger.isEnabledFor(logging.INFO):
+        return
     logger.info(
         f"HTTP請求: {method} {url} - {status_code}",
         method=method,
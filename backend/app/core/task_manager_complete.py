@@ -4,12 +4,15 @@
 """
 
 import asyncio
+import heapq
+import itertools
 import json
 import logging
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Callable, Any
-from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Callable, Any, Tuple
+from dataclasses import asdict, dataclass, field
 from enum import Enum
 import sqlite3
 from pathlib import Path
@@ -17,6 +20,25 @@ from pathlib import Path
 # 配置日誌
 logger = logging.getLogger(__name__)
 
+# 預先定義的SQL語句（語句文本不變，連接的語句緩存可直接命中）
+_TASK_COLUMNS = (
+    "id, name, task_type, status, config, result, error_message, "
+    "worker_id, retry_count, started_at, completed_at, created_at, updated_at"
+)
+_INSERT_TASK_SQL = f"INSERT INTO tasks ({_TASK_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_UPDATE_TASK_SQL = """
+    UPDATE tasks SET
+        status = ?, config = ?, result = ?, error_message = ?,
+        worker_id = ?, retry_count = ?, started_at = ?, completed_at = ?,
+        updated_at = ?
+    WHERE id = ?
+"""
+_SELECT_TASK_SQL = f"SELECT {_TASK_COLUMNS} FROM tasks WHERE id = ?"
+_SELECT_TASKS_SQL = f"SELECT {_TASK_COLUMNS} FROM tasks ORDER BY created_at DESC LIMIT ?"
+_SELECT_TASKS_BY_STATUS_SQL = (
+    f"SELECT {_TASK_COLUMNS} FROM tasks WHERE status = ? ORDER BY created_at DESC LIMIT ?"
+)
+
 class TaskStatus(Enum):
     """任務狀態枚舉"""
     PENDING = "pending"
@@ -34,7 +56,15 @@ class TaskType(Enum):
     SYSTEM_MAINTENANCE = "system_maintenance"
     DATA_EXPORT = "data_export"
 
-@dataclass
+def _dt(value: Any) -> Any:
+    """日期時間轉為存儲文本（與sqlite3默認適配器格式相同），其他值原樣返回"""
+    return value.isoformat(sep=" ") if isinstance(value, datetime) else value
+
+# 數據庫值到枚舉的映射（避免每行重建取值列表）
+_TASK_TYPE_MAP = {t.value: t for t in TaskType}
+_TASK_STATUS_MAP = {s.value: s for s in TaskStatus}
+
+@dataclass(slots=True)
 class TaskConfig:
     """任務配置"""
     timeout: int = 300
@@ -44,7 +74,7 @@ class TaskConfig:
     tags: List[str] = field(default_factory=list)
     parameters: Dict[str, Any] = field(default_factory=dict)
 
-@dataclass
+@dataclass(slots=True)
 class Task:
     """任務數據類"""
     id: str
@@ -60,53 +90,70 @@ class Task:
     error_message: Optional[str] = None
     worker_id: Optional[str] = None
     retry_count: int = 0
+    # 序列化後的配置緩存；修改配置後需重置為None
+    _config_json: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    @property
+    def config_json(self) -> Optional[str]:
+        """配置的JSON文本（首次訪問時序列化並緩存）"""
+        if self._config_json is None and self.config:
+            self._config_json = json.dumps(asdict(self.config), separators=(",", ":"))
+        return self._config_json
+    
+    def to_db_row(self) -> tuple:
+        """按 _UPDATE_TASK_SQL 的參數順序返回已轉換類型的值"""
+        return (
+            self.status.value, self.config_json, self.result, self.error_message,
+            self.worker_id, self.retry_count,
+            _dt(self.started_at), _dt(self.completed_at), _dt(self.updated_at), self.id
+        )
 
 class TaskQueue:
-    """優先級任務隊列"""
+    """優先級任務隊列
+    
+    任務對象直接存放在堆中，同優先級按入隊順序出隊；消費者在條件變量上等待，
+    只在有任務入隊時被喚醒。
+    """
     
     def __init__(self, max_size: int = 1000):
-        self.queue = asyncio.PriorityQueue(maxsize=max_size)
-        self.pending_tasks: Dict[str, Task] = {}
-        self._lock = asyncio.Lock()
+        self.max_size = max_size
+        self._heap: List[Tuple[int, int, Task]] = []
+        self._counter = itertools.count()
+        self._cond = asyncio.Condition()
     
     async def put(self, task: Task) -> bool:
         """添加任務到隊列"""
-        try:
-            # 優先級數字越小，優先級越高
-            priority = task.config.priority
-            await self.queue.put((priority, task.id))
-            
-            async with self._lock:
-                self.pending_tasks[task.id] = task
-            
-            logger.info(f"任務已加入隊列: {task.id} (優先級: {priority})")
-            return True
+        # 優先級數字越小，優先級越高
+        priority = task.config.priority
+        
+        async with self._cond:
+            if len(self._heap) >= self.max_size:
+                logger.error(f"任務隊列已滿，無法添加任務: {task.id}")
+                return False
             
-        except asyncio.QueueFull:
-            logger.error(f"任務隊列已滿，無法添加任務: {task.id}")
-            return False
+            heapq.heappush(self._heap, (priority, next(self._counter), task))
+            self._cond.notify()
+        
+        logger.info(f"任務已加入隊列: {task.id} (優先級: {priority})")
+        return True
     
-    async def get(self) -> Optional[Task]:
-        """從隊列獲取任務"""
-        try:
-            priority, task_id = await self.queue.get()
-            
-            async with self._lock:
-                task = self.pending_tasks.pop(task_id, None)
-            
-            if task:
-                logger.info(f"從隊列獲取任務: {task_id} (優先級: {priority})")
-            
-            return task
-            
-        except asyncio.QueueEmpty:
-            return None
+    async def get(self) -> Task:
+        """從隊列獲取任務（隊列為空時等待入隊）"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._heap)
+            priority, _, task = heapq.heappop(self._heap)
+        
+        logger.info(f"從隊列獲取任務: {task.id} (優先級: {priority})")
+        return task
+    
+    def empty(self) -> bool:
+        """隊列是否為空"""
+        return not self._heap
     
     def get_stats(self) -> Dict[str, int]:
         """獲取隊列統計信息"""
         return {
-            "queue_size": self.queue.qsize(),
-            "pending_count": len(self.pending_tasks)
+            "queue_size": len(self._heap)
         }
 
 class TaskWorker:
@@ -120,22 +167,19 @@ class TaskWorker:
         self.task_count = 0
         self.error_count = 0
         self._lock = asyncio.Lock()
+        self._runner: Optional[asyncio.Task] = None
     
     async def start(self):
         """啟動工作器"""
         self.is_running = True
+        self._runner = asyncio.current_task()
         logger.info(f"工作器 {self.worker_id} 已啟動")
         
         try:
             while self.is_running:
-                # 從隊列獲取任務
+                # 從隊列獲取任務（隊列為空時阻塞等待）
                 task = await self.task_manager.task_queue.get()
                 
-                if task is None:
-                    # 隊列為空，等待一段時間
-                    await asyncio.sleep(1)
-                    continue
-                
                 # 執行任務
                 await self.execute_task(task)
                 
@@ -143,6 +187,7 @@ class TaskWorker:
             logger.error(f"工作器 {self.worker_id} 發生錯誤: {str(e)}")
         finally:
             self.is_running = False
+            self._runner = None
             logger.info(f"工作器 {self.worker_id} 已停止")
     
     async def execute_task(self, task: Task):
@@ -155,8 +200,7 @@ class TaskWorker:
         try:
             # 更新任務狀態為運行中
             task.status = TaskStatus.RUNNING
-            task.started_at = datetime.now()
-            task.updated_at = datetime.now()
+            task.started_at = task.updated_at = datetime.now()
             await self.task_manager.update_task_in_db(task)
             
             # 獲取任務執行器
@@ -169,7 +213,6 @@ class TaskWorker:
             
             # 更新任務狀態為完成
             task.status = TaskStatus.COMPLETED
-            task.completed_at = datetime.now()
             task.result = json.dumps(result) if result else None
             task.error_message = None
             
@@ -179,20 +222,26 @@ class TaskWorker:
         except Exception as e:
             # 任務執行失敗
             task.status = TaskStatus.FAILED
-            task.completed_at = datetime.now()
             task.error_message = str(e)
             self.error_count += 1
             
             logger.error(f"任務執行失敗: {task.id}, 錯誤: {str(e)}")
             
         finally:
-            task.updated_at = datetime.now()
+            # 完成時間與更新時間共用一次取值
+            end = datetime.now()
+            if task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                task.completed_at = end
+            task.updated_at = end
             await self.task_manager.update_task_in_db(task)
             self.current_task = None
+            self.task_manager._check_idle()
     
     def stop(self):
-        """停止工作器"""
+        """停止工作器（空閒時直接取消等待，執行中的任務完成後退出）"""
         self.is_running = False
+        if self.current_task is None and self._runner is not None:
+            self._runner.cancel()
         logger.info(f"工作器 {self.worker_id} 正在停止...")
     
     def get_stats(self) -> Dict[str, Any]:
@@ -210,12 +259,21 @@ class TaskManager:
     
     def __init__(self, worker_count: int = 4, db_path: str = "data/proxy_collector.db"):
         self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_exec: Optional[ThreadPoolExecutor] = None
+        # 待寫入的任務更新（按任務ID合併，只保留最新狀態），由後台任務批量寫入
+        self._pending_updates: Dict[str, tuple] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_interval = 0.05
         self.task_queue = TaskQueue(max_size=1000)
         self.workers: List[TaskWorker] = []
         self.executors: Dict[TaskType, Callable] = {}
         self.is_running = False
         self.start_time: Optional[datetime] = None
         self._lock = asyncio.Lock()
+        # 隊列為空且沒有工作器在執行任務時置位
+        self._idle_event = asyncio.Event()
+        self._idle_event.set()
         
         # 初始化工作器
         for i in range(worker_count):
@@ -374,20 +432,19 @@ class TaskManager:
         logger.info("正在停止任務管理器...")
         self.is_running = False
         
-        # 停止所有工作器
+        # 停止所有工作器：空閒的直接取消，執行中的完成當前任務後退出
+        runners = [worker._runner for worker in self.workers if worker._runner is not None]
         for worker in self.workers:
             worker.stop()
         
-        # 等待所有當前任務完成
-        max_wait = 30  # 最多等待30秒
-        start_time = datetime.now()
-        
-        while any(worker.current_task for worker in self.workers):
-            if (datetime.now() - start_time).seconds > max_wait:
+        # 等待工作器退出（最多等待30秒）
+        max_wait = 30
+        if runners:
+            _, pending = await asyncio.wait(runners, timeout=max_wait)
+            if pending:
                 logger.warning("等待任務完成超時，強制停止")
-                break
-            await asyncio.sleep(1)
         
+        await self.flush_updates()
         logger.info("任務管理器已停止")
     
     async def create_task(self, name: str, task_type: TaskType, config: Optional[TaskConfig] = None) -> str:
@@ -419,72 +476,128 @@ class TaskManager:
     async def add_task_to_queue(self, task: Task):
         """添加任務到隊列"""
         success = await self.task_queue.put(task)
-        if not success:
+        if success:
+            self._idle_event.clear()
+        else:
             logger.error(f"添加任務到隊列失敗: {task.id}")
     
+    def _check_idle(self):
+        """隊列已空且所有工作器空閒時標記為空閒"""
+        if self.task_queue.empty() and not any(worker.current_task for worker in self.workers):
+            self._idle_event.set()
+    
+    async def wait_until_idle(self):
+        """等待隊列中的任務全部執行完畢"""
+        await self._idle_event.wait()
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """獲取管理器共用的數據庫連接（首次使用時打開並啟用WAL）"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn = conn
+        return self._conn
+    
+    async def _run_db(self, fn: Callable, *args) -> Any:
+        """在專用的數據庫線程中執行同步操作，不阻塞事件循環"""
+        if self._db_exec is None:
+            self._db_exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+        return await asyncio.get_running_loop().run_in_executor(self._db_exec, fn, *args)
+    
+    def close(self):
+        """寫出未提交的任務更新，等待排隊的數據庫操作完成並關閉連接"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = None
+        batch = self._take_pending_updates()
+        if batch:
+            if self._db_exec is None:
+                self._execute_batch_sync(_UPDATE_TASK_SQL, batch)
+            else:
+                self._db_exec.submit(self._execute_batch_sync, _UPDATE_TASK_SQL, batch)
+        if self._db_exec is not None:
+            self._db_exec.shutdown(wait=True)
+            self._db_exec = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    def _execute_sync(self, sql: str, params: tuple):
+        self._get_connection().execute(sql, params)
+    
+    def _execute_batch_sync(self, sql: str, params_list: List[tuple]):
+        """在一個事務中執行一批語句"""
+        conn = self._get_connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(sql, params_list)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    
+    def _get_task_sync(self, task_id: str) -> Optional[sqlite3.Row]:
+        return self._get_connection().execute(_SELECT_TASK_SQL, (task_id,)).fetchone()
+    
+    def _get_tasks_sync(self, status: Optional[TaskStatus], limit: int) -> List[sqlite3.Row]:
+        conn = self._get_connection()
+        if status:
+            return conn.execute(_SELECT_TASKS_BY_STATUS_SQL, (status.value, limit)).fetchall()
+        return conn.execute(_SELECT_TASKS_SQL, (limit,)).fetchall()
+    
     async def save_task_to_db(self, task: Task):
         """保存任務到數據庫"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO tasks (
-                    id, name, task_type, status, config, result, error_message,
-                    worker_id, retry_count, started_at, completed_at, created_at, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+            # 參數在事件循環中取值，寫入時任務對象的後續修改不會混入
+            await self._run_db(self._execute_sync, _INSERT_TASK_SQL, (
                 task.id, task.name, task.task_type.value, task.status.value,
-                json.dumps(task.config.__dict__) if task.config else None,
+                task.config_json,
                 task.result, task.error_message, task.worker_id, task.retry_count,
-                task.started_at, task.completed_at, task.created_at, task.updated_at
+                _dt(task.started_at), _dt(task.completed_at), _dt(task.created_at), _dt(task.updated_at)
             ))
             
-            conn.commit()
-            conn.close()
-            
         except Exception as e:
             logger.error(f"保存任務到數據庫失敗: {str(e)}")
     
     async def update_task_in_db(self, task: Task):
-        """更新任務到數據庫"""
+        """更新任務到數據庫（加入待寫隊列，由後台任務在下一個批次中寫入）"""
+        self._pending_updates[task.id] = task.to_db_row()
+        
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    def _take_pending_updates(self) -> List[tuple]:
+        """取出所有待寫入的更新"""
+        if not self._pending_updates:
+            return []
+        batch = list(self._pending_updates.values())
+        self._pending_updates = {}
+        return batch
+    
+    async def _flush_loop(self):
+        """按固定間隔批量寫入更新，沒有待寫入的更新時退出"""
+        while self._pending_updates:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush_updates()
+    
+    async def flush_updates(self):
+        """立即在一個事務中寫入所有待寫入的任務更新"""
+        batch = self._take_pending_updates()
+        if not batch:
+            return
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE tasks SET
-                    status = ?, config = ?, result = ?, error_message = ?,
-                    worker_id = ?, retry_count = ?, started_at = ?, completed_at = ?,
-                    updated_at = ?
-                WHERE id = ?
-            """, (
-                task.status.value,
-                json.dumps(task.config.__dict__) if task.config else None,
-                task.result, task.error_message, task.worker_id, task.retry_count,
-                task.started_at, task.completed_at, task.updated_at, task.id
-            ))
-            
-            conn.commit()
-            conn.close()
-            
+            await self._run_db(self._execute_batch_sync, _UPDATE_TASK_SQL, batch)
         except Exception as e:
             logger.error(f"更新任務到數據庫失敗: {str(e)}")
     
     async def get_task(self, task_id: str) -> Optional[Task]:
         """獲取任務"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, name, task_type, status, config, result, error_message,
-                       worker_id, retry_count, started_at, completed_at, created_at, updated_at
-                FROM tasks WHERE id = ?
-            """, (task_id,))
-            
-            row = cursor.fetchone()
-            conn.close()
+            await self.flush_updates()
+            row = await self._run_db(self._get_task_sync, task_id)
             
             if row:
                 return self._task_from_db_data(row)
@@ -497,61 +610,44 @@ class TaskManager:
     async def get_tasks(self, status: Optional[TaskStatus] = None, limit: int = 100) -> List[Task]:
         """獲取任務列表"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if status:
-                cursor.execute("""
-                    SELECT id, name, task_type, status, config, result, error_message,
-                           worker_id, retry_count, started_at, completed_at, created_at, updated_at
-                    FROM tasks WHERE status = ? ORDER BY created_at DESC LIMIT ?
-                """, (status.value, limit))
-            else:
-                cursor.execute("""
-                    SELECT id, name, task_type, status, config, result, error_message,
-                           worker_id, retry_count, started_at, completed_at, created_at, updated_at
-                    FROM tasks ORDER BY created_at DESC LIMIT ?
-                """, (limit,))
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
+            await self.flush_updates()
+            rows = await self._run_db(self._get_tasks_sync, status, limit)
             return [self._task_from_db_data(row) for row in rows]
             
         except Exception as e:
             logger.error(f"獲取任務列表失敗: {str(e)}")
             return []
     
-    def _task_from_db_data(self, row) -> Task:
+    def _task_from_db_data(self, row: sqlite3.Row) -> Task:
         """從數據庫數據創建任務對象"""
         try:
-            task_type = TaskType(row[2]) if row[2] in [t.value for t in TaskType] else TaskType.PROXY_SCRAPING
-            status = TaskStatus(row[3]) if row[3] in [s.value for s in TaskStatus] else TaskStatus.PENDING
+            task_type = _TASK_TYPE_MAP.get(row["task_type"], TaskType.PROXY_SCRAPING)
+            status = _TASK_STATUS_MAP.get(row["status"], TaskStatus.PENDING)
             
-            config_data = json.loads(row[4]) if row[4] else {}
+            config_data = json.loads(row["config"]) if row["config"] else {}
             config = TaskConfig(**config_data) if config_data else TaskConfig()
             
             return Task(
-                id=row[0],
-                name=row[1],
+                id=row["id"],
+                name=row["name"],
                 task_type=task_type,
                 status=status,
                 config=config,
-                created_at=row[11],
-                updated_at=row[12],
-                started_at=row[9],
-                completed_at=row[10],
-                result=row[5],
-                error_message=row[6],
-                worker_id=row[7],
-                retry_count=row[8] or 0
+                created_at=row["created_at"],
+                updated_at=row["updated_at"],
+                started_at=row["started_at"],
+                completed_at=row["completed_at"],
+                result=row["result"],
+                error_message=row["error_message"],
+                worker_id=row["worker_id"],
+                retry_count=row["retry_count"] or 0
             )
         except Exception as e:
             logger.error(f"從數據庫數據創建任務對象失敗: {str(e)}")
             # 返回一個默認任務對象
             return Task(
-                id=row[0],
-                name=row[1],
+                id=row["id"],
+                name=row["name"],
                 task_type=TaskType.PROXY_SCRAPING,
                 status=TaskStatus.PENDING,
                 config=TaskConfig(),
@@ -670,7 +766,7 @@ async def test_task_manager():
     
     # 等待任務執行
     print("⏳ 等待任務執行...")
-    await asyncio.sleep(10)
+    await asyncio.wait_for(manager.wait_until_idle(), timeout=30)
     
     # 獲取任務狀態
     print("\n📊 任務狀態:")
@@ -712,6 +808,7 @@ async def test_task_manager():
         await manager_task
     except asyncio.CancelledError:
         pass
+    manager.close()
     
     print("\n✅ 測試完成！")
 
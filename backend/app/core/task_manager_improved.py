@@ -5,19 +5,65 @@
 """
 
 import asyncio
+import heapq
+import itertools
+import os
+import random
+import sys
+import time
 import uuid
 import logging
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Callable, Set
-from dataclasses import dataclass, field
+from typing import Dict, Any, DefaultDict, Deque, List, Optional, Callable, Set, Tuple
+from dataclasses import asdict, dataclass, field
 from enum import Enum
 import json
 
 from .database_manager import get_db_manager
 from .config_improved import get_settings
 
+# 嘗試導入uvloop（更快的事件循環，不支持Windows）
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# 重試退避使用的隨機數生成器（測試時可替換或設置種子）
+_retry_random = random.Random()
+
+
+def recommended_max_workers(cap: int) -> int:
+    """I/O 密集型任務的線程池大小：CPU核數 × 8（不少於32），且不超過 cap"""
+    return min(max(32, (os.cpu_count() or 1) * 8), cap)
+
+
+class TokenBucket:
+    """令牌桶
+    
+    按固定速率補充令牌，最多累積 capacity 個。令牌不足時預支並等待到令牌補足，
+    併發的調用者按調用順序排隊，無需加鎖。
+    """
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+    
+    async def acquire(self):
+        """取得一個令牌"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
 
 class TaskStatus(Enum):
     """任務狀態枚舉"""
@@ -39,7 +85,12 @@ class TaskType(Enum):
     DATA_EXPORT = "data_export"
 
 
-@dataclass
+# 數據庫值到枚舉的映射（避免逐行調用枚舉構造器）
+_TASK_TYPE_MAP = {t.value: t for t in TaskType}
+_TASK_STATUS_MAP = {s.value: s for s in TaskStatus}
+
+
+@dataclass(slots=True)
 class TaskConfig:
     """任務配置類"""
     timeout: int = 300  # 5分鐘
@@ -52,7 +103,7 @@ class TaskConfig:
     tags: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class Task:
     """任務數據類"""
     id: str
@@ -69,60 +120,116 @@ class Task:
     worker_id: Optional[str] = None
     retry_count: int = 0
     execution_time: Optional[float] = None
+    # 序列化後的配置緩存；修改配置後需重置為None
+    _config_json: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    # 創建時綁定的任務執行器；未綁定時在執行時按類型查找
+    _executor: Optional[Callable] = field(default=None, init=False, repr=False, compare=False)
+    
+    @property
+    def config_json(self) -> Optional[str]:
+        """配置的JSON文本（首次訪問時序列化並緩存）"""
+        if self._config_json is None and self.config:
+            self._config_json = json.dumps(asdict(self.config), separators=(",", ":"))
+        return self._config_json
+
+
+@dataclass(slots=True)
+class TaskManagerStats:
+    """任務管理器統計快照（stats_view() 原地更新並返回同一實例）"""
+    is_running: bool = False
+    worker_count: int = 0
+    busy_workers: int = 0
+    queue_size: int = 0
+    task_count: int = 0
+    error_count: int = 0
+    uptime: float = 0.0
 
 
 class TaskQueue:
-    """任務隊列"""
+    """任務隊列
+    
+    任務對象直接存放在堆中，以 (10 - 優先級, 序號, 任務) 排序：優先級高的先出隊，
+    同優先級按入隊順序。等待中的消費者按先來先到排隊，入隊時只喚醒一個。
+    """
     
     def __init__(self, max_size: int = 1000):
-        self.queue = asyncio.PriorityQueue(maxsize=max_size)
-        self.pending_tasks: Dict[str, Task] = {}
-        self.task_priorities: Dict[str, int] = {}
-        self._lock = asyncio.Lock()
+        self.max_size = max_size
+        self._heap: List[Tuple[int, int, Task]] = []
+        self._seq = itertools.count()
+        self._waiters: Deque[asyncio.Future] = deque()
+    
+    def qsize(self) -> int:
+        """隊列中的任務數"""
+        return len(self._heap)
+    
+    def _wakeup_next(self):
+        """喚醒一個仍在等待的消費者"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
     
     async def put(self, task: Task) -> bool:
         """添加任務到隊列"""
-        try:
-            priority = -task.config.priority  # 優先級隊列使用負數，數字越小優先級越高
-            await self.queue.put((priority, task.id))
-            
-            async with self._lock:
-                self.pending_tasks[task.id] = task
-                self.task_priorities[task.id] = priority
-            
-            logger.debug(f"任務已加入隊列: {task.id} (優先級: {task.config.priority})")
-            return True
-            
-        except asyncio.QueueFull:
+        if len(self._heap) >= self.max_size:
             logger.warning(f"任務隊列已滿，無法添加任務: {task.id}")
             return False
+        
+        # 堆頂為最小值，優先級 1-10 映射為 9-0，使數字越大越先出隊；序號保證同優先級先進先出
+        heapq.heappush(self._heap, (10 - task.config.priority, next(self._seq), task))
+        self._wakeup_next()
+        
+        logger.debug(f"任務已加入隊列: {task.id} (優先級: {task.config.priority})")
+        return True
+    
+    async def put_many(self, tasks: List[Task]) -> int:
+        """批量添加任務到隊列，只重建一次堆
+        
+        Returns:
+            int: 實際加入的任務數（隊列已滿時其餘任務被拒絕）
+        """
+        accepted = tasks[:max(self.max_size - len(self._heap), 0)]
+        if len(accepted) < len(tasks):
+            logger.warning(f"任務隊列已滿，{len(tasks) - len(accepted)} 個任務未能加入")
+        
+        self._heap.extend((10 - task.config.priority, next(self._seq), task) for task in accepted)
+        heapq.heapify(self._heap)
+        for _ in accepted:
+            self._wakeup_next()
+        
+        return len(accepted)
     
     async def get(self, timeout: Optional[float] = None) -> Optional[Task]:
-        """從隊列獲取任務"""
-        try:
-            if timeout:
-                priority, task_id = await asyncio.wait_for(self.queue.get(), timeout=timeout)
-            else:
-                priority, task_id = await self.queue.get()
-            
-            async with self._lock:
-                task = self.pending_tasks.pop(task_id, None)
-                self.task_priorities.pop(task_id, None)
-            
-            if task:
-                logger.debug(f"從隊列獲取任務: {task.id}")
-            
-            return task
-            
-        except asyncio.TimeoutError:
-            return None
+        """從隊列獲取任務（超時返回None）"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        
+        while not self._heap:
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                if deadline is None:
+                    await waiter
+                else:
+                    await asyncio.wait_for(waiter, deadline - loop.time())
+            except asyncio.TimeoutError:
+                return None
+            except asyncio.CancelledError:
+                # 已被喚醒卻被取消時，把喚醒交給下一個消費者
+                if waiter.done() and not waiter.cancelled() and self._heap:
+                    self._wakeup_next()
+                raise
+        
+        _, _, task = heapq.heappop(self._heap)
+        logger.debug(f"從隊列獲取任務: {task.id}")
+        return task
     
     def get_queue_stats(self) -> Dict[str, Any]:
         """獲取隊列統計信息"""
         return {
-            'queue_size': self.queue.qsize(),
-            'pending_count': len(self.pending_tasks),
-            'priorities': list(self.task_priorities.values())
+            'queue_size': len(self._heap),
+            'priorities': [task.config.priority for _, _, task in self._heap]
         }
 
 
@@ -136,53 +243,59 @@ class TaskWorker:
         self.is_running = False
         self.task_count = 0
         self.error_count = 0
-        self._lock = asyncio.Lock()
+        self._runner: Optional[asyncio.Task] = None
     
     async def start(self):
         """啟動工作器"""
         self.is_running = True
+        self._runner = asyncio.current_task()
         logger.info(f"工作器 {self.worker_id} 已啟動")
         
         try:
             while self.is_running:
-                # 從隊列獲取任務
-                task = await self.task_manager.task_queue.get(timeout=5.0)
+                # 從隊列獲取任務（隊列為空時阻塞等待，停止時由 stop() 取消）
+                task = await self.task_manager.task_queue.get()
+                
+                # 狀態只由本協程寫入，無需加鎖
+                self.current_task = task
+                self.task_manager._m_busy += 1
                 
-                if task:
-                    async with self._lock:
-                        self.current_task = task
-                    
-                    # 執行任務
+                # 執行任務
+                try:
                     await self.execute_task(task)
-                    
-                    async with self._lock:
-                        self.current_task = None
-                        self.task_count += 1
+                finally:
+                    self.task_manager._m_busy -= 1
                 
-                # 短暫休眠，避免CPU佔用過高
-                await asyncio.sleep(0.1)
+                self.current_task = None
+                self.task_count += 1
+                self.task_manager._m_task_count += 1
                 
         except Exception as e:
             logger.error(f"工作器 {self.worker_id} 發生錯誤: {str(e)}")
             self.error_count += 1
+            self.task_manager._m_err_count += 1
         finally:
+            self._runner = None
             logger.info(f"工作器 {self.worker_id} 已停止")
     
     async def execute_task(self, task: Task):
         """執行任務"""
         logger.info(f"工作器 {self.worker_id} 開始執行任務: {task.id}")
         
+        # 只讀一次系統時鐘，耗時由單調時鐘計算
+        task.started_at = datetime.now()
+        start = time.monotonic()
+        
         try:
             # 更新任務狀態
             task.status = TaskStatus.RUNNING
-            task.started_at = datetime.now()
             task.worker_id = self.worker_id
             
             # 保存狀態到數據庫
             await self.task_manager.update_task_in_db(task)
             
             # 獲取任務執行器
-            executor = self.task_manager.get_executor(task.task_type)
+            executor = task._executor or self.task_manager.get_executor(task.task_type)
             
             if not executor:
                 raise ValueError(f"未找到任務執行器: {task.task_type}")
@@ -200,30 +313,25 @@ class TaskWorker:
                 result = await executor(task)
             
             # 任務成功完成
-            task.status = TaskStatus.COMPLETED
-            task.completed_at = datetime.now()
+            self._finish(task, TaskStatus.COMPLETED, start)
             task.result = result
-            task.execution_time = (task.completed_at - task.started_at).total_seconds()
             
             logger.info(f"任務 {task.id} 執行成功，耗時: {task.execution_time:.2f}秒")
             
         except asyncio.TimeoutError:
             # 任務超時
-            task.status = TaskStatus.TIMEOUT
-            task.completed_at = datetime.now()
+            self._finish(task, TaskStatus.TIMEOUT, start)
             task.error_message = f"任務超時 (>{task.config.timeout}秒)"
-            task.execution_time = (task.completed_at - task.started_at).total_seconds() if task.started_at else None
             
             logger.warning(f"任務 {task.id} 超時")
             
         except Exception as e:
             # 任務失敗
-            task.status = TaskStatus.FAILED
-            task.completed_at = datetime.now()
+            self._finish(task, TaskStatus.FAILED, start)
             task.error_message = str(e)
-            task.execution_time = (task.completed_at - task.started_at).total_seconds() if task.started_at else None
             
             self.error_count += 1
+            self.task_manager._m_err_count += 1
             logger.error(f"任務 {task.id} 執行失敗: {str(e)}")
             
             # 檢查是否需要重試
@@ -233,14 +341,29 @@ class TaskWorker:
         finally:
             # 更新任務到數據庫
             await self.task_manager.update_task_in_db(task)
+            
+            # 釋放或取消依賴本任務的任務
+            await self.task_manager.resolve_dependents(task)
+    
+    @staticmethod
+    def _finish(task: Task, status: TaskStatus, start: float):
+        """記錄任務結束狀態，完成時間由開始時間加耗時推算"""
+        task.status = status
+        task.execution_time = time.monotonic() - start
+        task.completed_at = task.started_at + timedelta(seconds=task.execution_time)
     
     async def retry_task(self, task: Task):
         """重試任務"""
+        # 指數退避加全抖動：在 [0, retry_delay * 2^n] 內隨機等待，避免同時失敗的任務一起重試
+        backoff = task.config.retry_delay * (1 << min(task.retry_count, 10))
+        delay = _retry_random.uniform(0, backoff)
+        
         task.retry_count += 1
-        logger.info(f"任務 {task.id} 將重試 (第{task.retry_count}次)")
+        logger.info(f"任務 {task.id} 將在 {delay:.2f} 秒後重試 (第{task.retry_count}次)")
         
-        # 等待重試延遲
-        await asyncio.sleep(task.config.retry_delay)
+        # 等待重試延遲，再按令牌桶限制重新入隊的速率，避免大量失敗任務同時湧回隊列
+        await asyncio.sleep(delay)
+        await self.task_manager._retry_bucket.acquire()
         
         # 重置任務狀態
         task.status = TaskStatus.PENDING
@@ -252,8 +375,10 @@ class TaskWorker:
         await self.task_manager.add_task_to_queue(task)
     
     def stop(self):
-        """停止工作器"""
+        """停止工作器（空閒時直接取消等待，執行中的任務完成後退出）"""
         self.is_running = False
+        if self.current_task is None and self._runner is not None:
+            self._runner.cancel()
         logger.info(f"工作器 {self.worker_id} 正在停止...")
     
     def get_stats(self) -> Dict[str, Any]:
@@ -275,10 +400,32 @@ class TaskManager:
         self.db_manager = None
         self.task_queue = TaskQueue(max_size=self.settings.TASK_QUEUE_SIZE)
         self.workers: List[TaskWorker] = []
+        self._worker_tasks: List[asyncio.Task] = []
         self.executors: Dict[TaskType, Callable] = {}
         self.is_running = False
         self.start_time: Optional[datetime] = None
-        self._lock = asyncio.Lock()
+        
+        # 待寫入的任務更新：按任務ID合併，只保留最新狀態，由後台任務批量寫入
+        self._write_buf: Dict[str, Tuple[str, Optional[Dict[str, Any]], Optional[str],
+                                         Optional[datetime], Optional[datetime], str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_interval = 0.05
+        self._max_batch = 100
+        self._default_executor: Optional[ThreadPoolExecutor] = None
+        self._retry_bucket = TokenBucket(self.settings.RETRY_TPS, self.settings.RETRY_BURST)
+        
+        # 匯總統計計數器（由工作器遞增），供 stats_view() 直接讀取
+        self._m_busy = 0
+        self._m_task_count = 0
+        self._m_err_count = 0
+        self._start_monotonic: Optional[float] = None
+        self._stats_view = TaskManagerStats(worker_count=worker_count)
+        
+        # 任務依賴索引：未結束的任務、依賴ID -> 等待它的任務ID、等待中的任務及其剩餘依賴
+        self._unfinished: Set[str] = set()
+        self._dependents: DefaultDict[str, Set[str]] = defaultdict(set)
+        self._remaining_deps: Dict[str, Set[str]] = {}
+        self._blocked_tasks: Dict[str, Task] = {}
         
         # 初始化工作器
         for i in range(worker_count):
@@ -291,6 +438,9 @@ class TaskManager:
         try:
             logger.info("正在初始化任務管理器...")
             
+            # 設置事件循環的默認線程池
+            self._install_default_executor()
+            
             # 獲取數據庫管理器
             self.db_manager = await get_db_manager()
             
@@ -307,6 +457,21 @@ class TaskManager:
             logger.error(f"任務管理器初始化失敗: {str(e)}")
             return False
     
+    def _install_default_executor(self):
+        """設置事件循環的默認線程池
+        
+        大小取 THREAD_POOL_SIZE，未配置時按CPU核數推算並以任務隊列大小為上限。
+        SQLite 讀寫已由適配器的專用線程串行執行，不佔用默認線程池。
+        """
+        if self._default_executor is not None:
+            return
+        
+        pool_size = self.settings.THREAD_POOL_SIZE or recommended_max_workers(self.settings.TASK_QUEUE_SIZE)
+        
+        self._default_executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="asyncio")
+        asyncio.get_running_loop().set_default_executor(self._default_executor)
+        logger.info(f"默認線程池大小: {pool_size}")
+    
     async def register_executors(self):
         """註冊任務執行器"""
         # 這裡可以註冊具體的任務執行器
@@ -330,34 +495,45 @@ class TaskManager:
             logger.info("正在啟動任務管理器...")
             self.is_running = True
             self.start_time = datetime.now()
+            self._start_monotonic = time.monotonic()
             
             # 啟動所有工作器
-            worker_tasks = []
-            for worker in self.workers:
-                task = asyncio.create_task(worker.start())
-                worker_tasks.append(task)
+            self._worker_tasks = [asyncio.create_task(worker.start()) for worker in self.workers]
             
             # 等待所有工作器完成
-            await asyncio.gather(*worker_tasks, return_exceptions=True)
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
             
         except Exception as e:
             logger.error(f"任務管理器啟動失敗: {str(e)}")
             self.is_running = False
     
-    async def stop(self):
-        """停止任務管理器"""
+    async def stop(self, timeout: float = 30.0):
+        """停止任務管理器
+        
+        空閒的工作器立即取消；執行中的工作器最多等待 timeout 秒，超時後取消。
+        """
         if not self.is_running:
             return
         
         logger.info("正在停止任務管理器...")
         self.is_running = False
         
-        # 停止所有工作器
+        # 停止所有工作器（空閒的工作器立即取消）
         for worker in self.workers:
             worker.stop()
         
         # 等待當前任務完成
-        await asyncio.sleep(2)
+        if self._worker_tasks:
+            _, pending = await asyncio.wait(self._worker_tasks, timeout=timeout)
+            for worker_task in pending:
+                logger.warning("工作器未在限時內停止，已取消")
+                worker_task.cancel()
+        self._worker_tasks = []
+        
+        # 寫出緩衝中的任務更新
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush_updates()
         
         logger.info("任務管理器已停止")
     
@@ -377,59 +553,160 @@ class TaskManager:
             created_at=datetime.now(),
             updated_at=datetime.now()
         )
+        task._executor = self.executors.get(task_type)
+        
+        # 先加入隊列（依賴未完成時等待），入隊狀態隨插入一起寫入，無需再更新一次；
+        # 插入請求在讓出事件循環前已提交給數據庫線程，工作器的狀態更新總在其後
+        if not self._register_dependencies(task) and await self.task_queue.put(task):
+            task.status = TaskStatus.QUEUED
         
         # 保存到數據庫
         await self.save_task_to_db(task)
         
-        # 添加到隊列
-        await self.add_task_to_queue(task)
-        
         logger.info(f"任務已創建: {task_id} ({name})")
         return task_id
     
+    async def create_tasks_bulk(self, specs: List[Tuple[str, TaskType, Optional[TaskConfig]]]) -> List[str]:
+        """批量創建任務：一次批量插入數據庫，再一次性加入隊列
+        
+        Args:
+            specs: (名稱, 任務類型, 配置) 元組列表，配置為None時使用默認配置
+            
+        Returns:
+            List[str]: 按 specs 順序的任務ID列表
+        """
+        now = datetime.now()
+        tasks = [
+            Task(
+                id=str(uuid.uuid4()),
+                name=name,
+                task_type=task_type,
+                status=TaskStatus.PENDING,
+                config=config or TaskConfig(),
+                created_at=now,
+                updated_at=now
+            )
+            for name, task_type, config in specs
+        ]
+        for task in tasks:
+            task._executor = self.executors.get(task.task_type)
+        
+        # 先加入隊列（依賴未完成的任務等待），入隊狀態隨插入一起寫入
+        ready = [task for task in tasks if not self._register_dependencies(task)]
+        accepted = await self.task_queue.put_many(ready)
+        for task in ready[:accepted]:
+            task.status = TaskStatus.QUEUED
+        
+        # 保存到數據庫
+        if self.db_manager and self.db_manager.settings.is_sqlite:
+            try:
+                await self.db_manager.task_db.create_tasks_bulk([self._task_db_data(task) for task in tasks])
+            except Exception as e:
+                logger.error(f"批量保存任務到數據庫失敗: {str(e)}")
+        
+        logger.info(f"已批量創建 {len(tasks)} 個任務")
+        return [task.id for task in tasks]
+    
+    @staticmethod
+    def _task_db_data(task: Task) -> Dict[str, Any]:
+        """構建插入數據庫的任務記錄"""
+        return {
+            'id': task.id,
+            'name': task.name,
+            'task_type': task.task_type._value_,
+            'status': task.status._value_,
+            'config': task.config_json,
+            'result': task.result,
+            'error_message': task.error_message,
+            'worker_id': task.worker_id,
+            'retry_count': task.retry_count
+        }
+    
     async def save_task_to_db(self, task: Task):
         """保存任務到數據庫"""
         if self.db_manager and self.db_manager.settings.is_sqlite:
             try:
-                task_data = {
-                    'id': task.id,
-                    'name': task.name,
-                    'task_type': task.task_type.value,
-                    'status': task.status.value,
-                    'config': {
-                        'timeout': task.config.timeout,
-                        'max_retries': task.config.max_retries,
-                        'retry_delay': task.config.retry_delay,
-                        'priority': task.config.priority,
-                        'worker_id': task.config.worker_id,
-                        'dependencies': task.config.dependencies,
-                        'max_parallel': task.config.max_parallel,
-                        'tags': task.config.tags
-                    },
-                    'result': task.result,
-                    'error_message': task.error_message,
-                    'worker_id': task.worker_id,
-                    'retry_count': task.retry_count
-                }
-                
-                await self.db_manager.task_db.create_task(task_data)
+                await self.db_manager.task_db.create_task(self._task_db_data(task))
                 
             except Exception as e:
                 logger.error(f"保存任務到數據庫失敗: {str(e)}")
     
     async def update_task_in_db(self, task: Task):
-        """更新任務到數據庫"""
+        """更新任務到數據庫（加入寫緩衝，由後台任務在下一個批次中寫入）"""
         if self.db_manager and self.db_manager.settings.is_sqlite:
-            try:
-                await self.db_manager.task_db.update_task_status(
-                    task.id,
-                    task.status.value,
-                    task.result,
-                    task.error_message
-                )
-                
-            except Exception as e:
-                logger.error(f"更新任務到數據庫失敗: {str(e)}")
+            # 直接讀取枚舉存儲的值，跳過 .value 屬性描述器；結果保留原始對象，
+            # 在刷新時按任務的最終快照只序列化一次；開始/完成時間隨快照寫入，
+            # 合併掉的中間狀態（如 running）不會丟失開始時間
+            self._write_buf[task.id] = (task.status._value_, task.result, task.error_message,
+                                        task.started_at, task.completed_at, task.id)
+            
+            if len(self._write_buf) >= self._max_batch:
+                await self.flush_updates()
+            elif self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def _flush_loop(self):
+        """按固定間隔批量寫入更新，緩衝為空時退出"""
+        while self._write_buf:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush_updates()
+    
+    async def flush_updates(self):
+        """立即以一次批量操作寫入所有緩衝中的任務更新"""
+        if not self._write_buf:
+            return
+        batch = list(self._write_buf.values())
+        self._write_buf = {}
+        try:
+            await self.db_manager.task_db.update_task_status_bulk(batch)
+        except Exception as e:
+            logger.error(f"更新任務到數據庫失敗: {str(e)}")
+    
+    def _register_dependencies(self, task: Task) -> bool:
+        """登記新任務及其依賴，返回是否需要等待依賴完成
+        
+        只有本管理器中尚未結束的任務才算未滿足的依賴；已結束或未知的依賴視為已滿足。
+        """
+        self._unfinished.add(task.id)
+        waiting = {dep_id for dep_id in task.config.dependencies if dep_id in self._unfinished}
+        if not waiting:
+            return False
+        
+        self._remaining_deps[task.id] = waiting
+        self._blocked_tasks[task.id] = task
+        for dep_id in waiting:
+            self._dependents[dep_id].add(task.id)
+        logger.info(f"任務 {task.id} 等待 {len(waiting)} 個依賴任務完成")
+        return True
+    
+    async def resolve_dependents(self, task: Task):
+        """任務結束後處理依賴它的任務
+        
+        成功完成時，依賴已全部滿足的任務加入隊列；失敗、超時或取消時，
+        依賴它的任務被取消（並遞歸取消其後續任務）。重試中的任務不處理。
+        """
+        if task.status not in (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.TIMEOUT, TaskStatus.CANCELLED):
+            return
+        
+        self._unfinished.discard(task.id)
+        for dep_id in self._dependents.pop(task.id, ()):
+            remaining = self._remaining_deps.get(dep_id)
+            if remaining is None:
+                continue
+            
+            if task.status == TaskStatus.COMPLETED:
+                remaining.discard(task.id)
+                if not remaining:
+                    del self._remaining_deps[dep_id]
+                    await self.add_task_to_queue(self._blocked_tasks.pop(dep_id))
+            else:
+                del self._remaining_deps[dep_id]
+                blocked = self._blocked_tasks.pop(dep_id)
+                blocked.status = TaskStatus.CANCELLED
+                blocked.error_message = f"依賴任務未成功完成: {task.id}"
+                blocked.updated_at = datetime.now()
+                await self.update_task_in_db(blocked)
+                await self.resolve_dependents(blocked)
     
     async def add_task_to_queue(self, task: Task):
         """添加任務到隊列"""
@@ -443,6 +720,7 @@ class TaskManager:
         """獲取任務"""
         if self.db_manager and self.db_manager.settings.is_sqlite:
             try:
+                await self.flush_updates()
                 task_data = await self.db_manager.task_db.get_task_by_id(task_id)
                 if task_data:
                     return self._task_from_db_data(task_data)
@@ -467,16 +745,14 @@ class TaskManager:
             )
             
             # 安全地獲取任務類型和狀態
-            try:
-                task_type = TaskType(data['task_type'])
-            except ValueError:
+            task_type = _TASK_TYPE_MAP.get(data['task_type'])
+            if task_type is None:
                 # 如果任務類型無效，默認為代理爬取
                 logger.warning(f"無效的任務類型: {data['task_type']}，使用默認值")
                 task_type = TaskType.PROXY_SCRAPING
             
-            try:
-                status = TaskStatus(data['status'])
-            except ValueError:
+            status = _TASK_STATUS_MAP.get(data['status'])
+            if status is None:
                 # 如果狀態無效，默認為待處理
                 logger.warning(f"無效的任務狀態: {data['status']}，使用默認值")
                 status = TaskStatus.PENDING
@@ -506,6 +782,7 @@ class TaskManager:
         """根據狀態獲取任務"""
         if self.db_manager and self.db_manager.settings.is_sqlite:
             try:
+                await self.flush_updates()
                 tasks_data = await self.db_manager.task_db.get_tasks_by_status(status.value, limit)
                 return [self._task_from_db_data(task_data) for task_data in tasks_data]
             except Exception as e:
@@ -533,8 +810,19 @@ class TaskManager:
         
         logger.info(f"已恢復 {len(running_tasks)} 個任務")
     
+    def stats_view(self) -> TaskManagerStats:
+        """獲取匯總統計（只更新預先分配的實例，不構建字典；序列化時使用 dataclasses.asdict）"""
+        view = self._stats_view
+        view.is_running = self.is_running
+        view.busy_workers = self._m_busy
+        view.queue_size = self.task_queue.qsize()
+        view.task_count = self._m_task_count
+        view.error_count = self._m_err_count
+        view.uptime = time.monotonic() - self._start_monotonic if self._start_monotonic is not None else 0.0
+        return view
+    
     def get_stats(self) -> Dict[str, Any]:
-        """獲取統計信息"""
+        """獲取統計信息（含每個工作器的詳細信息）"""
         worker_stats = [worker.get_stats() for worker in self.workers]
         queue_stats = self.task_queue.get_queue_stats()
         
@@ -593,4 +881,6 @@ async def test_task_manager():
 
 
 if __name__ == "__main__":
-    asyncio.run(test_task_manager())
\ No newline at end of file
+    if UVLOOP_AVAILABLE and sys.platform != "win32":
+        uvloop.install()
+    asyncio.run(test_task_manager())
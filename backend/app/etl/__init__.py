@@ -1,14 +1,37 @@
 """
 ETL模組
+
+導出的名稱在首次訪問時才導入對應子模組（PEP 562），導入本包不會載入全部提取器。
 """
-from app.etl.extractors import *
-from app.etl.transformers import *
-from app.etl.coordinator import ExtractionCoordinator, get_coordinator
+import importlib
+
+# 名稱 -> 定義該名稱的模組
+_LAZY = {
+    # 提取器
+    "BaseExtractor": "app.etl.extractors.base",
+    "APIExtractor": "app.etl.extractors.base",
+    "WebScrapingExtractor": "app.etl.extractors.base",
+    "ExtractResult": "app.etl.extractors.base",
+    "ProxyData": "app.etl.extractors.base",
+    "ExtractorFactory": "app.etl.extractors.factory",
+    "extractor_factory": "app.etl.extractors.factory",
+    "FreeProxyListExtractor": "app.etl.extractors.free_proxy_list",
+    "FreeProxyListAPIExtractor": "app.etl.extractors.free_proxy_list",
+    "ProxyListPlusExtractor": "app.etl.extractors.proxy_list_plus",
+
+    # 轉換器
+    "ProxyDataTransformer": "app.etl.transformers.proxy_transformer",
+    "ProxyDataFilter": "app.etl.transformers.proxy_transformer",
+
+    # 協調器
+    "ExtractionCoordinator": "app.etl.coordinator",
+    "get_coordinator": "app.etl.coordinator",
+}
 
 __all__ = [
     # 提取器
     "BaseExtractor",
-    "APIExtractor", 
+    "APIExtractor",
     "WebScrapingExtractor",
     "ExtractResult",
     "ProxyData",
@@ -17,12 +40,27 @@ __all__ = [
     "FreeProxyListExtractor",
     "FreeProxyListAPIExtractor",
     "ProxyListPlusExtractor",
-    
+
     # 轉換器
     "ProxyDataTransformer",
     "ProxyDataFilter",
-    
+
     # 協調器
     "ExtractionCoordinator",
     "get_coordinator",
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name: str):
+    """首次訪問時導入名稱所在的模組，並緩存到包的命名空間"""
+    module_name = _LAZY.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -2,22 +2,65 @@
 爬取協調器模組
 """
 import asyncio
+import functools
 import json
+import os
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
 from app.etl.extractors.base import BaseExtractor, ExtractResult
 from app.etl.extractors.factory import extractor_factory
 from app.core.logging import get_logger
 from app.core.exceptions import FetcherException
-from app.core.database_manager import get_db_session_manager
+from app.core.database_config import DatabaseType
+from app.core.database_manager import get_db_manager
 from app.models.proxy import Proxy, ProxyCrawlLog
-from app.schemas.proxy import ProxyCreate
-from sqlalchemy import select
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 
+# 嘗試導入orjson（更快的JSON解析）
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = get_logger(__name__)
 
+# 代理已存在時由抓取數據更新的列；狀態、響應時間、評分等由驗證流程維護，不被覆蓋
+_UPSERT_UPDATE_COLUMNS = ("protocol", "country", "city", "anonymity", "source")
+
+# 寫入的列 -> 抓取數據中的鍵（每行鍵集合一致，其餘列使用模型默認值）。
+# 提取器輸出 anonymity_level（ProxyData.to_dict），對應模型的 anonymity 列
+_UPSERT_INSERT_KEYS = {
+    "ip": "ip",
+    "port": "port",
+    "protocol": "protocol",
+    "country": "country",
+    "city": "city",
+    "anonymity": "anonymity_level",
+    "source": "source",
+}
+
+
+def _proxy_upsert_statement():
+    """
+    構建按 (ip, port) 衝突時更新的 PostgreSQL 代理批量插入語句
+    
+    Returns:
+        INSERT ... ON CONFLICT DO UPDATE 語句
+    """
+    stmt = pg_insert(Proxy)
+    table = Proxy.__table__
+    
+    # 新值為空時保留原值，與逐條更新時跳過 None 的行為一致
+    set_ = {name: func.coalesce(stmt.excluded[name], table.c[name]) for name in _UPSERT_UPDATE_COLUMNS}
+    set_["updated_at"] = stmt.excluded.updated_at
+    return stmt.on_conflict_do_update(index_elements=["ip", "port"], set_=set_)
+
+
+_PROXY_UPSERT_PG = _proxy_upsert_statement()
+
 
 class ExtractionCoordinator:
     """爬取協調器類"""
@@ -36,9 +79,11 @@ class ExtractionCoordinator:
         self.rate_limit_delay = config.get("rate_limit_delay", 1)
         self.enabled_sources = config.get("enabled_sources", [])
         self.config_file_path = config.get("config_file_path", "backend/config/proxy_sources.json")
+        self.batch_size = config.get("batch_size", 1000)
         
-        # 創建線程池
-        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent)
+        # 來源配置緩存（按名稱索引），配置文件修改時間變化時重新加載
+        self._source_config_cache: Optional[Dict[str, Dict[str, Any]]] = None
+        self._config_mtime: Optional[float] = None
         
         # 速率限制器
         self.rate_limiters = {}
@@ -90,12 +135,13 @@ class ExtractionCoordinator:
             try:
                 source_config = self._get_source_config(source_name)
                 if source_config and source_config.get("enabled", True):
-                    # 添加速率限制配置
-                    source_config.update({
-                        "rate_limit": source_config.get("rate_limit", 60),
-                        "timeout": source_config.get("timeout", 30),
-                        "retry_count": source_config.get("retry_count", 3)
-                    })
+                    # 添加速率限制配置（複製後修改，不影響緩存的配置）
+                    source_config = dict(
+                        source_config,
+                        rate_limit=source_config.get("rate_limit", 60),
+                        timeout=source_config.get("timeout", 30),
+                        retry_count=source_config.get("retry_count", 3),
+                    )
                     
                     extractor = extractor_factory.create_extractor(source_name, source_config)
                     extractors.append(extractor)
@@ -123,62 +169,73 @@ class ExtractionCoordinator:
         tasks = [extract_with_semaphore(extractor) for extractor in extractors]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        # 處理結果
+        # 處理結果（每個結果只判斷一次是否為異常，按爬取器位置寫入預分配的列表）
         all_proxies = []
-        for i, result in enumerate(results):
-            extractor_name = extractors[i].name
+        finished_results = []
+        extraction_results = [None] * len(extractors)
+        for index, (extractor, result) in enumerate(zip(extractors, results)):
+            extractor_name = extractor.name
             
             if isinstance(result, Exception):
-                logger.error(f"爬取器 {extractor_name} 失敗: {result}")
-                self.stats["failed_sources"] += 1
-                # 記錄失敗結果
-                self.stats["extraction_results"].append({
-                    "source": extractor_name,
-                    "success": False,
-                    "error": str(result),
-                    "proxies_count": 0
-                })
-                continue
-            
-            if result.success:
-                self.stats["successful_sources"] += 1
-                self.stats["total_proxies"] += len(result.proxies)
-                all_proxies.extend(result.proxies)
-                logger.info(f"爬取器 {extractor_name} 成功，提取 {len(result.proxies)} 個代理")
-                
-                # 記錄成功結果
-                self.stats["extraction_results"].append({
-                    "source": extractor_name,
-                    "success": True,
-                    "proxies_count": len(result.proxies),
-                    "metadata": result.extra_metadata
-                })
+                error = str(result)
             else:
-                self.stats["failed_sources"] += 1
-                logger.error(f"爬取器 {extractor_name} 失敗: {result.error_message}")
-                
-                # 記錄失敗結果
-                self.stats["extraction_results"].append({
-                    "source": extractor_name,
-                    "success": False,
-                    "error": result.error_message,
-                    "proxies_count": 0
-                })
-        
-        # 保存代理到數據庫
+                finished_results.append(result)
+                if result.success:
+                    proxies_count = len(result.proxies)
+                    self.stats["successful_sources"] += 1
+                    self.stats["total_proxies"] += proxies_count
+                    all_proxies.extend(result.proxies)
+                    logger.info(f"爬取器 {extractor_name} 成功，提取 {proxies_count} 個代理")
+                    
+                    # 記錄成功結果
+                    extraction_results[index] = self._result_entry(
+                        extractor_name, True, proxies_count, metadata=result.metadata
+                    )
+                    continue
+                error = result.error_message
+            
+            self.stats["failed_sources"] += 1
+            logger.error(f"爬取器 {extractor_name} 失敗: {error}")
+            
+            # 記錄失敗結果
+            extraction_results[index] = self._result_entry(extractor_name, False, error=error)
+        
+        self.stats["extraction_results"] = extraction_results
+        
+        # 按 (ip, port) 去重，多個來源返回的同一代理保留最後一條
+        if all_proxies:
+            all_proxies = list({(proxy["ip"], proxy["port"]): proxy for proxy in all_proxies}.values())
+        
+        # 保存代理與記錄爬取日誌寫入不同的表，各自從連接池獲取會話並發執行
+        saved_count, _ = await asyncio.gather(
+            self._save_proxies_to_database(all_proxies) if all_proxies else asyncio.sleep(0, result=0),
+            self._log_extraction_results(finished_results),
+        )
         if all_proxies:
-            saved_count = await self._save_proxies_to_database(all_proxies)
             logger.info(f"成功保存 {saved_count} 個代理到數據庫")
         
         # 更新統計
         self.stats["end_time"] = datetime.utcnow()
         
-        # 記錄爬取日誌
-        await self._log_extraction_results(results)
-        
         logger.info(f"爬取任務完成，統計: {self.stats}")
         return self.stats
     
+    @staticmethod
+    def _result_entry(source: str, success: bool, proxies_count: int = 0, **extra: Any) -> Dict[str, Any]:
+        """
+        構建單個來源的提取結果記錄
+        
+        Args:
+            source: 來源名稱
+            success: 是否成功
+            proxies_count: 提取的代理數量
+            **extra: 附加字段（成功時為 metadata，失敗時為 error）
+            
+        Returns:
+            Dict[str, Any]: 結果記錄
+        """
+        return {"source": source, "success": success, "proxies_count": proxies_count, **extra}
+    
     async def _extract_with_retry(self, extractor: BaseExtractor) -> ExtractResult:
         """
         帶重試的提取
@@ -211,6 +268,7 @@ class ExtractionCoordinator:
                         source=extractor.name,
                         proxies=[],
                         metadata={"attempts": attempt + 1},
+                        timestamp=None,
                         success=False,
                         error_message=str(e),
                     )
@@ -223,6 +281,7 @@ class ExtractionCoordinator:
             source=extractor.name,
             proxies=[],
             metadata={"attempts": self.retry_attempts},
+            timestamp=None,
             success=False,
             error_message="所有重試都失敗",
         )
@@ -231,76 +290,72 @@ class ExtractionCoordinator:
         """
         保存代理到數據庫
         
+        SQLite 在單個事務中由代理數據庫按 (ip, port) 批量寫入；PostgreSQL 按 batch_size
+        分塊執行批量 upsert，所有分塊在同一事務中提交。會話來自數據庫管理器共享的連接池。
+        數據已由提取器的 validate_proxy_data 校驗，這裡只投影到代理表的列。
+        
         Args:
             proxies_data: 代理數據列表
             
         Returns:
             int: 成功保存的數量
         """
-        saved_count = 0
-        
         try:
-            async with get_db_session_manager() as session:
-                for proxy_data in proxies_data:
-                    try:
-                        # 檢查是否已存在
-                        existing = await session.execute(
-                            select(Proxy).where(
-                                Proxy.ip == proxy_data["ip"],
-                                Proxy.port == proxy_data["port"]
-                            )
-                        )
-                        existing_proxy = existing.scalar_one_or_none()
-                        
-                        if existing_proxy:
-                            # 更新現有代理
-                            for key, value in proxy_data.items():
-                                if hasattr(existing_proxy, key) and value is not None:
-                                    setattr(existing_proxy, key, value)
-                            existing_proxy.updated_at = datetime.utcnow()
-                        else:
-                            # 創建新代理
-                            proxy_create = ProxyCreate(**proxy_data)
-                            new_proxy = Proxy(**proxy_create.dict())
-                            session.add(new_proxy)
-                        
-                        saved_count += 1
-                        
-                    except Exception as e:
-                        logger.error(f"保存代理失敗: {proxy_data}, 錯誤: {e}")
-                        continue
+            manager = get_db_manager()
+            if manager.config.database_type == DatabaseType.SQLITE:
+                # SQLite 會話只是適配器的薄封裝，不能執行 SQLAlchemy 語句，直接使用代理數據庫
+                return await manager.proxy_db.upsert_proxies_bulk([
+                    (proxy_data["ip"], proxy_data["port"], proxy_data.get("protocol"),
+                     proxy_data.get("country"), proxy_data.get("anonymity_level"))
+                    for proxy_data in proxies_data
+                ])
+            
+            rows = [{column: proxy_data.get(key) for column, key in _UPSERT_INSERT_KEYS.items()}
+                    for proxy_data in proxies_data]
+            async with manager.get_session() as session:
+                for start in range(0, len(rows), self.batch_size):
+                    await session.execute(_PROXY_UPSERT_PG, rows[start:start + self.batch_size])
                 
                 await session.commit()
+                return len(rows)
                 
         except SQLAlchemyError as e:
             logger.error(f"數據庫錯誤: {e}")
         except Exception as e:
             logger.error(f"保存代理到數據庫失敗: {e}")
         
-        return saved_count
+        return 0
     
     async def _log_extraction_results(self, results: List[ExtractResult]) -> None:
         """
         記錄爬取結果
         
         Args:
-            results: 提取結果列表
+            results: 提取結果列表（不含異常）
         """
+        rows = [
+            {
+                "source": result.source,
+                "total_found": len(result.proxies),
+                "success": result.success,
+                "error_message": result.error_message,
+                "extra_metadata": result.metadata,
+            }
+            for result in results
+        ]
+        if not rows:
+            return
+        
         try:
-            async with get_db_session_manager() as session:
-                for result in results:
-                    if isinstance(result, Exception):
-                        continue
-                    
-                    log_entry = ProxyCrawlLog(
-                        source=result.source,
-                        total_found=len(result.proxies),
-                        success=result.success,
-                        error_message=result.error_message,
-                        extra_metadata=result.extra_metadata,
-                    )
-                    session.add(log_entry)
-                
+            manager = get_db_manager()
+            if manager.config.database_type == DatabaseType.SQLITE:
+                # SQLite 會話不能執行 ORM 插入（也不會應用模型的 Python 端默認值），直接使用代理數據庫
+                await manager.proxy_db.create_crawl_logs_bulk(rows)
+                return
+            
+            async with manager.get_session() as session:
+                # 一條批量插入寫入所有日誌
+                await session.execute(insert(ProxyCrawlLog), rows)
                 await session.commit()
                 
         except Exception as e:
@@ -317,14 +372,22 @@ class ExtractionCoordinator:
             Optional[Dict[str, Any]]: 來源配置
         """
         try:
-            # 從配置文件加載
-            with open(self.config_file_path, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
+            # 配置文件未修改時直接使用緩存
+            mtime = os.stat(self.config_file_path).st_mtime
+            if self._source_config_cache is None or mtime != self._config_mtime:
+                with open(self.config_file_path, 'rb') as f:
+                    raw = f.read()
+                config_data = orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+                
+                self._source_config_cache = {
+                    source_config.get("name"): source_config
+                    for source_config in config_data.get("proxy_sources", [])
+                }
+                self._config_mtime = mtime
             
-            # 查找對應的來源配置
-            for source_config in config_data.get("proxy_sources", []):
-                if source_config.get("name") == source_name:
-                    return source_config
+            source_config = self._source_config_cache.get(source_name)
+            if source_config is not None:
+                return source_config
             
             logger.warning(f"未找到來源配置: {source_name}")
             return None
@@ -341,62 +404,48 @@ class ExtractionCoordinator:
     
     def _init_rate_limiter(self, source_name: str, rate_limit: int) -> None:
         """
-        初始化速率限制器
+        初始化速率限制器（令牌桶）
         
         Args:
             source_name: 來源名稱
             rate_limit: 每分鐘請求限制
         """
+        # 全部使用浮點數，補充令牌時只做浮點運算；時間取自事件循環的單調時鐘
+        capacity = float(rate_limit)
         self.rate_limiters[source_name] = {
-            "rate_limit": rate_limit,
-            "last_request_time": 0,
-            "request_count": 0,
-            "window_start": datetime.utcnow()
+            "lock": asyncio.Lock(),
+            "tokens": capacity,
+            "last": asyncio.get_running_loop().time(),
+            "rate": capacity / 60.0,
+            "capacity": capacity,
         }
     
     async def _apply_rate_limit(self, source_name: str) -> None:
         """
         應用速率限制
         
+        只在更新令牌時持有鎖，等待令牌補充時釋放鎖，不阻塞同一來源的其他等待者重新檢查。
+        
         Args:
             source_name: 來源名稱
         """
         if source_name not in self.rate_limiters:
             return
         
-        rate_limiter = self.rate_limiters[source_name]
-        now = datetime.utcnow()
-        
-        # 檢查是否在新窗口
-        time_diff = (now - rate_limiter["window_start"]).total_seconds()
-        if time_diff >= 60:  # 新的一分鐘窗口
-            rate_limiter["request_count"] = 0
-            rate_limiter["window_start"] = now
-        
-        # 檢查是否超過速率限制
-        if rate_limiter["request_count"] >= rate_limiter["rate_limit"]:
-            # 等待到下一個窗口
-            wait_time = 60 - time_diff
-            if wait_time > 0:
-                logger.info(f"速率限制: {source_name} 等待 {wait_time:.1f} 秒")
-                await asyncio.sleep(wait_time)
-                rate_limiter["request_count"] = 0
-                rate_limiter["window_start"] = datetime.utcnow()
-        
-        # 增加請求計數
-        rate_limiter["request_count"] += 1
-        
-        # 確保請求間隔
-        last_request_time = rate_limiter["last_request_time"]
-        if last_request_time > 0:
-            time_since_last = (now.timestamp() - last_request_time)
-            min_interval = 60 / rate_limiter["rate_limit"]  # 最小間隔
+        bucket = self.rate_limiters[source_name]
+        loop = asyncio.get_running_loop()
+        while True:
+            async with bucket["lock"]:
+                now = loop.time()
+                bucket["tokens"] = min(bucket["capacity"], bucket["tokens"] + (now - bucket["last"]) * bucket["rate"])
+                bucket["last"] = now
+                if bucket["tokens"] >= 1:
+                    bucket["tokens"] -= 1
+                    return
+                wait_time = (1.0 - bucket["tokens"]) / bucket["rate"]
             
-            if time_since_last < min_interval:
-                sleep_time = min_interval - time_since_last
-                await asyncio.sleep(sleep_time)
-        
-        rate_limiter["last_request_time"] = now.timestamp()
+            logger.info(f"速率限制: {source_name} 等待 {wait_time:.1f} 秒")
+            await asyncio.sleep(wait_time)
     
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -412,11 +461,22 @@ class ExtractionCoordinator:
         清理資源
         """
         logger.info("清理爬取協調器資源")
-        self.executor.shutdown(wait=True)
 
 
-# 創建全局協調器實例
-coordinator = None
+# 未提供配置時使用的默認配置
+_DEFAULT_CONFIG = {
+    "max_concurrent": 5,
+    "retry_attempts": 3,
+    "retry_delay": 5,
+    "rate_limit_delay": 1,
+    "enabled_sources": [],
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _build_coordinator(config_key: str) -> ExtractionCoordinator:
+    """按序列化後的配置創建協調器，相同配置復用同一實例"""
+    return ExtractionCoordinator(json.loads(config_key))
 
 
 def get_coordinator(config: Optional[Dict[str, Any]] = None) -> ExtractionCoordinator:
@@ -429,18 +489,4 @@ def get_coordinator(config: Optional[Dict[str, Any]] = None) -> ExtractionCoordi
     Returns:
         ExtractionCoordinator: 爬取協調器實例
     """
-    global coordinator
-    
-    if coordinator is None:
-        if config is None:
-            config = {
-                "max_concurrent": 5,
-                "retry_attempts": 3,
-                "retry_delay": 5,
-                "rate_limit_delay": 1,
-                "enabled_sources": [],
-            }
-        
-        coordinator = ExtractionCoordinator(config)
-    
-    return coordinator
\ No newline at end of file
+    return _build_coordinator(json.dumps(config or _DEFAULT_CONFIG, sort_keys=True))
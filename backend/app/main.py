@@ -11,6 +11,7 @@ from .core.monitoring_middleware import setup_monitoring
 from .core.error_handler import ErrorHandlerMiddleware
 from .core.database_config import DatabaseConfig, DatabaseType
 from .core.database_manager import get_db_manager, init_db_manager, close_db_manager
+from .core.proxy_pool import close_proxy_pool_manager
 from .api.monitoring_endpoints import router as monitoring_router
 from .api.v1 import crawl, proxies, system, tasks
 
@@ -125,6 +126,12 @@ def create_app(config: MonitoringConfig = None, db_config: DatabaseConfig = None
         logger = get_logger("app")
         logger.info("代理收集器應用關閉")
         
+        # 關閉代理池HTTP會話
+        try:
+            await close_proxy_pool_manager()
+        except Exception as e:
+            logger.error(f"關閉代理池時出錯: {str(e)}")
+        
         # 關閉數據庫連接
         try:
             await close_db_manager()
@@ -220,7 +220,6 @@ async def test_task_lifecycle():
     print(f"工作器數量: {stats['worker_count']}")
     print(f"運行時間: {stats['uptime']:.1f} 秒")
     print(f"隊列大小: {stats['queue']['queue_size']}")
-    print(f"待處理任務: {stats['queue']['pending_count']}")
     
     # 顯示工作器狀態
     print("\n👷 工作器狀態:")
@@ -0,0 +1,273 @@
+"""
+爬取協調器單元測試
+"""
+
+import pytest
+import pytest_asyncio
+import asyncio
+import json
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+# 添加項目根目錄到Python路徑
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy.dialects import postgresql
+
+from app.core.database_config import DatabaseConfig, DatabaseType
+from app.core.database_manager import DatabaseManager
+from app.etl import coordinator as coordinator_module
+from app.etl.coordinator import ExtractionCoordinator
+from app.etl.extractors.base import ExtractResult
+from app.models.proxy import ProxyCrawlLog
+
+
+@pytest_asyncio.fixture
+async def db_manager(tmp_path, monkeypatch):
+    """創建使用臨時SQLite數據庫的真實數據庫管理器，並替換協調器使用的數據庫管理器"""
+    manager = DatabaseManager(config=DatabaseConfig.sqlite_config(database=str(tmp_path / "proxies.db")))
+    assert await manager.initialize()
+    monkeypatch.setattr(coordinator_module, "get_db_manager", lambda: manager)
+    yield manager
+    await manager.close()
+
+
+def make_proxy(ip, port=8080, **extra):
+    """構建提取器輸出的代理數據"""
+    return {"ip": ip, "port": port, "protocol": "http", **extra}
+
+
+class TestDatabaseWrites:
+    """數據庫寫入測試類"""
+
+    @pytest.mark.asyncio
+    async def test_sqlite_upsert_inserts_and_updates_existing(self, db_manager):
+        """測試SQLite下批量寫入代理，已存在的代理只更新抓取提供的非空列"""
+        coordinator = ExtractionCoordinator({})
+        assert await coordinator._save_proxies_to_database(
+            [make_proxy("1.1.1.1", country="US"), make_proxy("2.2.2.2"), make_proxy("3.3.3.3")]
+        ) == 3
+        await db_manager.engine.execute("UPDATE proxies SET is_active = 0, success_rate = 0.9 WHERE ip = '1.1.1.1'")
+
+        saved = await coordinator._save_proxies_to_database(
+            [make_proxy("1.1.1.1", protocol="https", anonymity_level="elite", speed=1.5)]
+        )
+
+        assert saved == 1
+        rows = await db_manager.engine.fetch_all(
+            "SELECT ip, protocol, country, anonymity_level, is_active, success_rate FROM proxies ORDER BY ip"
+        )
+        assert [tuple(row.values()) for row in rows] == [
+            ("1.1.1.1", "https", "US", "elite", 0, 0.9),
+            ("2.2.2.2", "http", None, None, 1, 0.0),
+            ("3.3.3.3", "http", None, None, 1, 0.0),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_postgresql_upsert_chunked_in_one_transaction(self, monkeypatch):
+        """測試PostgreSQL下按 batch_size 分塊執行 ON CONFLICT 批量插入，最後提交一次"""
+        session = AsyncMock()
+
+        @asynccontextmanager
+        async def get_session():
+            yield session
+
+        manager = Mock(config=Mock(database_type=DatabaseType.POSTGRESQL), get_session=get_session)
+        monkeypatch.setattr(coordinator_module, "get_db_manager", lambda: manager)
+        coordinator = ExtractionCoordinator({"batch_size": 2})
+
+        saved = await coordinator._save_proxies_to_database(
+            [make_proxy(f"1.1.1.{i}", anonymity_level="elite", source="list") for i in range(3)]
+        )
+
+        assert saved == 3
+        assert [len(call.args[1]) for call in session.execute.await_args_list] == [2, 1]
+        assert session.execute.await_args_list[0].args[1][0] == {
+            "ip": "1.1.1.0", "port": 8080, "protocol": "http", "country": None, "city": None,
+            "anonymity": "elite", "source": "list",
+        }
+        session.commit.assert_awaited_once()
+        sql = str(session.execute.await_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (ip, port) DO UPDATE SET protocol = coalesce(excluded.protocol, proxies.protocol)" in sql
+        assert "status" not in sql.split("DO UPDATE")[1]
+
+    @pytest.mark.asyncio
+    async def test_sqlite_extraction_logs_bulk_inserted(self, db_manager):
+        """測試SQLite下提取日誌以一次批量插入寫入，ID與爬取時間由列默認值生成"""
+        coordinator = ExtractionCoordinator({})
+        results = [
+            ExtractResult(source="a", proxies=[make_proxy("1.1.1.1")], metadata={"pages": 2},
+                          timestamp=None, success=True),
+            ExtractResult(source="b", proxies=[], metadata={}, timestamp=None, success=False, error_message="timeout"),
+        ]
+
+        await coordinator._log_extraction_results(results)
+
+        logs = await db_manager.engine.fetch_all("SELECT * FROM proxy_crawl_logs ORDER BY source")
+        assert [(log["source"], log["total_found"], log["success"], log["error_message"]) for log in logs] == [
+            ("a", 1, 1, None), ("b", 0, 0, "timeout")
+        ]
+        assert json.loads(logs[0]["extra_metadata"]) == {"pages": 2}
+        assert all(log["id"] and log["crawled_at"] for log in logs)
+
+    @pytest.mark.asyncio
+    async def test_postgresql_extraction_logs_use_orm_bulk_insert(self, monkeypatch):
+        """測試PostgreSQL下提取日誌以一條ORM批量插入寫入並提交"""
+        session = AsyncMock()
+
+        @asynccontextmanager
+        async def get_session():
+            yield session
+
+        manager = Mock(config=Mock(database_type=DatabaseType.POSTGRESQL), get_session=get_session)
+        monkeypatch.setattr(coordinator_module, "get_db_manager", lambda: manager)
+        result = ExtractResult(source="a", proxies=[], metadata={}, timestamp=None, success=True)
+
+        await ExtractionCoordinator({})._log_extraction_results([result])
+
+        stmt, rows = session.execute.await_args.args
+        assert stmt.table.name == ProxyCrawlLog.__tablename__
+        assert rows == [{"source": "a", "total_found": 0, "success": True, "error_message": None, "extra_metadata": {}}]
+        session.commit.assert_awaited_once()
+
+
+class FakeExtractor:
+    """返回預設結果的爬取器"""
+
+    def __init__(self, name, result):
+        self.name = name
+        self._result = result
+
+    async def extract(self):
+        if isinstance(self._result, Exception):
+            raise self._result
+        return self._result
+
+
+class TestCoordinateExtraction:
+    """協調提取流程測試類"""
+
+    @pytest.mark.asyncio
+    async def test_results_recorded_deduplicated_and_written_concurrently(self, db_manager, monkeypatch):
+        """測試結果按爬取器順序記錄，代理去重後保存，保存與日誌寫入並發執行"""
+        results = {
+            "a": ExtractResult(source="a", proxies=[make_proxy("1.1.1.1"), make_proxy("2.2.2.2")],
+                               metadata={"pages": 1}, timestamp=None, success=True),
+            "b": RuntimeError("boom"),
+            "c": ExtractResult(source="c", proxies=[make_proxy("2.2.2.2", country="DE")],
+                               metadata={}, timestamp=None, success=True),
+        }
+        coordinator = ExtractionCoordinator({"retry_attempts": 1, "retry_delay": 0})
+        monkeypatch.setattr(coordinator, "_get_source_config", lambda name: {"name": name})
+        monkeypatch.setattr(coordinator_module.extractor_factory, "create_extractor",
+                            lambda name, config: FakeExtractor(name, results[name]))
+
+        events = []
+        for method in ("_save_proxies_to_database", "_log_extraction_results"):
+            original = getattr(coordinator, method)
+
+            async def recording(items, method=method, original=original):
+                events.append(("start", method, len(items)))
+                await asyncio.sleep(0.01)
+                value = await original(items)
+                events.append(("end", method))
+                return value
+
+            monkeypatch.setattr(coordinator, method, recording)
+
+        stats = await coordinator.coordinate_extraction(["a", "b", "c"])
+
+        assert (stats["successful_sources"], stats["failed_sources"], stats["total_proxies"]) == (2, 1, 3)
+        assert stats["extraction_results"] == [
+            {"source": "a", "success": True, "proxies_count": 2, "metadata": {"pages": 1}},
+            {"source": "b", "success": False, "proxies_count": 0, "error": "boom"},
+            {"source": "c", "success": True, "proxies_count": 1, "metadata": {}},
+        ]
+        assert sorted(events[:2]) == [
+            ("start", "_log_extraction_results", 3), ("start", "_save_proxies_to_database", 2)
+        ]
+        rows = await db_manager.engine.fetch_all("SELECT ip, country FROM proxies ORDER BY ip")
+        assert [(row["ip"], row["country"]) for row in rows] == [("1.1.1.1", None), ("2.2.2.2", "DE")]
+        logs = await db_manager.engine.fetch_all("SELECT source, success FROM proxy_crawl_logs ORDER BY source")
+        assert [(log["source"], log["success"]) for log in logs] == [("a", 1), ("b", 0), ("c", 1)]
+
+
+class TestRateLimit:
+    """速率限制測試類"""
+
+    @pytest.mark.asyncio
+    async def test_token_bucket_waits_outside_lock(self, monkeypatch):
+        """測試令牌用盡後按補充速率等待，等待期間不持有鎖"""
+        coordinator = ExtractionCoordinator({})
+        coordinator._init_rate_limiter("source", 2)
+        bucket = coordinator.rate_limiters["source"]
+        assert isinstance(bucket["tokens"], float) and isinstance(bucket["capacity"], float)
+        sleeps = []
+
+        async def fake_sleep(delay):
+            assert not bucket["lock"].locked()
+            sleeps.append(delay)
+            bucket["last"] -= delay
+
+        monkeypatch.setattr(coordinator_module.asyncio, "sleep", fake_sleep)
+        for _ in range(3):
+            await coordinator._apply_rate_limit("source")
+        await coordinator._apply_rate_limit("unknown")
+
+        assert len(sleeps) == 1
+        assert sleeps[0] == pytest.approx(30, rel=0.01)
+        assert bucket["tokens"] < 1
+
+
+class TestSourceConfig:
+    """來源配置測試類"""
+
+    def test_config_parsed_once_until_file_changes(self, tmp_path, monkeypatch):
+        """測試配置文件只解析一次，修改時間變化後重新加載"""
+        path = tmp_path / "sources.json"
+        path.write_text('{"proxy_sources": [{"name": "a", "rate_limit": 10}, {"name": "b"}]}', encoding="utf-8")
+        coordinator = ExtractionCoordinator({"config_file_path": str(path)})
+        opened = []
+        real_open = open
+
+        def recording_open(*args, **kwargs):
+            opened.append(args[0])
+            return real_open(*args, **kwargs)
+
+        monkeypatch.setattr("builtins.open", recording_open)
+
+        assert coordinator._get_source_config("a") == {"name": "a", "rate_limit": 10}
+        assert coordinator._get_source_config("b") == {"name": "b"}
+        assert coordinator._get_source_config("missing") is None
+        assert len(opened) == 1
+
+        path.write_text('{"proxy_sources": [{"name": "a", "rate_limit": 20}]}', encoding="utf-8")
+        stat = path.stat()
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+        assert coordinator._get_source_config("a") == {"name": "a", "rate_limit": 20}
+        assert coordinator._get_source_config("b") is None
+        assert len(opened) == 2
+
+
+class TestGetCoordinator:
+    """協調器工廠測試類"""
+
+    def test_same_config_reuses_instance(self):
+        """測試相同配置（鍵順序無關）返回同一實例，配置變化時創建新實例"""
+        coordinator_module._build_coordinator.cache_clear()
+
+        default = coordinator_module.get_coordinator()
+        assert coordinator_module.get_coordinator() is default
+        assert default.max_concurrent == 5
+
+        first = coordinator_module.get_coordinator({"max_concurrent": 2, "retry_attempts": 1})
+        assert coordinator_module.get_coordinator({"retry_attempts": 1, "max_concurrent": 2}) is first
+        assert first is not default
+        assert (first.max_concurrent, first.retry_attempts) == (2, 1)
+        assert not hasattr(first, "executor")
+        coordinator_module._build_coordinator.cache_clear()
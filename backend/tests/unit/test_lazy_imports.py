@@ -0,0 +1,43 @@
+"""
+包延遲導入單元測試
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+# 添加項目根目錄到Python路徑
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def run_python(code: str) -> str:
+    """在新的解釋器中執行代碼，返回標準輸出的最後一行"""
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=project_root, capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+class TestLazyImports:
+    """延遲導入測試類"""
+
+    def test_import_etl_does_not_load_extractors_or_api(self):
+        """測試導入 app.etl 不會連帶載入提取器、協調器和API路由"""
+        loaded = run_python(
+            "import sys, app.etl; "
+            "print(sorted(m for m in sys.modules if m.startswith(('app.etl.', 'app.api'))))"
+        )
+
+        assert loaded == "[]"
+
+    def test_names_resolved_on_first_access(self):
+        """測試導出名稱在首次訪問時導入並緩存"""
+        output = run_python(
+            "import app, app.etl; "
+            "from app import coordinator, v1_router; "
+            "print(app.etl.ExtractionCoordinator.__module__, coordinator.__name__, "
+            "type(v1_router).__name__, 'coordinator' in vars(app))"
+        )
+
+        assert output == "app.etl.coordinator app.etl.coordinator APIRouter True"
@@ -5,13 +5,17 @@
 
 import pytest
 import json
+import logging
 import tempfile
+import threading
+import time
 import os
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime
+from decimal import Decimal
 
 from app.core.monitoring_config import MonitoringConfig, DEFAULT_CONFIG, DEVELOPMENT_CONFIG, PRODUCTION_CONFIG
-from app.core.structured_logging import StructuredLogger, get_logger, log_proxy_operation, log_validation_result
+from app.core.structured_logging import JSONFormatter, StructuredLogger, get_logger, log_proxy_operation, log_validation_result
 from app.core.metrics_collector import MetricsCollector, SystemMetrics, ApplicationMetrics
 
 
@@ -117,6 +121,124 @@ class TestStructuredLogging:
         # 測試通過，因為日誌記錄器成功初始化並能記錄消息
         assert True
     
+    def test_json_formatter_template_matches_dict_encoding(self):
+        """測試JSON格式化器 - 模板輸出與字典編碼結果一致，需轉義的字符正確處理"""
+        formatter = JSONFormatter()
+        record = logging.LogRecord(
+            'app"x', logging.INFO, "/src/module.py", 42, '代理 "%s"\n', ("a\\b",), None
+        )
+        
+        fast = json.loads(formatter.format(record))
+        record.extra_fields = {"proxy_id": "p1"}
+        slow = json.loads(formatter.format(record))
+        
+        assert slow.pop("proxy_id") == "p1"
+        fast.pop("timestamp")
+        slow.pop("timestamp")
+        assert fast == slow
+        assert fast["message"] == '代理 "a\\b"\n'
+        assert fast["function"] is None
+        
+        record.extra_fields = {}
+        fast_text = formatter.format(record)
+        record.extra_fields = {"ratio": Decimal("0.75"), 7: "int key"}
+        slow_text = formatter.format(record)
+        assert slow_text == fast_text[:-1] + ',"ratio":"0.75","7":"int key"}'
+        
+        record.extra_fields = {"level": "AUDIT", "proxy_id": "p1"}
+        overridden = json.loads(formatter.format(record))
+        assert (overridden["level"], overridden["proxy_id"], overridden["line"]) == ("AUDIT", "p1", 42)
+    
+    def test_disabled_level_skipped_and_exception_captured(self, caplog):
+        """測試未啟用級別直接跳過，exception記錄帶異常信息"""
+        config = MonitoringConfig(log_format="json", log_level="INFO")
+        logger = StructuredLogger("test_levels", config)
+        
+        logger.debug("hidden debug", detail=1)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("captured", task_id="t1")
+        
+        messages = [record.getMessage() for record in caplog.records if record.name == "test_levels"]
+        assert messages == ["captured"]
+        record = caplog.records[-1]
+        assert record.exc_info[0] is ValueError
+        assert record.extra_fields == {"task_id": "t1"}
+        assert "ValueError: boom" in json.loads(JSONFormatter().format(record))["exception"]
+    
+    def test_records_written_by_listener_thread(self, tmp_path):
+        """測試日誌經隊列由監聽線程寫入文件，關閉時寫出排隊的記錄"""
+        log_file = tmp_path / "app.log"
+        config = MonitoringConfig(log_format="json", log_file=str(log_file))
+        logger = StructuredLogger("test_queue", config)
+        
+        assert [type(h).__name__ for h in logger.logger.handlers] == ["_RecordQueueHandler"]
+        try:
+            raise RuntimeError("disk full")
+        except RuntimeError:
+            logger.exception("save failed", proxy_id="p1")
+        logger.close()
+        
+        entry = json.loads(log_file.read_text(encoding="utf-8").splitlines()[-1])
+        assert entry["message"] == "save failed"
+        assert entry["proxy_id"] == "p1"
+        assert "RuntimeError: disk full" in entry["exception"]
+    
+    def test_concurrent_threads_enqueue_without_handler_lock(self, tmp_path):
+        """測試多線程同時記錄時入隊不獲取處理器鎖，所有記錄都寫出"""
+        log_file = tmp_path / "threads.log"
+        config = MonitoringConfig(log_format="json", log_file=str(log_file))
+        logger = StructuredLogger("test_threads", config)
+        queue_handler = logger.logger.handlers[0]
+        queue_handler.acquire = Mock(side_effect=AssertionError("handler lock taken"))
+        
+        def worker(index):
+            for i in range(50):
+                logger.info("tick", worker=index, seq=i)
+        
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        logger.close()
+        
+        entries = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+        assert len(entries) == 200
+        assert {entry["worker"] for entry in entries} == {0, 1, 2, 3}
+    
+    def test_file_writes_buffered_and_flushed_periodically(self, tmp_path):
+        """測試文件日誌批量寫入 - 未滿批次的記錄在定時刷新後寫出"""
+        log_file = tmp_path / "buffered.log"
+        config = MonitoringConfig(log_format="json", log_file=str(log_file))
+        logger = StructuredLogger("test_buffered", config)
+        
+        logger.info("first")
+        logger.info("second")
+        
+        deadline = time.monotonic() + 5
+        lines = []
+        while time.monotonic() < deadline and len(lines) < 2:
+            time.sleep(0.05)
+            lines = log_file.read_text(encoding="utf-8").splitlines()
+        logger.close()
+        
+        assert [json.loads(line)["message"] for line in lines] == ["first", "second"]
+    
+    def test_timestamp_from_record_created(self):
+        """測試時間戳取自記錄創建時間（UTC），同一秒內復用已格式化的前綴"""
+        formatter = JSONFormatter()
+        record = logging.LogRecord("app", logging.INFO, "", 0, "msg", (), None)
+        
+        record.created = 1700000000.25
+        assert formatter._format_timestamp(record) == "2023-11-14T22:13:20.250000Z"
+        record.created = 1700000000.5
+        assert formatter._format_timestamp(record) == "2023-11-14T22:13:20.500000Z"
+        record.created = 1700000061.000001
+        assert formatter._format_timestamp(record).startswith("2023-11-14T22:14:21.0000")
+        assert formatter._last_second == (1700000061, "2023-11-14T22:14:21")
+    
     def test_get_logger_singleton(self):
         """測試日誌記錄器單例"""
         logger1 = get_logger("test_app")
@@ -152,6 +274,23 @@ class TestStructuredLogging:
         assert len(caplog.records) >= 1
         log_record = caplog.records[-1]
         assert "代理驗證結果: 有效" in log_record.getMessage()
+    
+    def test_helpers_skip_disabled_levels(self):
+        """測試日誌級別未啟用時輔助函數不構建消息也不調用記錄方法"""
+        logger = get_logger()
+        previous_level = logger.logger.level
+        logger.logger.setLevel(logging.WARNING)
+        try:
+            with patch.object(logger, "info") as info, patch.object(logger, "error") as error:
+                log_proxy_operation("create", {"ip": "1.1.1.1"})
+                log_validation_result("proxy_123", True, 1.5)
+                assert not info.called
+                
+                from app.core.structured_logging import log_error
+                log_error("db", "locked")
+                assert error.called
+        finally:
+            logger.logger.setLevel(previous_level)
 
 
 class TestMetricsCollector:
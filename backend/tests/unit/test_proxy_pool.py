@@ -0,0 +1,485 @@
+"""
+代理池管理器單元測試
+"""
+
+import pytest
+import pytest_asyncio
+import asyncio
+import json
+import numpy as np
+import sys
+from datetime import datetime
+from pathlib import Path
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, Mock, patch
+
+# 添加項目根目錄到Python路徑
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import text
+
+from app.core import proxy_pool as proxy_pool_module
+from app.core.database_config import DatabaseConfig
+from app.core.database_manager import DatabaseManager
+from app.core.proxy_pool import (
+    ProxyPoolManager, ProxyInfo, ProxyValidationResult, ProxyTable, tags_to_bits, bits_to_tags
+)
+
+
+@pytest_asyncio.fixture
+async def db_manager(tmp_path, monkeypatch):
+    """創建使用臨時SQLite數據庫的真實數據庫管理器，並替換代理池使用的數據庫管理器"""
+    manager = DatabaseManager(config=DatabaseConfig.sqlite_config(database=str(tmp_path / "proxy_pool.db")))
+    assert await manager.initialize()
+    monkeypatch.setattr(proxy_pool_module, "get_db_manager", lambda: manager)
+    yield manager
+    await manager.close()
+
+
+def make_db_manager(session):
+    """構建返回指定會話的模擬數據庫管理器"""
+    db_manager = Mock()
+    
+    @asynccontextmanager
+    async def get_session():
+        yield session
+    
+    db_manager.get_session = get_session
+    return db_manager
+
+
+class TestProxyPoolManager:
+    """代理池管理器測試類"""
+    
+    @pytest.fixture
+    def manager(self):
+        """創建代理池管理器實例"""
+        manager = ProxyPoolManager()
+        manager.metrics = Mock()
+        return manager
+    
+    @pytest.fixture
+    def sample_proxies(self):
+        """樣本代理列表"""
+        return [
+            ProxyInfo(host=f"10.0.0.{i}", port=8080, protocol="http")
+            for i in range(1, 6)
+        ]
+    
+    @pytest.mark.asyncio
+    async def test_validate_proxies_batches_status_update(self, manager, sample_proxies):
+        """測試批量驗證 - 結果按輸入順序返回且只寫一次數據庫"""
+        async def fake_probe(proxy):
+            return ProxyValidationResult(proxy, proxy.host.endswith(("1", "3")), 0.1)
+        
+        with patch.object(manager, '_probe_proxy', side_effect=fake_probe), \
+             patch.object(manager, '_update_proxies_status', new_callable=AsyncMock) as mock_update:
+            results = await manager.validate_proxies(sample_proxies, concurrency=2)
+        
+        assert [r.proxy for r in results] == sample_proxies
+        assert [r.is_valid for r in results] == [True, False, True, False, False]
+        mock_update.assert_awaited_once_with(sample_proxies)
+    
+    @pytest.mark.asyncio
+    async def test_validate_proxies_converts_exceptions(self, manager, sample_proxies):
+        """測試批量驗證 - 單個驗證異常不影響其他結果"""
+        async def fake_probe(proxy):
+            if proxy is sample_proxies[0]:
+                raise RuntimeError("boom")
+            return ProxyValidationResult(proxy, True, 0.1)
+        
+        with patch.object(manager, '_probe_proxy', side_effect=fake_probe), \
+             patch.object(manager, '_update_proxies_status', new_callable=AsyncMock):
+            results = await manager.validate_proxies(sample_proxies)
+        
+        assert results[0].is_valid is False
+        assert "boom" in results[0].error_message
+        assert sample_proxies[0].is_active is False
+        assert all(r.is_valid for r in results[1:])
+    
+    @pytest.mark.asyncio
+    async def test_add_proxy_ignores_duplicate_host_port(self, manager, db_manager):
+        """測試添加代理 - 重複的 host:port 由 ON CONFLICT 忽略並返回 False"""
+        assert await manager.add_proxy(ProxyInfo(host="10.0.0.1", port=8080)) is True
+        assert await manager.add_proxy(ProxyInfo(host="10.0.0.1", port=8080, source="dup")) is False
+        
+        rows = await db_manager.engine.fetch_all("SELECT host, port, source FROM proxy_servers")
+        assert [tuple(row.values()) for row in rows] == [("10.0.0.1", 8080, "unknown")]
+    @pytest.mark.asyncio
+    async def test_add_proxies_skips_batch_and_table_duplicates(self, manager, db_manager):
+        """測試批量添加代理 - 批次內重複只保留第一個，已存在的代理不計入新增數"""
+        await manager.add_proxy(ProxyInfo(host="10.0.0.3", port=8080))
+        
+        inserted = await manager.add_proxies([
+            ProxyInfo(host="10.0.0.1", port=8080),
+            ProxyInfo(host="10.0.0.2", port=8080),
+            ProxyInfo(host="10.0.0.1", port=8080, source="dup"),
+            ProxyInfo(host="10.0.0.3", port=8080, source="dup"),
+        ])
+        
+        assert inserted == 2
+        rows = await db_manager.engine.fetch_all("SELECT host, source FROM proxy_servers ORDER BY host")
+        assert [tuple(row.values()) for row in rows] == [
+            ("10.0.0.1", "unknown"), ("10.0.0.2", "unknown"), ("10.0.0.3", "unknown")
+        ]
+    @pytest.mark.asyncio
+    async def test_get_proxy_picks_matching_active_row(self, manager, db_manager):
+        """測試獲取代理 - 數據庫中加權隨機選取只返回匹配過濾條件的活動代理"""
+        await manager.add_proxies([
+            ProxyInfo(host="10.0.0.1", port=3128, protocol="socks5", country="US", anonymity="elite",
+                      speed=0.4, uptime=50.0),
+            ProxyInfo(host="10.0.0.2", port=3128, protocol="socks5", country="US", is_active=False),
+            ProxyInfo(host="10.0.0.3", port=3128, protocol="socks5", country="DE"),
+            ProxyInfo(host="10.0.0.4", port=3128, protocol="http", country="US"),
+        ])
+        
+        picks = [await manager.get_proxy("socks5", country="US") for _ in range(10)]
+        
+        assert {(p.host, p.port, p.protocol, p.country, p.anonymity, p.speed, p.uptime) for p in picks} == {
+            ("10.0.0.1", 3128, "socks5", "US", "elite", 0.4, 50.0)
+        }
+        assert picks[0].id is not None
+    @pytest.mark.asyncio
+    async def test_get_proxy_falls_back_to_uniform_pick(self, manager, db_manager, monkeypatch):
+        """測試獲取代理 - 加權查詢失敗（如SQLite未啟用數學函數）時退回均勻隨機"""
+        await manager.add_proxy(ProxyInfo(host="10.0.0.1", port=8080, uptime=50.0))
+        failing = {key: text("SELECT no_such_function()") for key in proxy_pool_module._SELECT_RANDOM_PROXY}
+        monkeypatch.setitem(proxy_pool_module._SELECT_WEIGHTED_PROXY, "sqlite", failing)
+        
+        proxy = await manager.get_proxy()
+        
+        assert (proxy.host, proxy.uptime) == ("10.0.0.1", 50.0)
+    @pytest.mark.asyncio
+    async def test_get_proxy_returns_none_when_empty(self, manager, db_manager):
+        """測試獲取代理 - 沒有匹配代理時返回 None"""
+        await manager.add_proxy(ProxyInfo(host="10.0.0.1", port=8080, is_active=False))
+        
+        assert await manager.get_proxy() is None
+    @pytest.mark.asyncio
+    async def test_get_active_proxies_caches_per_filter(self, manager):
+        """測試活動代理列表 - 按過濾條件緩存並在寫入後失效"""
+        manager._init_event.set()
+        http_proxies = [ProxyInfo(host="10.0.0.1", port=80, protocol="http")]
+        socks_proxies = [ProxyInfo(host="10.0.0.2", port=1080, protocol="socks5")]
+        
+        async def fake_query(protocol=None, country=None, anonymity=None):
+            return list(http_proxies if protocol == "http" else socks_proxies)
+        
+        with patch.object(manager, '_query_proxies', side_effect=fake_query) as mock_query:
+            first = await manager.get_active_proxies("http")
+            assert list(first) == http_proxies
+            assert list(await manager.get_active_proxies("socks5")) == socks_proxies
+            assert await manager.get_active_proxies("http") is first
+            assert mock_query.await_count == 2
+            
+            manager._clear_cache()
+            await manager.get_active_proxies("http")
+            assert mock_query.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_protocol_partition_serves_narrower_filters(self, manager):
+        """測試協議分區緩存 - 同協議的國家/匿名過濾不再訪問數據庫"""
+        manager._init_event.set()
+        http_proxies = [
+            ProxyInfo(host="10.0.0.1", port=80, protocol="http", country="US"),
+            ProxyInfo(host="10.0.0.2", port=80, protocol="http", country="DE", anonymity="elite"),
+        ]
+
+        with patch.object(manager, '_query_proxies', new_callable=AsyncMock) as mock_query:
+            mock_query.return_value = http_proxies
+            us = await manager.get_active_proxies("http", country="US")
+            elite = await manager.get_active_proxies("http", anonymity="elite")
+            partition = await manager.get_active_proxies("http")
+
+        mock_query.assert_awaited_once_with("http")
+        assert [p.host for p in us] == ["10.0.0.1"]
+        assert [p.host for p in elite] == ["10.0.0.2"]
+        assert list(partition) == http_proxies
+        assert manager._query_cache[("http", "US", None)][0] == manager._query_cache[("http", None, None)][0]
+
+    @pytest.mark.asyncio
+    async def test_query_proxies_returns_active_rows_sorted(self, manager, db_manager):
+        """測試查詢代理 - 只返回活動代理，按 uptime 降序排列並還原標籤"""
+        await manager.add_proxies([
+            ProxyInfo(host="10.0.0.1", port=80, uptime=10.0),
+            ProxyInfo(host="10.0.0.2", port=80, country="US", anonymity="elite", speed=0.5, uptime=90.0,
+                      source="test", tags={"fast", "custom-tag"}),
+            ProxyInfo(host="10.0.0.3", port=80, uptime=99.0, is_active=False),
+            ProxyInfo(host="10.0.0.4", port=1080, protocol="socks5", uptime=95.0),
+        ])
+        
+        proxies = await manager._query_proxies(protocol="http")
+        
+        assert [p.host for p in proxies] == ["10.0.0.2", "10.0.0.1"]
+        best = proxies[0]
+        assert (best.country, best.anonymity, best.speed, best.source, best.is_active) == (
+            "US", "elite", 0.5, "test", True
+        )
+        assert best.tags == {"fast", "custom-tag"}
+    @pytest.mark.asyncio
+    async def test_filtered_queries_served_from_snapshot(self, manager):
+        """測試活動代理列表 - 有全量快照時過濾與選取不訪問數據庫"""
+        manager._init_event.set()
+        manager._set_cached((None, None, None), ProxyTable([
+            ProxyInfo(host="10.0.0.1", port=80, protocol="http", country="US"),
+            ProxyInfo(host="10.0.0.2", port=1080, protocol="socks5", country="US"),
+        ]))
+        
+        with patch.object(manager, '_query_proxies', new_callable=AsyncMock) as mock_query, \
+             patch.object(manager, 'get_random_proxy', new_callable=AsyncMock) as mock_random:
+            socks = await manager.get_active_proxies("socks5", country="US")
+            proxy = await manager.get_proxy("http")
+            missing = await manager.get_proxy("https")
+        
+        assert [p.host for p in socks] == ["10.0.0.2"]
+        assert proxy.host == "10.0.0.1"
+        assert missing is None
+        mock_query.assert_not_awaited()
+        mock_random.assert_not_awaited()
+    
+    def test_query_cache_evicts_least_recently_used(self, manager):
+        """測試查詢緩存 - 超出容量時淘汰最久未使用的條目"""
+        manager._max_cache_entries = 2
+        manager._set_cached(("http", None, None), ProxyTable())
+        manager._set_cached(("https", None, None), ProxyTable())
+        manager._get_cached(("http", None, None))
+        manager._set_cached(("socks5", None, None), ProxyTable())
+        
+        assert list(manager._query_cache) == [("http", None, None), ("socks5", None, None)]
+    
+    @pytest.mark.asyncio
+    async def test_get_stats_from_single_query(self, manager, db_manager):
+        """測試統計信息 - 單次查詢的各統計項正確歸併"""
+        await manager.add_proxies([
+            ProxyInfo(host="10.0.0.1", port=80, country="US", speed=0.5),
+            ProxyInfo(host="10.0.0.2", port=80, country="US", speed=1.5),
+            ProxyInfo(host="10.0.0.3", port=1080, protocol="socks5", country="DE", speed=1.0),
+            ProxyInfo(host="10.0.0.4", port=80, country="FR", speed=9.0, is_active=False),
+        ])
+        
+        stats = await manager.get_stats()
+        
+        assert stats["total_proxies"] == 4
+        assert stats["inactive_proxies"] == 1
+        assert stats["availability_rate"] == 75.0
+        assert stats["protocol_distribution"] == {"http": 2, "socks5": 1}
+        assert list(stats["top_countries"].items()) == [("US", 2), ("DE", 1)]
+        assert stats["average_speed"] == 1.0
+    @pytest.mark.asyncio
+    async def test_bulk_import_sqlite_multi_row_inserts(self, manager, db_manager):
+        """測試批量導入 - SQLite 跨多個塊寫入，跳過已存在與批次內重複的代理"""
+        await manager.add_proxy(ProxyInfo(host="10.0.0.0", port=80, source="existing"))
+        proxies = [ProxyInfo(host=f"10.0.{i // 250}.{i % 250}", port=80) for i in range(600)]
+        proxies[1].tags = {"fast", "custom-tag"}
+        proxies.append(ProxyInfo(host="10.0.1.0", port=80, source="dup"))
+        
+        inserted = await manager.bulk_import(proxies)
+        
+        assert inserted == 599
+        count = await db_manager.engine.fetch_one("SELECT COUNT(*) AS n FROM proxy_servers")
+        assert count["n"] == 600
+        assert (await manager.get_proxy_by_host_port("10.0.0.0", 80)).source == "existing"
+        assert (await manager.get_proxy_by_host_port("10.0.1.0", 80)).source == "unknown"
+        assert (await manager.get_proxy_by_host_port("10.0.0.1", 80)).tags == {"fast", "custom-tag"}
+    @pytest.mark.asyncio
+    async def test_bulk_import_postgresql_copies_tags_as_json_text(self, manager, monkeypatch):
+        """測試批量導入 - PostgreSQL 的 COPY 記錄中標籤為JSON文本，已知標籤寫入位掩碼"""
+        session = AsyncMock()
+        session.execute.return_value = Mock(rowcount=2)
+        raw_connection = Mock()
+        raw_connection.driver_connection.copy_records_to_table = AsyncMock()
+        connection = Mock(get_raw_connection=AsyncMock(return_value=raw_connection))
+        session.connection = AsyncMock(return_value=connection)
+        manager.db_manager = make_db_manager(session)
+        manager._init_event.set()
+        monkeypatch.setattr(manager.config.database, "type", "postgresql")
+        
+        proxies = [
+            ProxyInfo(host="10.0.0.1", port=80, tags={"fast", "custom-b", "custom-a"}),
+            ProxyInfo(host="10.0.0.2", port=80),
+        ]
+        inserted = await manager.bulk_import(proxies)
+        
+        assert inserted == 2
+        copy = raw_connection.driver_connection.copy_records_to_table
+        copy.assert_awaited_once()
+        records = copy.await_args.kwargs["records"]
+        assert all(isinstance(record[-2], str) for record in records)
+        assert [(json.loads(record[-2]), record[-1]) for record in records] == [
+            (["custom-a", "custom-b"], tags_to_bits({"fast"})), ([], 0)
+        ]
+        session.commit.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_update_proxy_status_writes_validation_columns(self, manager, db_manager):
+        """測試更新代理狀態 - 只寫入驗證相關列，代理不存在時返回 False"""
+        await manager.add_proxy(ProxyInfo(host="10.0.0.1", port=8080, speed=1.0, uptime=80.0))
+        
+        checked = ProxyInfo(host="10.0.0.1", port=8080, speed=0.3, is_active=False, uptime=0.0,
+                            last_checked=datetime(2024, 1, 2, 3, 4, 5))
+        assert await manager.update_proxy_status(checked) is True
+        assert await manager.update_proxy_status(ProxyInfo(host="10.0.0.9", port=8080)) is False
+        
+        row = await db_manager.engine.fetch_one(
+            "SELECT is_active, speed, uptime, last_checked FROM proxy_servers WHERE host = '10.0.0.1'"
+        )
+        assert tuple(row.values()) == (0, 0.3, 80.0, "2024-01-02 03:04:05")
+    @pytest.mark.asyncio
+    async def test_update_proxy_status_accepts_list(self, manager, db_manager):
+        """測試更新代理狀態 - 列表參數以單次executemany批量更新"""
+        proxies = [ProxyInfo(host=f"10.0.0.{i}", port=8080) for i in range(1, 4)]
+        await manager.add_proxies(proxies)
+        for proxy in proxies[:2]:
+            proxy.is_active = False
+        
+        assert await manager.update_proxy_status(proxies) is True
+        
+        rows = await db_manager.engine.fetch_all("SELECT host, is_active FROM proxy_servers ORDER BY host")
+        assert [tuple(row.values()) for row in rows] == [("10.0.0.1", 0), ("10.0.0.2", 0), ("10.0.0.3", 1)]
+    def test_tags_split_between_bits_and_json(self, manager):
+        """測試已知標籤編碼為位掩碼，其餘標籤保留在JSON中"""
+        tags = {"elite", "fast", "custom-tag"}
+        params = manager._proxy_to_params(ProxyInfo(host="10.0.0.1", port=8080, tags=tags))
+
+        assert params["tags_bits"] == tags_to_bits(tags)
+        assert bits_to_tags(params["tags_bits"]) == {"elite", "fast"}
+
+        row = (1, "10.0.0.1", 8080, "http", None, None, None, "anonymous", None, 0.0,
+               None, True, None, None, None, params["tags"], params["tags_bits"])
+        assert manager._row_to_proxy(row).tags == tags
+
+    @pytest.mark.asyncio
+    async def test_sqlite_init_adds_tags_bits_only_when_missing(self, db_manager, caplog):
+        """測試SQLite建表 - 舊表補充 tags_bits 列，重複初始化不執行失敗的 ALTER"""
+        await db_manager.engine.execute("""
+            CREATE TABLE proxy_servers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, host TEXT NOT NULL, port INTEGER NOT NULL,
+                protocol TEXT DEFAULT 'http', country TEXT, region TEXT, city TEXT,
+                anonymity TEXT DEFAULT 'transparent', speed REAL, uptime REAL DEFAULT 0.0,
+                last_checked TIMESTAMP, is_active BOOLEAN DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                source TEXT DEFAULT 'unknown', tags TEXT DEFAULT '[]', UNIQUE(host, port)
+            )
+        """)
+        await db_manager.engine.execute("CREATE INDEX idx_proxy_tags_bits ON proxy_servers(host)")
+        
+        with caplog.at_level("ERROR"):
+            for _ in range(2):
+                await ProxyPoolManager()._ensure_init()
+        
+        assert caplog.records == []
+        columns = await db_manager.engine.fetch_all("SELECT name FROM pragma_table_info('proxy_servers')")
+        assert columns[-1]["name"] == "tags_bits"
+        indexes = await db_manager.engine.fetch_all("SELECT name FROM pragma_index_list('proxy_servers')")
+        assert "idx_proxy_tags_bits" not in {index["name"] for index in indexes}
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_initialize_once(self, manager):
+        """測試延遲初始化 - 並發調用只執行一次建表"""
+        async def slow_init():
+            await asyncio.sleep(0.01)
+        
+        with patch.object(manager, '_init_database', side_effect=slow_init) as mock_init:
+            await asyncio.gather(*(manager._ensure_init() for _ in range(5)))
+            await manager._ensure_init()
+        
+        assert mock_init.await_count == 1
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("status,expected", [(200, True), (405, False)])
+    async def test_probe_sends_single_head_request(self, manager, status, expected):
+        """測試代理探測 - 只向驗證端點發送一次HEAD請求"""
+        response = AsyncMock()
+        response.status = status
+        session = Mock()
+        session.head = Mock(return_value=response)
+        response.__aenter__.return_value = response
+
+        proxy = ProxyInfo(host="10.0.0.1", port=8080)
+        with patch.object(manager, '_get_http_session', new_callable=AsyncMock, return_value=session):
+            result = await manager._probe_proxy(proxy)
+
+        session.head.assert_called_once_with(manager._validation_url, proxy="http://10.0.0.1:8080")
+        assert result.is_valid is expected
+        assert proxy.is_active is expected
+
+    @pytest.mark.asyncio
+    async def test_http_session_is_reused(self, manager):
+        """測試HTTP會話在多次調用間復用"""
+        first = await manager._get_http_session()
+        second = await manager._get_http_session()
+        
+        assert first is second
+        
+        await manager.close()
+        assert manager._http_session is None
+
+
+class TestProxyTable:
+    """代理列式快照測試類"""
+    
+    @pytest.fixture
+    def proxies(self):
+        """樣本代理列表"""
+        return [
+            ProxyInfo(id=1, host="10.0.0.1", port=8080, protocol="http", country="US",
+                      speed=0.25, uptime=90.0, source="a", tags={"fast"}),
+            ProxyInfo(host="10.0.0.2", port=1080, protocol="socks5", speed=None, uptime=10.0),
+        ]
+    
+    def test_round_trip(self, proxies):
+        """測試列式存儲 - 按索引還原的代理與原始代理相等"""
+        table = ProxyTable(proxies)
+        
+        assert len(table) == 2
+        assert list(table) == proxies
+        assert table[-1] == proxies[1]
+        assert table[0:1] == proxies[:1]
+        with pytest.raises(IndexError):
+            table[2]
+    
+    def test_pick_random_respects_mask(self, proxies):
+        """測試隨機選取 - 只在掩碼選中的行中選取"""
+        table = ProxyTable(proxies)
+        mask = table.uptimes > 50
+        
+        assert all(table.pick_random(mask).host == "10.0.0.1" for _ in range(10))
+        assert table.pick_random(table.uptimes > 100) is None
+    
+    def test_mask_filters_by_encoded_columns(self, proxies):
+        """測試過濾掩碼 - 字典編碼列的向量化比較"""
+        table = ProxyTable(proxies)
+        
+        assert table.mask().tolist() == [True, True]
+        assert table.mask(protocol="socks5").tolist() == [False, True]
+        assert table.mask(protocol="http", country="US").tolist() == [True, False]
+        assert table.mask(country="DE").tolist() == [False, False]
+        assert list(table.take(table.mask(protocol="socks5"))) == proxies[1:]
+    
+    def test_pick_weighted_prefers_high_uptime(self, proxies):
+        """測試加權選取 - 高 uptime 的代理被選中的概率更高"""
+        table = ProxyTable(proxies)
+        picks = [table.pick_weighted().host for _ in range(200)]
+        
+        assert picks.count("10.0.0.1") > picks.count("10.0.0.2")
+    
+    def test_alias_table_matches_uptime_weights(self):
+        """測試別名表 - 抽樣分布與 uptime + 1 權重一致，且遵守過濾掩碼"""
+        table = ProxyTable(
+            ProxyInfo(host=f"10.0.0.{i}", port=8080, uptime=float(i * 10)) for i in range(5)
+        )
+        prob, alias = table._alias_table()
+        weights = table.uptimes + 1.0
+        
+        # 每行的總概率 = 自身列保留概率 + 作為其他列別名的概率
+        implied = prob.copy()
+        np.add.at(implied, alias, 1.0 - prob)
+        assert np.allclose(implied / len(table), weights / weights.sum())
+        
+        mask = np.array([True, False, False, False, False])
+        assert all(table.pick_weighted(mask).host == "10.0.0.0" for _ in range(10))
+    
+    def test_proxy_info_has_no_instance_dict(self):
+        """測試ProxyInfo使用 __slots__"""
+        assert not hasattr(ProxyInfo(), "__dict__")
@@ -0,0 +1,397 @@
+"""
+SQLite適配器單元測試
+"""
+
+import pytest
+import pytest_asyncio
+import asyncio
+import threading
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 添加項目根目錄到Python路徑
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.sqlite_adapter import (
+    AsyncSQLiteAdapter, DatabaseFactory, ProxyDatabase, TaskDatabase, _build_insert_sql, _build_update_sql
+)
+
+
+PROXIES_DDL = """
+CREATE TABLE IF NOT EXISTS proxies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ip TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    protocol TEXT NOT NULL,
+    country TEXT,
+    anonymity_level TEXT,
+    is_active BOOLEAN DEFAULT 1,
+    success_rate REAL DEFAULT 0.0,
+    response_time REAL,
+    last_checked TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+TASKS_DDL = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    task_type TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',
+    config BLOB,
+    result BLOB,
+    error_message TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    worker_id TEXT
+)
+"""
+
+
+@pytest_asyncio.fixture
+async def adapter(tmp_path):
+    """創建使用臨時數據庫的異步適配器"""
+    adapter = AsyncSQLiteAdapter(tmp_path / "test.db")
+    await adapter.execute(PROXIES_DDL)
+    await adapter.execute(TASKS_DDL)
+    yield adapter
+    await adapter.close()
+
+
+class TestAsyncSQLiteAdapter:
+    """異步SQLite適配器測試類"""
+
+    @pytest.mark.asyncio
+    async def test_operations_run_on_single_worker_thread(self, adapter):
+        """測試所有操作都在同一個工作線程中執行"""
+        threads = set()
+
+        def record_thread():
+            threads.add(threading.get_ident())
+
+        await asyncio.gather(*(adapter._submit(record_thread) for _ in range(20)))
+
+        assert len(threads) == 1
+        assert threading.get_ident() not in threads
+
+    @pytest.mark.asyncio
+    async def test_execute_returns_buffered_result(self, adapter):
+        """測試execute返回的結果可在事件循環線程中讀取"""
+        await adapter.executemany(
+            "INSERT INTO proxies (ip, port, protocol) VALUES (?, ?, ?)",
+            [("10.0.0.1", 80, "http"), ("10.0.0.2", 1080, "socks5")]
+        )
+
+        result = await adapter.execute("SELECT ip FROM proxies ORDER BY id")
+
+        assert result.fetchone()["ip"] == "10.0.0.1"
+        assert [row["ip"] for row in result] == ["10.0.0.2"]
+        assert result.fetchone() is None
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate_to_caller(self, adapter):
+        """測試工作線程中的異常傳回調用方"""
+        with pytest.raises(Exception):
+            await adapter.execute("SELECT * FROM missing_table")
+
+        # 異常後工作線程仍可繼續處理
+        assert await adapter.fetch_one("SELECT COUNT(*) AS count FROM proxies") == {"count": 0}
+
+    @pytest.mark.asyncio
+    async def test_close_stops_worker_and_reopens_on_demand(self, adapter):
+        """測試關閉後停止工作線程，再次使用時重新創建"""
+        await adapter.fetch_one("SELECT 1 AS one")
+        worker = adapter._worker
+
+        await adapter.close()
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+
+        assert await adapter.fetch_one("SELECT 1 AS one") == {"one": 1}
+
+    @pytest.mark.asyncio
+    async def test_insert_reuses_cached_sql_and_cursor(self, adapter):
+        """測試插入 - 相同列集合復用SQL文本和游標"""
+        _build_insert_sql.cache_clear()
+        first = await adapter.insert("proxies", {"ip": "10.0.0.1", "port": 80, "protocol": "http"})
+        cursor = adapter.sync_adapter._cursor
+        second = await adapter.insert("proxies", {"ip": "10.0.0.2", "port": 81, "protocol": "http"})
+
+        assert (first, second) == (1, 2)
+        assert adapter.sync_adapter._cursor is cursor
+        assert _build_insert_sql.cache_info().hits == 1
+
+    @pytest.mark.asyncio
+    async def test_rows_support_index_and_key_access(self, adapter):
+        """測試行對象 - 查詢結果同時支持按索引和按列名訪問，fetch_all 返回字典"""
+        await adapter.insert("proxies", {"ip": "10.0.0.1", "port": 80, "protocol": "http"})
+
+        row = (await adapter.execute("SELECT ip, port FROM proxies")).fetchone()
+        assert (row[0], row["port"]) == ("10.0.0.1", 80)
+
+        rows = await adapter.fetch_rows("SELECT ip FROM proxies")
+        assert rows[0]["ip"] == "10.0.0.1"
+
+        records = await adapter.fetch_all("SELECT ip, port FROM proxies")
+        assert records == [{"ip": "10.0.0.1", "port": 80}]
+
+    @pytest.mark.asyncio
+    async def test_create_proxies_bulk_single_transaction(self, adapter):
+        """測試批量創建代理 - 不同列集合分組插入，失敗時整批回滾"""
+        proxy_db = ProxyDatabase(adapter)
+        proxies = [
+            {"ip": "10.0.0.1", "port": 80, "protocol": "http"},
+            {"ip": "10.0.0.2", "port": 1080, "protocol": "socks5", "country": "US"},
+            {"ip": "10.0.0.3", "port": 81, "protocol": "http"},
+        ]
+
+        assert await proxy_db.create_proxies_bulk(proxies) == 3
+        rows = await adapter.fetch_all("SELECT created_at, updated_at FROM proxies")
+        assert all(row["created_at"] and row["updated_at"] for row in rows)
+
+        with pytest.raises(Exception):
+            await proxy_db.create_proxies_bulk([
+                {"ip": "10.0.0.4", "port": 82, "protocol": "http"},
+                {"ip": None, "port": 83, "protocol": "http"},
+            ])
+        assert (await proxy_db.get_proxy_stats())["total"] == 3
+
+    @pytest.mark.asyncio
+    async def test_upsert_proxies_bulk_updates_existing_and_inserts_new(self, adapter):
+        """測試按 (ip, port) 批量寫入 - 已存在的行只更新非空列，驗證狀態保留，新行插入"""
+        proxy_db = ProxyDatabase(adapter)
+        await proxy_db.create_proxy({"ip": "10.0.0.1", "port": 80, "protocol": "http", "country": "US",
+                                     "success_rate": 0.9})
+        assert len(await proxy_db.get_active_proxies()) == 1
+
+        written = await proxy_db.upsert_proxies_bulk([
+            ("10.0.0.1", 80, "https", None, "elite"),
+            ("10.0.0.2", 81, "socks5", "DE", None),
+        ])
+
+        assert written == 2
+        rows = await adapter.fetch_all(
+            "SELECT ip, protocol, country, anonymity_level, success_rate FROM proxies ORDER BY ip"
+        )
+        assert [tuple(row.values()) for row in rows] == [
+            ("10.0.0.1", "https", "US", "elite", 0.9), ("10.0.0.2", "socks5", "DE", None, 0.0)
+        ]
+        assert len(await proxy_db.get_active_proxies()) == 2
+        assert await proxy_db.upsert_proxies_bulk([]) == 0
+
+    @pytest.mark.asyncio
+    async def test_update_status_stamps_time_in_sql(self, adapter):
+        """測試狀態更新 - updated_at 由SQL表達式生成，Python值與SQL表達式可混用"""
+        proxy_db = ProxyDatabase(adapter)
+        proxy_id = await proxy_db.create_proxy({"ip": "10.0.0.1", "port": 80, "protocol": "http"})
+        await adapter.execute("UPDATE proxies SET updated_at = NULL WHERE id = ?", (proxy_id,))
+
+        assert await proxy_db.update_proxy_status(proxy_id, False, response_time=1.5) == 1
+
+        row = await proxy_db.get_proxy_by_id(proxy_id)
+        assert (row["is_active"], row["response_time"]) == (0, 1.5)
+        assert row["updated_at"] is not None
+
+    @pytest.mark.asyncio
+    async def test_tasks_json_decoded_or_projected(self, adapter):
+        """測試任務JSON字段 - 完整查詢反序列化，投影查詢由json_extract取值"""
+        task_db = TaskDatabase(adapter)
+        await task_db.create_task({
+            "name": "validate", "task_type": "proxy_validation",
+            "config": {"timeout": 30, "retry": {"count": 3}}
+        })
+
+        tasks = await task_db.get_tasks_by_status("pending")
+        assert tasks[0]["config"] == {"timeout": 30, "retry": {"count": 3}}
+
+        projected = await task_db.get_tasks_by_status_projected(
+            "pending", {"timeout": "$.timeout", "retries": "$.retry.count"}
+        )
+        assert (projected[0]["timeout"], projected[0]["retries"]) == (30, 3)
+
+        with pytest.raises(ValueError):
+            await task_db.get_tasks_by_status_projected("pending", {"bad alias": "$.timeout"})
+
+    @pytest.mark.asyncio
+    async def test_task_json_stored_as_blob_and_legacy_text_decoded(self, adapter):
+        """測試任務JSON以BLOB存儲，舊版以TEXT存儲的值仍可讀取"""
+        task_db = TaskDatabase(adapter)
+        task_id = await task_db.create_task({
+            "name": "crawl", "task_type": "proxy_crawl", "config": {"pages": 2}
+        })
+        await task_db.update_task_status(task_id, "completed", result={"found": 7})
+        await adapter.insert("tasks", {
+            "name": "legacy", "task_type": "proxy_crawl", "config": '{"pages": 1}'
+        })
+
+        stored = await adapter.fetch_one(
+            "SELECT typeof(config) AS config_type, typeof(result) AS result_type FROM tasks WHERE id = ?",
+            (task_id,)
+        )
+        assert (stored["config_type"], stored["result_type"]) == ("blob", "blob")
+
+        task = await task_db.get_task_by_id(task_id)
+        assert (task["config"], task["result"]) == ({"pages": 2}, {"found": 7})
+        legacy = await task_db.get_tasks_by_status("pending")
+        assert legacy[0]["config"] == {"pages": 1}
+
+    @pytest.mark.asyncio
+    async def test_update_task_status_bulk(self, adapter):
+        """測試批量更新任務狀態 - 空結果/錯誤不覆蓋原值，開始/完成時間按傳入值寫入，並使緩存失效"""
+        task_db = TaskDatabase(adapter)
+        running = await task_db.create_task({"name": "a", "task_type": "proxy_crawl"})
+        done = await task_db.create_task({"name": "b", "task_type": "proxy_crawl"})
+        await task_db.update_task_status(done, "failed", error_message="old")
+        assert (await task_db.get_task_by_id(running))["status"] == "pending"
+        started = datetime(2024, 5, 6, 7, 8, 9)
+        completed = datetime(2024, 5, 6, 7, 8, 10)
+
+        updated = await task_db.update_task_status_bulk([
+            ("running", None, None, started, None, running),
+            ("completed", {"found": 3}, None, started, completed, done),
+        ])
+
+        assert updated == 2
+        first = await task_db.get_task_by_id(running)
+        second = await task_db.get_task_by_id(done)
+        assert (first["status"], first["started_at"], first["completed_at"]) == ("running", "2024-05-06 07:08:09", None)
+        assert (second["status"], second["result"], second["error_message"]) == ("completed", {"found": 3}, "old")
+        assert second["completed_at"] == "2024-05-06 07:08:10"
+
+        await task_db.update_task_status_bulk([("pending", None, None, None, None, done)])
+        assert (await task_db.get_task_by_id(done))["started_at"] is None
+        assert await task_db.update_task_status_bulk([]) == 0
+
+    @pytest.mark.asyncio
+    async def test_proxy_lookup_cached_until_write(self, adapter):
+        """測試按ID查詢緩存 - 重複查詢不訪問數據庫，更新後失效"""
+        proxy_db = ProxyDatabase(adapter)
+        proxy_id = await proxy_db.create_proxy({"ip": "10.0.0.1", "port": 80, "protocol": "http"})
+
+        first = await proxy_db.get_proxy_by_id(proxy_id)
+        first["ip"] = "mutated"
+        await adapter.execute("UPDATE proxies SET port = 81 WHERE id = ?", (proxy_id,))
+
+        # 繞過本類的寫入不會使緩存失效；返回值是副本，修改不影響緩存
+        cached = await proxy_db.get_proxy_by_id(proxy_id)
+        assert (cached["ip"], cached["port"]) == ("10.0.0.1", 80)
+
+        await proxy_db.update_proxy_status(proxy_id, False)
+        refreshed = await proxy_db.get_proxy_by_id(proxy_id)
+        assert (refreshed["port"], refreshed["is_active"]) == (81, 0)
+        assert await proxy_db.get_active_proxies() == []
+
+    @pytest.mark.asyncio
+    async def test_update_sql_built_once_per_column_set(self, adapter):
+        """測試更新語句 - 相同列集合的重複更新復用緩存的SQL"""
+        proxy_db = ProxyDatabase(adapter)
+        proxy_id = await proxy_db.create_proxy({"ip": "10.0.0.1", "port": 80, "protocol": "http"})
+        _build_update_sql.cache_clear()
+
+        for rate in (0.5, 0.6, 0.7):
+            await proxy_db.update_proxy_status(proxy_id, True, success_rate=rate)
+
+        assert _build_update_sql.cache_info().misses == 1
+        assert (await proxy_db.get_proxy_by_id(proxy_id))["success_rate"] == 0.7
+
+    @pytest.mark.asyncio
+    async def test_bulk_insert_triggers_analyze(self, adapter):
+        """測試大批量寫入後自動 ANALYZE"""
+        proxy_db = ProxyDatabase(adapter)
+
+        await proxy_db.create_proxies_bulk(
+            [{"ip": f"10.0.{i // 256}.{i % 256}", "port": 80, "protocol": "http"} for i in range(600)]
+        )
+
+        stats = await adapter.fetch_all("SELECT tbl FROM sqlite_stat1 WHERE tbl = 'proxies'")
+        assert stats
+        assert await proxy_db.maybe_analyze() is False
+
+    @pytest.mark.asyncio
+    async def test_update_proxy_status_bulk(self, adapter):
+        """測試批量寫回驗證結果 - 布爾值以整數存儲，並使緩存失效"""
+        proxy_db = ProxyDatabase(adapter)
+        await proxy_db.create_proxies_bulk([
+            {"ip": "10.0.0.1", "port": 80, "protocol": "http", "is_active": True},
+            {"ip": "10.0.0.2", "port": 81, "protocol": "http", "is_active": True},
+        ])
+        assert len(await proxy_db.get_active_proxies()) == 2
+
+        updated = await proxy_db.update_proxy_status_bulk([(False, 0.1, 3.0, 1), (True, 0.9, 0.2, 2)])
+
+        assert updated == 2
+        rows = await adapter.fetch_all("SELECT id, is_active, typeof(is_active) AS t FROM proxies ORDER BY id")
+        assert [(row["is_active"], row["t"]) for row in rows] == [(0, "integer"), (1, "integer")]
+        assert [p["id"] for p in await proxy_db.get_active_proxies()] == [2]
+
+    @pytest.mark.asyncio
+    async def test_transaction_commits_once_or_rolls_back(self, adapter):
+        """測試顯式事務 - 塊內寫入一起提交，異常時整體回滾；只讀查詢不提交"""
+        def two_inserts(cursor):
+            cursor.execute("INSERT INTO proxies (ip, port, protocol) VALUES ('10.0.0.1', 80, 'http')")
+            adapter.sync_adapter.execute("INSERT INTO proxies (ip, port, protocol) VALUES ('10.0.0.2', 80, 'http')")
+            assert adapter.sync_adapter.get_connection().in_transaction
+            return cursor.lastrowid
+
+        await adapter.run_in_transaction(two_inserts)
+
+        def failing(cursor):
+            cursor.execute("INSERT INTO proxies (ip, port, protocol) VALUES ('10.0.0.3', 80, 'http')")
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await adapter.run_in_transaction(failing)
+
+        assert (await adapter.fetch_one("SELECT COUNT(*) AS count FROM proxies"))["count"] == 2
+        in_transaction = await adapter._submit(lambda: adapter.sync_adapter.get_connection().in_transaction)
+        assert in_transaction is False
+
+    @pytest.mark.asyncio
+    async def test_stats_derived_from_grouped_counts(self, adapter):
+        """測試統計信息 - 總數與活躍數由按協議/狀態分組的結果匯總，空表返回0"""
+        proxy_db = ProxyDatabase(adapter)
+        task_db = TaskDatabase(adapter)
+        assert await proxy_db.get_proxy_stats() == {"total": 0, "active": 0, "by_protocol": {}}
+
+        await proxy_db.create_proxies_bulk([
+            {"ip": "10.0.0.1", "port": 80, "protocol": "http", "is_active": True},
+            {"ip": "10.0.0.2", "port": 80, "protocol": "http", "is_active": False},
+            {"ip": "10.0.0.3", "port": 1080, "protocol": "socks5", "is_active": True},
+        ])
+        await task_db.create_task({"name": "a", "task_type": "crawl"})
+        await task_db.create_task({"name": "b", "task_type": "crawl", "status": "running"})
+
+        assert await proxy_db.get_proxy_stats() == {
+            "total": 3, "active": 2, "by_protocol": {"http": 2, "socks5": 1}
+        }
+        assert await task_db.get_task_stats() == {
+            "total": 2, "by_status": {"pending": 1, "running": 1}
+        }
+
+
+class TestDatabaseFactory:
+    """數據庫工廠測試類"""
+
+    @pytest.mark.asyncio
+    async def test_create_adapter_shares_instance_per_path(self, tmp_path, monkeypatch):
+        """測試同一數據庫路徑的不同URL寫法返回同一適配器，PostgreSQL返回None"""
+        monkeypatch.setattr(DatabaseFactory, "_adapters", {})
+        monkeypatch.chdir(tmp_path)
+
+        first = DatabaseFactory.create_adapter("sqlite:///./shared.db")
+        second = DatabaseFactory.create_adapter("sqlite:///shared.db")
+        other = DatabaseFactory.create_adapter("sqlite:///other.db")
+
+        assert first is second
+        assert other is not first
+        assert DatabaseFactory.create_adapter("postgresql+asyncpg://user@localhost/db") is None
+
+        await first.close()
+        await other.close()
@@ -0,0 +1,142 @@
+"""
+SQLite管理器單元測試
+"""
+
+import pytest
+import gc
+import importlib
+import threading
+import sys
+import weakref
+from pathlib import Path
+from unittest.mock import Mock
+
+# 添加項目根目錄到Python路徑
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+@pytest.fixture
+def sqlite_config(tmp_path, monkeypatch):
+    """在臨時數據庫路徑下導入 sqlite_config 模塊（避免模塊級管理器寫入項目數據庫）"""
+    monkeypatch.setenv("SQLITE_DATABASE_URL", str(tmp_path / "module.db"))
+    return importlib.import_module("app.core.sqlite_config")
+
+
+@pytest.fixture
+def manager(sqlite_config, tmp_path, monkeypatch):
+    """創建使用臨時數據庫的SQLite管理器"""
+    monkeypatch.setenv("SQLITE_DATABASE_URL", str(tmp_path / "test.db"))
+    manager = sqlite_config.SQLiteManager(sqlite_config.SQLiteConfig())
+    manager.execute_update("CREATE TABLE proxies (id INTEGER PRIMARY KEY, ip TEXT, is_active INTEGER)")
+    yield manager
+    manager.close_all()
+
+
+class TestSQLiteManager:
+    """SQLite管理器測試類"""
+
+    def test_connection_reused_within_thread(self, manager):
+        """測試同一線程內復用連接，不同線程使用各自的連接"""
+        with manager.get_connection() as first:
+            pass
+        with manager.get_connection() as second:
+            pass
+
+        other = []
+
+        def worker():
+            with manager.get_connection() as conn:
+                other.append(conn)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+        assert first is second
+        assert other[0] is not first
+
+    def test_close_all_closes_thread_connections(self, manager):
+        """測試close_all關閉連接，之後再次使用時重新打開"""
+        with manager.get_connection() as conn:
+            pass
+
+        manager.close_all()
+
+        with pytest.raises(Exception):
+            conn.execute("SELECT 1")
+        assert manager.execute_query("SELECT COUNT(*) AS count FROM proxies") == [{"count": 0}]
+
+    def test_get_table_info_binds_table_name_and_caches(self, manager):
+        """測試表信息 - 表名作為綁定參數查詢，結果被緩存"""
+        info = manager.get_table_info("proxies")
+
+        assert info["column_count"] == 3
+        assert [col["name"] for col in info["columns"]] == ["id", "ip", "is_active"]
+        assert "proxies" in manager._table_info_cache
+
+        info["columns"].clear()
+        assert manager.get_table_info("proxies")["column_count"] == 3
+        assert manager.get_table_info("missing")["column_count"] == 0
+        assert "missing" not in manager._table_info_cache
+
+    def test_database_stats_counts_all_tables(self, manager):
+        """測試數據庫統計 - 單條查詢統計所有表（含需要引用的表名）"""
+        manager.execute_update('CREATE TABLE "odd name" (x INTEGER)')
+        manager.execute_many("INSERT INTO proxies (ip, is_active) VALUES (?, ?)", [("a", 1), ("b", 0)])
+
+        stats = manager.get_database_stats()
+
+        assert stats["proxies"] == 2
+        assert stats["odd name"] == 0
+        assert "sqlite_version" in stats
+
+    def test_maintain_database_reclaims_pages_incrementally(self, manager):
+        """測試增量維護 - 新數據庫使用增量自動清理，刪除後可分批回收空閒頁"""
+        with manager.get_connection() as conn:
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+        manager.execute_many(
+            "INSERT INTO proxies (ip, is_active) VALUES (?, ?)", [("x" * 500, 1) for _ in range(200)]
+        )
+        manager.execute_update("DELETE FROM proxies")
+
+        result = manager.maintain_database(pages=1000)
+
+        assert result["freelist_pages"] == 0
+        assert result["wal_busy"] is False
+
+    def test_schema_script_skipped_when_version_matches(self, sqlite_config, tmp_path, monkeypatch):
+        """測試架構初始化 - 首次執行腳本並記錄版本，之後版本一致時跳過"""
+        schema = tmp_path / "schema.sql"
+        schema.write_text("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY);", encoding="utf-8")
+        monkeypatch.setattr(sqlite_config, "SCHEMA_PATH", schema)
+        monkeypatch.setenv("SQLITE_DATABASE_URL", str(tmp_path / "schema.db"))
+
+        first = sqlite_config.SQLiteManager(sqlite_config.SQLiteConfig())
+        with first.get_connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == sqlite_config.SCHEMA_VERSION
+        first.close_all()
+
+        monkeypatch.setattr(sqlite_config, "_load_schema_sql", Mock(side_effect=AssertionError))
+        second = sqlite_config.SQLiteManager(sqlite_config.SQLiteConfig())
+        assert second.get_table_info("items")["column_count"] == 1
+        second.close_all()
+
+    def test_replaced_manager_released_and_exit_hook_closes_current(self, sqlite_config, tmp_path, monkeypatch):
+        """測試重新初始化後舊管理器可被回收，退出鉤子關閉當前管理器的連接"""
+        monkeypatch.setattr(sqlite_config, "sqlite_manager", sqlite_config.sqlite_manager)
+        monkeypatch.setenv("SQLITE_DATABASE_URL", str(tmp_path / "init.db"))
+        sqlite_config.init_sqlite_database()
+        replaced = weakref.ref(sqlite_config.sqlite_manager)
+
+        sqlite_config.init_sqlite_database()
+        gc.collect()
+        with sqlite_config.get_sqlite_manager().get_connection() as conn:
+            pass
+        sqlite_config._close_sqlite_manager()
+
+        assert replaced() is None
+        with pytest.raises(Exception):
+            conn.execute("SELECT 1")
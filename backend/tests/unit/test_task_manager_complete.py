@@ -0,0 +1,283 @@
+"""
+完整任務管理器單元測試
+"""
+
+import pytest
+import asyncio
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+# 添加項目根目錄到Python路徑
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.database_schema import SQLITE_SCHEMA
+from app.core.task_manager_complete import Task, TaskConfig, TaskManager, TaskQueue, TaskStatus, TaskType
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """創建使用臨時數據庫的任務管理器"""
+    db_path = tmp_path / "tasks.db"
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SQLITE_SCHEMA)
+    conn.close()
+
+    manager = TaskManager(worker_count=2, db_path=str(db_path))
+    yield manager
+    manager.close()
+
+
+def make_task(name, priority):
+    """構建未入庫的任務對象"""
+    now = datetime.now()
+    return Task(
+        id=name, name=name, task_type=TaskType.PROXY_SCRAPING, status=TaskStatus.PENDING,
+        config=TaskConfig(priority=priority), created_at=now, updated_at=now
+    )
+
+
+class TestTaskQueue:
+    """任務隊列測試類"""
+
+    @pytest.mark.asyncio
+    async def test_priority_order_with_fifo_ties(self):
+        """測試按優先級出隊，同優先級按入隊順序"""
+        queue = TaskQueue()
+        for name, priority in [("low", 5), ("first", 1), ("second", 1), ("mid", 3)]:
+            assert await queue.put(make_task(name, priority))
+
+        names = [(await queue.get()).name for _ in range(4)]
+
+        assert names == ["first", "second", "mid", "low"]
+        assert queue.get_stats() == {"queue_size": 0}
+
+    @pytest.mark.asyncio
+    async def test_get_waits_for_put_and_full_queue_rejects(self):
+        """測試空隊列上的消費者在入隊時被喚醒，隊列已滿時拒絕入隊"""
+        queue = TaskQueue(max_size=1)
+        waiter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        assert await queue.put(make_task("only", 1))
+        assert (await asyncio.wait_for(waiter, timeout=1)).name == "only"
+
+        assert await queue.put(make_task("a", 1))
+        assert await queue.put(make_task("b", 1)) is False
+
+
+class TestTask:
+    """任務數據類測試類"""
+
+    def test_config_json_serialized_once(self):
+        """測試配置JSON只序列化一次，重置緩存後重新序列化"""
+        task = make_task("cached", 2)
+
+        first = task.config_json
+        task.config.priority = 7
+        assert task.config_json is first
+        assert '"priority":2' in first
+
+        task._config_json = None
+        assert '"priority":7' in task.config_json
+
+    def test_slotted_dataclasses(self):
+        """測試任務與配置使用槽位，不帶實例字典"""
+        task = make_task("slots", 1)
+
+        assert not hasattr(task, "__dict__")
+        assert not hasattr(task.config, "__dict__")
+        with pytest.raises(AttributeError):
+            task.unexpected = 1
+        assert '"priority":1' in task.config_json
+
+
+    def test_db_row_precasts_datetimes(self):
+        """測試數據庫行按更新語句順序返回，日期時間已轉為文本"""
+        task = make_task("row", 1)
+        task.started_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+
+        row = task.to_db_row()
+
+        assert row[0] == "pending"
+        assert row[6] == "2024-05-06 07:08:09.123456"
+        assert row[7] is None
+        assert isinstance(row[8], str)
+        assert row[-1] == "row"
+
+
+
+class TestTaskManagerDatabase:
+    """任務管理器數據庫操作測試類"""
+
+    @pytest.mark.asyncio
+    async def test_single_wal_connection_reused(self, manager):
+        """測試所有數據庫操作復用同一個WAL模式連接"""
+        task_id = await manager.create_task("crawl", TaskType.PROXY_SCRAPING, TaskConfig(priority=3))
+        conn = manager._conn
+
+        task = await manager.get_task(task_id)
+        task.status = TaskStatus.COMPLETED
+        await manager.update_task_in_db(task)
+
+        assert manager._conn is conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert (await manager.get_task(task_id)).status == TaskStatus.COMPLETED
+        assert [t.id for t in await manager.get_tasks(TaskStatus.COMPLETED)] == [task_id]
+        assert (await manager.get_task(task_id)).config.priority == 3
+
+    @pytest.mark.asyncio
+    async def test_database_calls_run_on_dedicated_thread(self, manager):
+        """測試數據庫操作在專用線程中執行，不在事件循環線程中"""
+        threads = []
+        get_connection = manager._get_connection
+
+        def recording_get_connection():
+            threads.append(threading.current_thread())
+            return get_connection()
+
+        manager._get_connection = recording_get_connection
+        task_id = await manager.create_task("validate", TaskType.PROXY_VALIDATION)
+        task = await manager.get_task(task_id)
+        await manager.update_task_in_db(task)
+        await manager.flush_updates()
+
+        assert len(threads) == 3
+        assert len(set(threads)) == 1
+        assert threads[0] is not threading.current_thread()
+        assert threads[0].name.startswith("db")
+
+    @pytest.mark.asyncio
+    async def test_updates_coalesced_into_one_batch(self, manager):
+        """測試任務更新按任務合併，在一個事務中批量寫入，讀取前先寫出"""
+        first = await manager.get_task(await manager.create_task("a", TaskType.PROXY_CLEANUP))
+        second = await manager.get_task(await manager.create_task("b", TaskType.DATA_EXPORT))
+        batches = []
+        execute_batch = manager._execute_batch_sync
+
+        def recording_batch(sql, params_list):
+            batches.append(len(params_list))
+            execute_batch(sql, params_list)
+
+        manager._execute_batch_sync = recording_batch
+        first.status = TaskStatus.RUNNING
+        await manager.update_task_in_db(first)
+        first.status = TaskStatus.COMPLETED
+        await manager.update_task_in_db(first)
+        second.status = TaskStatus.FAILED
+        await manager.update_task_in_db(second)
+
+        assert (await manager.get_task(first.id)).status == TaskStatus.COMPLETED
+        assert (await manager.get_task(second.id)).status == TaskStatus.FAILED
+        assert batches == [2]
+
+    @pytest.mark.asyncio
+    async def test_background_flush_writes_pending_updates(self, manager):
+        """測試後台任務在刷新間隔後寫出更新並退出"""
+        task = await manager.get_task(await manager.create_task("a", TaskType.PROXY_CLEANUP))
+        task.status = TaskStatus.CANCELLED
+        await manager.update_task_in_db(task)
+
+        await manager._flush_task
+
+        assert manager._pending_updates == {}
+        row = manager._conn.execute("SELECT status FROM tasks WHERE id = ?", (task.id,)).fetchone()
+        assert row[0] == "cancelled"
+
+    @pytest.mark.asyncio
+    async def test_rows_mapped_by_column_name_with_enum_fallbacks(self, manager):
+        """測試按列名讀取任務，未知的類型和狀態回退到默認值"""
+        task_id = await manager.create_task("export", TaskType.DATA_EXPORT, TaskConfig(tags=["x"]))
+        manager._conn.execute(
+            "INSERT INTO tasks (id, name, task_type, status, retry_count) VALUES ('legacy', 'old', 'unknown', 'archived', 2)"
+        )
+
+        task = await manager.get_task(task_id)
+        legacy = await manager.get_task("legacy")
+
+        assert (task.task_type, task.status, task.config.tags) == (TaskType.DATA_EXPORT, TaskStatus.PENDING, ["x"])
+        assert (legacy.task_type, legacy.status, legacy.retry_count) == (
+            TaskType.PROXY_SCRAPING, TaskStatus.PENDING, 2
+        )
+
+
+class TestTaskWorker:
+    """任務工作器測試類"""
+
+    @pytest.mark.asyncio
+    async def test_idle_worker_picks_up_task_immediately_and_stops(self, manager):
+        """測試空閒工作器在任務入隊後立即執行，停止時取消等待"""
+        executed = asyncio.Event()
+
+        async def executor(task):
+            executed.set()
+            return {"ok": True}
+
+        manager.executors[TaskType.PROXY_CLEANUP] = executor
+        worker = manager.workers[0]
+        runner = asyncio.create_task(worker.start())
+        await asyncio.sleep(0)
+
+        await manager.create_task("cleanup", TaskType.PROXY_CLEANUP)
+        await asyncio.wait_for(executed.wait(), timeout=0.5)
+        while worker.current_task is not None:
+            await asyncio.sleep(0)
+
+        worker.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(runner, timeout=1)
+        assert worker.is_running is False
+        assert worker.task_count == 1
+
+    @pytest.mark.asyncio
+    async def test_stop_returns_soon_after_running_task_finishes(self, manager):
+        """測試停止時等待執行中的任務，任務結束後很快返回；完成與更新時間一致"""
+        started = asyncio.Event()
+
+        async def executor(task):
+            started.set()
+            await asyncio.sleep(0.1)
+            return {"ok": True}
+
+        manager.executors[TaskType.DATA_EXPORT] = executor
+        manager.is_running = True
+        worker = manager.workers[0]
+        runner = asyncio.create_task(worker.start())
+        task_id = await manager.create_task("export", TaskType.DATA_EXPORT)
+        await asyncio.wait_for(started.wait(), timeout=1)
+
+        loop = asyncio.get_running_loop()
+        begin = loop.time()
+        await manager.stop()
+        await asyncio.wait_for(runner, timeout=1)
+
+        assert loop.time() - begin < 0.5
+        task = await manager.get_task(task_id)
+        assert task.status == TaskStatus.COMPLETED
+        assert task.completed_at == task.updated_at
+
+    @pytest.mark.asyncio
+    async def test_wait_until_idle_after_queue_drained(self, manager):
+        """測試隊列清空且工作器空閒後 wait_until_idle 返回"""
+        async def executor(task):
+            await asyncio.sleep(0.01)
+            return {"ok": True}
+
+        manager.executors[TaskType.PROXY_VALIDATION] = executor
+        assert manager._idle_event.is_set()
+
+        task_ids = [await manager.create_task(f"v{i}", TaskType.PROXY_VALIDATION) for i in range(3)]
+        assert not manager._idle_event.is_set()
+
+        manager.is_running = True
+        runners = [asyncio.create_task(worker.start()) for worker in manager.workers]
+        await asyncio.wait_for(manager.wait_until_idle(), timeout=2)
+
+        assert [(await manager.get_task(task_id)).status for task_id in task_ids] == [TaskStatus.COMPLETED] * 3
+        await manager.stop()
+        await asyncio.wait(runners, timeout=1)
+        assert all(runner.done() for runner in runners)
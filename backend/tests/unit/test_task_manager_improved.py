@@ -0,0 +1,569 @@
+"""
+改進的任務管理器單元測試
+"""
+
+import pytest
+import pytest_asyncio
+import asyncio
+import sqlite3
+import sys
+from dataclasses import asdict, replace
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+# 添加項目根目錄到Python路徑
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core import task_manager_improved
+from app.core.database_schema import SQLITE_SCHEMA
+from app.core.sqlite_adapter import AsyncSQLiteAdapter, TaskDatabase
+from app.core.task_manager_improved import Task, TaskConfig, TaskManager, TaskQueue, TaskStatus, TaskType
+
+
+@pytest_asyncio.fixture
+async def manager(tmp_path):
+    """創建經 TaskDatabase 讀寫臨時SQLite數據庫的任務管理器（工作器未啟動）"""
+    db_path = tmp_path / "tasks.db"
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SQLITE_SCHEMA)
+    conn.close()
+
+    adapter = AsyncSQLiteAdapter(db_path)
+    manager = TaskManager(worker_count=2)
+    manager.db_manager = Mock(settings=Mock(is_sqlite=True), task_db=TaskDatabase(adapter))
+    yield manager
+    if manager._flush_task is not None:
+        manager._flush_task.cancel()
+    await adapter.close()
+
+
+def make_task(name, priority=1):
+    """構建未入庫、未綁定執行器的任務對象"""
+    now = datetime.now()
+    return Task(
+        id=name, name=name, task_type=TaskType.PROXY_SCRAPING, status=TaskStatus.PENDING,
+        config=TaskConfig(priority=priority), created_at=now, updated_at=now
+    )
+
+
+class TestTaskQueue:
+    """任務隊列測試類"""
+
+    @pytest.mark.asyncio
+    async def test_higher_priority_first_with_fifo_ties(self):
+        """測試數字越大越先出隊，同優先級按入隊順序"""
+        queue = TaskQueue()
+        for name, priority in [("low", 1), ("first", 9), ("second", 9), ("mid", 5)]:
+            assert await queue.put(make_task(name, priority))
+
+        assert sorted(queue.get_queue_stats()["priorities"]) == [1, 5, 9, 9]
+        assert queue._heap[0][:2] == (1, 1)
+
+        names = [(await queue.get()).name for _ in range(4)]
+
+        assert names == ["first", "second", "mid", "low"]
+        assert queue.qsize() == 0
+
+    @pytest.mark.asyncio
+    async def test_waiting_consumers_woken_in_order(self):
+        """測試等待中的消費者按先來先到被喚醒，超時返回None"""
+        queue = TaskQueue()
+        first = asyncio.create_task(queue.get())
+        second = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+
+        await queue.put(make_task("a"))
+        await queue.put(make_task("b"))
+
+        assert (await first).name == "a"
+        assert (await second).name == "b"
+        assert await queue.get(timeout=0.01) is None
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_passes_wakeup_on(self):
+        """測試被喚醒後取消的消費者把任務留給下一個消費者；隊列已滿時拒絕入隊"""
+        queue = TaskQueue(max_size=1)
+        cancelled = asyncio.create_task(queue.get())
+        other = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+
+        await queue.put(make_task("only"))
+        cancelled.cancel()
+
+        assert (await asyncio.wait_for(other, timeout=1)).name == "only"
+        assert cancelled.cancelled()
+        assert await queue.put(make_task("a"))
+        assert await queue.put(make_task("b")) is False
+
+    @pytest.mark.asyncio
+    async def test_put_many_heapifies_wakes_waiters_and_rejects_overflow(self):
+        """測試批量入隊保持優先級順序，喚醒等待中的消費者，超出容量的任務被拒絕"""
+        queue = TaskQueue(max_size=3)
+        waiter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+
+        accepted = await queue.put_many([make_task("low", 1), make_task("high", 9), make_task("mid", 5),
+                                         make_task("extra", 10)])
+
+        assert accepted == 3
+        assert (await asyncio.wait_for(waiter, timeout=1)).name == "high"
+        assert [(await queue.get()).name for _ in range(2)] == ["mid", "low"]
+
+
+class TestTask:
+    """任務數據類測試類（槽位與配置緩存的通用檢查見 test_task_manager_complete.py）"""
+
+    def test_bound_executor_excluded_from_comparison_and_repr(self):
+        """測試附加字段：執行器與執行耗時默認為空，綁定的執行器不參與比較和repr，也不會被複製"""
+        task = make_task("bound")
+        assert (task._executor, task.execution_time) == (None, None)
+
+        task._executor = AsyncMock()
+        copy = replace(task)
+
+        assert copy == task
+        assert copy._executor is None
+        assert "_executor" not in repr(task)
+        assert not hasattr(task, "__dict__")
+
+    @pytest.mark.asyncio
+    async def test_config_written_only_at_insert(self, manager):
+        """測試配置JSON只在插入時寫入，之後修改配置和狀態更新都不改變已保存的配置"""
+        config = TaskConfig(priority=2)
+        task_id = await manager.create_task("configured", TaskType.DATA_EXPORT, config)
+        task = await manager.task_queue.get()
+
+        config.priority = 7
+        task.status = TaskStatus.RUNNING
+        await manager.update_task_in_db(task)
+
+        stored = await manager.get_task(task_id)
+        assert (stored.status, stored.config.priority) == (TaskStatus.RUNNING, 2)
+        assert '"priority":2' in task.config_json
+
+
+class TestTaskManagerDatabase:
+    """任務管理器數據庫操作測試類"""
+
+    @pytest.mark.asyncio
+    async def test_updates_coalesced_into_one_bulk_write(self, manager):
+        """測試任務更新按任務合併為最新狀態，以一次批量操作寫入，讀取前先寫出"""
+        task_db = manager.db_manager.task_db
+        first = await manager.get_task(
+            await manager.create_task("a", TaskType.PROXY_CLEANUP, TaskConfig(priority=4, tags=["x"]))
+        )
+        second = await manager.get_task(await manager.create_task("b", TaskType.DATA_EXPORT))
+        batches = []
+        bulk = task_db.update_task_status_bulk
+
+        async def recording_bulk(updates):
+            batches.append(len(updates))
+            return await bulk(updates)
+
+        task_db.update_task_status_bulk = recording_bulk
+        first.status = TaskStatus.RUNNING
+        await manager.update_task_in_db(first)
+        first.status = TaskStatus.COMPLETED
+        first.result = {"ok": True}
+        await manager.update_task_in_db(first)
+        second.status = TaskStatus.FAILED
+        second.error_message = "boom"
+        await manager.update_task_in_db(second)
+
+        stored = await manager.get_task(first.id)
+        assert (stored.status, stored.result) == (TaskStatus.COMPLETED, {"ok": True})
+        assert (await manager.get_task(second.id)).error_message == "boom"
+        assert batches == [2]
+        assert (stored.config.priority, stored.config.tags) == (4, ["x"])
+
+    @pytest.mark.asyncio
+    async def test_result_serialized_once_per_flush(self, manager, monkeypatch):
+        """測試結果在刷新時才序列化，同一任務多次更新只編碼最終快照一次"""
+        from app.core import sqlite_adapter
+        task = await manager.get_task(await manager.create_task("a", TaskType.PROXY_SCRAPING))
+        encoded = []
+        json_dumps = sqlite_adapter._json_dumps
+
+        def recording_dumps(value):
+            encoded.append(value)
+            return json_dumps(value)
+
+        monkeypatch.setattr(sqlite_adapter, "_json_dumps", recording_dumps)
+        task.status = TaskStatus.RUNNING
+        await manager.update_task_in_db(task)
+        task.status = TaskStatus.COMPLETED
+        task.result = {"proxies": [f"10.0.0.{i}:80" for i in range(100)]}
+        await manager.update_task_in_db(task)
+        assert encoded == []
+
+        await manager.flush_updates()
+
+        assert encoded == [task.result]
+        assert (await manager.get_task(task.id)).result == task.result
+
+    @pytest.mark.asyncio
+    async def test_enum_values_stored_and_unknown_values_fall_back(self, manager):
+        """測試枚舉以字符串值存儲，未知的類型和狀態回退到默認值"""
+        task_id = await manager.create_task("export", TaskType.DATA_EXPORT)
+        adapter = manager.db_manager.task_db.adapter
+        await adapter.execute(
+            "INSERT INTO tasks (id, name, task_type, status, config) VALUES ('legacy', 'old', 'unknown', 'archived', '{}')"
+        )
+
+        task = await manager.get_task(task_id)
+        legacy = await manager.get_task("legacy")
+
+        assert (task.task_type, task.status) == (TaskType.DATA_EXPORT, TaskStatus.QUEUED)
+        row = await adapter.fetch_one("SELECT typeof(status) AS t FROM tasks WHERE id = ?", (task_id,))
+        assert row["t"] == "text"
+        assert (legacy.task_type, legacy.status) == (TaskType.PROXY_SCRAPING, TaskStatus.PENDING)
+
+    @pytest.mark.asyncio
+    async def test_create_task_inserts_queued_status_without_update(self, manager):
+        """測試創建任務時入隊狀態隨插入寫入，不產生額外更新；立即執行的任務更新排在插入之後"""
+        task_id = await manager.create_task("queued", TaskType.PROXY_CLEANUP)
+
+        assert manager._write_buf == {} and manager._flush_task is None
+        assert (await manager.get_task(task_id)).status == TaskStatus.QUEUED
+
+        done = asyncio.Event()
+
+        async def executor(task):
+            done.set()
+            return {"ok": True}
+
+        manager.executors[TaskType.DATA_EXPORT] = executor
+        await manager.task_queue.get()
+        worker = manager.workers[0]
+        runner = asyncio.create_task(worker.start())
+        await asyncio.sleep(0)
+
+        fast_id = await manager.create_task("fast", TaskType.DATA_EXPORT)
+        await asyncio.wait_for(done.wait(), timeout=1)
+        while worker.current_task is not None:
+            await asyncio.sleep(0)
+        worker.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await runner
+
+        assert (await manager.get_task(fast_id)).status == TaskStatus.COMPLETED
+
+    @pytest.mark.asyncio
+    async def test_create_tasks_bulk_inserts_once_and_enqueues(self, manager):
+        """測試批量創建任務以一次批量插入寫入數據庫，並全部加入隊列"""
+        task_db = manager.db_manager.task_db
+        inserts = []
+        bulk = task_db.create_tasks_bulk
+
+        async def recording_bulk(rows):
+            inserts.append(len(rows))
+            return await bulk(rows)
+
+        task_db.create_tasks_bulk = recording_bulk
+        task_ids = await manager.create_tasks_bulk([
+            ("a", TaskType.PROXY_VALIDATION, None),
+            ("b", TaskType.PROXY_VALIDATION, TaskConfig(priority=8, tags=["x"])),
+        ])
+
+        assert inserts == [2]
+        assert manager.task_queue.qsize() == 2
+        assert (await manager.task_queue.get()).id == task_ids[1]
+        stored = [await manager.get_task(task_id) for task_id in task_ids]
+        assert [task.status for task in stored] == [TaskStatus.QUEUED] * 2
+        assert stored[1].config.tags == ["x"]
+
+    @pytest.mark.asyncio
+    async def test_background_flush_and_stop_drain_buffer(self, manager):
+        """測試後台任務在刷新間隔後寫出更新並退出，停止時寫出剩餘更新"""
+        task = await manager.get_task(await manager.create_task("a", TaskType.PROXY_CLEANUP))
+        task.status = TaskStatus.CANCELLED
+        await manager.update_task_in_db(task)
+
+        await manager._flush_task
+        assert manager._write_buf == {}
+
+        task.status = TaskStatus.RUNNING
+        await manager.update_task_in_db(task)
+        manager.is_running = True
+        manager._flush_interval = 60
+        await manager.stop()
+
+        assert manager._write_buf == {}
+        row = await manager.db_manager.task_db.adapter.fetch_one("SELECT status FROM tasks WHERE id = ?", (task.id,))
+        assert row["status"] == "running"
+
+
+    @pytest.mark.asyncio
+    async def test_initialize_installs_sized_default_executor(self, manager, monkeypatch):
+        """測試初始化時設置默認線程池：優先使用 THREAD_POOL_SIZE，否則按CPU核數推算"""
+        monkeypatch.setattr(task_manager_improved, "get_db_manager", AsyncMock(return_value=manager.db_manager))
+        monkeypatch.setattr(task_manager_improved.os, "cpu_count", lambda: 16)
+        loop = asyncio.get_running_loop()
+
+        monkeypatch.setattr(manager.settings, "THREAD_POOL_SIZE", None)
+        assert await manager.initialize()
+        assert loop._default_executor is manager._default_executor
+        assert manager._default_executor._max_workers == 128
+
+        manager._default_executor = None
+        monkeypatch.setattr(manager.settings, "THREAD_POOL_SIZE", 3)
+        assert await manager.initialize()
+        assert manager._default_executor._max_workers == 3
+
+    def test_recommended_max_workers(self, monkeypatch):
+        """測試推薦線程數：CPU核數 × 8，不少於32，不超過上限"""
+        monkeypatch.setattr(task_manager_improved.os, "cpu_count", lambda: None)
+        assert task_manager_improved.recommended_max_workers(1000) == 32
+        monkeypatch.setattr(task_manager_improved.os, "cpu_count", lambda: 16)
+        assert task_manager_improved.recommended_max_workers(1000) == 128
+        assert task_manager_improved.recommended_max_workers(50) == 50
+
+
+class TestTaskWorker:
+    """任務工作器測試類"""
+
+    @pytest.mark.asyncio
+    async def test_back_to_back_tasks_dispatched_without_delay(self, manager):
+        """測試隊列非空時工作器連續取任務，不在任務之間休眠"""
+        done = []
+
+        async def executor(task):
+            done.append(task.name)
+            return {"ok": True}
+
+        manager.executors[TaskType.PROXY_CLEANUP] = executor
+        for i in range(3):
+            await manager.create_task(f"c{i}", TaskType.PROXY_CLEANUP)
+        worker = manager.workers[0]
+
+        loop = asyncio.get_running_loop()
+        begin = loop.time()
+        runner = asyncio.create_task(worker.start())
+        while len(done) < 3:
+            await asyncio.sleep(0.001)
+        elapsed = loop.time() - begin
+        while worker.current_task is not None:
+            await asyncio.sleep(0)
+
+        worker.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(runner, timeout=1)
+        assert elapsed < 0.1
+        assert sorted(done) == ["c0", "c1", "c2"]
+
+    @pytest.mark.asyncio
+    async def test_idle_worker_blocks_without_polling_and_stop_cancels(self, manager):
+        """測試空閒工作器無超時地等待入隊，停止時直接取消等待"""
+        worker = manager.workers[0]
+        runner = asyncio.create_task(worker.start())
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        waiter = manager.task_queue._waiters[0]
+        assert not waiter.done()
+
+        worker.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(runner, timeout=1)
+        assert worker.is_running is False
+        assert worker._runner is None
+
+    @pytest.mark.asyncio
+    async def test_retry_delay_uses_full_jitter(self, manager, monkeypatch):
+        """測試重試等待時間在 [0, retry_delay * 2^重試次數] 內隨機取值"""
+        bounds = []
+        sleeps = []
+
+        def uniform(low, high):
+            bounds.append((low, high))
+            return high / 2
+
+        async def fake_sleep(delay):
+            sleeps.append(delay)
+
+        monkeypatch.setattr(task_manager_improved._retry_random, "uniform", uniform)
+        monkeypatch.setattr(task_manager_improved.asyncio, "sleep", fake_sleep)
+        task = make_task("retry")
+        task.config.retry_delay = 2
+
+        await manager.workers[0].retry_task(task)
+        await manager.workers[0].retry_task(task)
+
+        assert bounds == [(0, 2), (0, 4)]
+        assert sleeps == [1.0, 2.0]
+        assert task.retry_count == 2
+        assert manager.task_queue.qsize() == 2
+
+    @pytest.mark.asyncio
+    async def test_retries_throttled_by_token_bucket(self, manager, monkeypatch):
+        """測試令牌用完後重試按令牌桶速率等待，併發的重試按順序排隊"""
+        sleeps = []
+
+        async def fake_sleep(delay):
+            sleeps.append(round(delay, 6))
+
+        monkeypatch.setattr(task_manager_improved.time, "monotonic", lambda: 100.0)
+        monkeypatch.setattr(task_manager_improved._retry_random, "uniform", lambda low, high: 0)
+        monkeypatch.setattr(task_manager_improved.asyncio, "sleep", fake_sleep)
+        manager._retry_bucket = task_manager_improved.TokenBucket(rate=10, capacity=2)
+
+        for i in range(4):
+            await manager.workers[0].retry_task(make_task(f"r{i}"))
+
+        assert [delay for delay in sleeps if delay] == [0.1, 0.2]
+        assert manager.task_queue.qsize() == 4
+
+    @pytest.mark.asyncio
+    async def test_stop_cancels_idle_workers_and_waits_for_running_task(self, manager):
+        """測試停止時空閒工作器的協程被取消，執行中的工作器完成任務後正常退出，無固定等待"""
+        started = asyncio.Event()
+
+        async def executor(task):
+            started.set()
+            await asyncio.sleep(0.1)
+            return {"ok": True}
+
+        manager.executors[TaskType.DATA_EXPORT] = executor
+        runner = asyncio.create_task(manager.start())
+        task_id = await manager.create_task("export", TaskType.DATA_EXPORT)
+        await asyncio.wait_for(started.wait(), timeout=1)
+        worker_tasks = list(manager._worker_tasks)
+
+        loop = asyncio.get_running_loop()
+        begin = loop.time()
+        await manager.stop()
+        await asyncio.wait_for(runner, timeout=1)
+
+        assert loop.time() - begin < 0.5
+        assert sorted(worker_task.cancelled() for worker_task in worker_tasks) == [False, True]
+        assert (await manager.get_task(task_id)).status == TaskStatus.COMPLETED
+
+    @pytest.mark.asyncio
+    async def test_execution_time_from_monotonic_clock(self, manager):
+        """測試執行耗時取自單調時鐘，完成時間等於開始時間加耗時"""
+        async def executor(task):
+            await asyncio.sleep(0.02)
+            return {"ok": True}
+
+        manager.executors[TaskType.DATA_EXPORT] = executor
+        task = make_task("timed")
+        task.task_type = TaskType.DATA_EXPORT
+
+        await manager.workers[0].execute_task(task)
+
+        assert task.status == TaskStatus.COMPLETED
+        assert task.execution_time >= 0.02
+        assert (task.completed_at - task.started_at).total_seconds() == pytest.approx(task.execution_time, abs=1e-5)
+
+    @pytest.mark.asyncio
+    async def test_short_task_keeps_started_at_when_running_update_coalesced(self, manager):
+        """測試任務在刷新前已完成時，合併後的寫入仍保存開始與完成時間"""
+        async def executor(task):
+            return {"ok": True}
+
+        manager.executors[TaskType.DATA_EXPORT] = executor
+        task_id = await manager.create_task("quick", TaskType.DATA_EXPORT)
+        task = await manager.task_queue.get(timeout=0)
+
+        await manager.workers[0].execute_task(task)
+        assert [entry[0] for entry in manager._write_buf.values()] == ["completed"]
+        await manager.flush_updates()
+
+        stored = await manager.get_task(task_id)
+        assert stored.status == TaskStatus.COMPLETED
+        assert stored.started_at is not None and stored.completed_at is not None
+
+    @pytest.mark.asyncio
+    async def test_executor_bound_at_creation(self, manager):
+        """測試創建任務時綁定執行器，未綁定的任務在執行時按類型查找"""
+        calls = []
+
+        async def bound(task):
+            calls.append(("bound", task.name))
+            return {}
+
+        async def late(task):
+            calls.append(("late", task.name))
+            return {}
+
+        manager.executors[TaskType.PROXY_CLEANUP] = bound
+        await manager.create_task("created", TaskType.PROXY_CLEANUP)
+        created = await manager.task_queue.get()
+        manager.executors[TaskType.PROXY_CLEANUP] = late
+        recovered = make_task("recovered")
+        recovered.task_type = TaskType.PROXY_CLEANUP
+
+        await manager.workers[0].execute_task(created)
+        await manager.workers[0].execute_task(recovered)
+
+        assert calls == [("bound", "created"), ("late", "recovered")]
+
+    @pytest.mark.asyncio
+    async def test_dependent_task_queued_after_dependency_completes(self, manager):
+        """測試依賴任務在前置任務完成後才加入隊列，已結束或未知的依賴視為已滿足"""
+        async def executor(task):
+            return {"ok": True}
+
+        manager.executors[TaskType.PROXY_SCRAPING] = executor
+        first_id = await manager.create_task("first", TaskType.PROXY_SCRAPING)
+        second_id = await manager.create_task(
+            "second", TaskType.PROXY_VALIDATION, TaskConfig(dependencies=[first_id, "unknown"])
+        )
+
+        assert manager.task_queue.qsize() == 1
+        first = await manager.task_queue.get()
+        await manager.workers[0].execute_task(first)
+
+        assert (await manager.task_queue.get(timeout=0.1)).id == second_id
+        assert manager._dependents == {} and manager._blocked_tasks == {}
+
+        third_id = await manager.create_task("third", TaskType.DATA_EXPORT, TaskConfig(dependencies=[first_id]))
+        assert (await manager.task_queue.get(timeout=0.1)).id == third_id
+
+    @pytest.mark.asyncio
+    async def test_failed_dependency_cancels_dependents_transitively(self, manager):
+        """測試前置任務最終失敗時，依賴它的任務及其後續任務被取消"""
+        failing_id = await manager.create_task("failing", TaskType.PROXY_CLEANUP, TaskConfig(max_retries=0))
+        child_id = await manager.create_task("child", TaskType.DATA_EXPORT, TaskConfig(dependencies=[failing_id]))
+        grandchild_id = await manager.create_task(
+            "grandchild", TaskType.DATA_EXPORT, TaskConfig(dependencies=[child_id])
+        )
+
+        await manager.workers[0].execute_task(await manager.task_queue.get())
+
+        assert manager.task_queue.qsize() == 0
+        child = await manager.get_task(child_id)
+        grandchild = await manager.get_task(grandchild_id)
+        assert (child.status, grandchild.status) == (TaskStatus.CANCELLED, TaskStatus.CANCELLED)
+        assert failing_id in child.error_message
+        assert manager._unfinished == set()
+
+    @pytest.mark.asyncio
+    async def test_stats_view_updated_in_place_from_counters(self, manager):
+        """測試匯總統計由工作器計數器更新，每次返回同一實例"""
+        async def executor(task):
+            if task.name == "bad":
+                raise RuntimeError("boom")
+            return {"ok": True}
+
+        manager.executors[TaskType.DATA_EXPORT] = executor
+        await manager.create_task("good", TaskType.DATA_EXPORT)
+        await manager.create_task("bad", TaskType.DATA_EXPORT, TaskConfig(max_retries=0))
+        view = manager.stats_view()
+        assert (view.queue_size, view.task_count, view.uptime) == (2, 0, 0.0)
+
+        worker = manager.workers[0]
+        runner = asyncio.create_task(worker.start())
+        while worker.task_count < 2:
+            await asyncio.sleep(0)
+        worker.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await runner
+
+        assert manager.stats_view() is view
+        assert asdict(view) == {
+            "is_running": False, "worker_count": 2, "busy_workers": 0, "queue_size": 0,
+            "task_count": 2, "error_count": 1, "uptime": 0.0,
+        }